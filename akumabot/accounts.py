@@ -0,0 +1,136 @@
+"""
+Which services account each nickname is logged in to.
+"""
+from twisted.internet import defer, reactor
+
+from akumabot.cache import TTLCache
+from akumabot.membership import irc_lower
+
+
+# What `AccountTracker.account` returns when it doesn't know.
+UNKNOWN = object()
+
+
+class _Lookup(object):
+    __slots__ = ('waiting', 'account', 'timeout_call')
+
+    def __init__(self, timeout_call):
+        self.waiting = []
+        self.account = None
+        self.timeout_call = timeout_call
+
+
+class AccountTracker(object):
+    """
+    Learns accounts from the server, and asks with WHOIS when it must.
+
+    With the IRCv3 ``extended-join`` and ``account-notify``
+    capabilities the server says which account a user is logged in to
+    when they join a channel the bot is in, and again whenever that
+    changes. Those answers hold until the user quits or stops sharing a
+    channel with the bot, and follow them through nick changes.
+
+    WHOIS answers are cached for ``ttl`` seconds, and forgotten when the
+    user quits or changes nick. Concurrent lookups of one nick share a
+    WHOIS; one without a reply after ``timeout`` seconds is taken to
+    mean "not logged in", without caching it.
+    """
+    def __init__(self, ttl=60, maxsize=1000, timeout=10, clock=reactor):
+        self.timeout = timeout
+        self.clock = clock
+        # nick key -> account, or None if logged out
+        self._notified = {}
+        self._whois = TTLCache(maxsize, ttl, clock)
+        # nick key -> _Lookup
+        self._pending = {}
+        self.whois_sent = 0
+
+    def account(self, nickname):
+        """
+        :returns:
+            The account ``nickname`` is logged in to, None if it isn't,
+            or `UNKNOWN`.
+        """
+        key = irc_lower(nickname)
+        account = self._notified.get(key, UNKNOWN)
+        if account is UNKNOWN:
+            account = self._whois.get(key, UNKNOWN)
+        return account
+
+    def lookup(self, nickname, whois):
+        """
+        :param whois: Called with ``nickname`` to send a WHOIS.
+        :returns: A Deferred that fires with what `account` would.
+        """
+        account = self.account(nickname)
+        if account is not UNKNOWN:
+            return defer.succeed(account)
+        key = irc_lower(nickname)
+        lookup = self._pending.get(key)
+        if lookup is None:
+            lookup = self._pending[key] = _Lookup(self.clock.callLater(
+                self.timeout, self._finish, key, False))
+            self.whois_sent += 1
+            whois(nickname)
+        d = defer.Deferred()
+        lookup.waiting.append(d)
+        return d
+
+    def account_changed(self, nickname, account):
+        """
+        Record an ACCOUNT message or an extended JOIN, where an account
+        of ``*`` means logged out.
+        """
+        key = irc_lower(nickname)
+        self._notified[key] = None if account == '*' else account
+        self._whois.pop(key)
+
+    def whois_account(self, nickname, account):
+        """
+        Record a RPL_WHOISACCOUNT (330) reply.
+        """
+        lookup = self._pending.get(irc_lower(nickname))
+        if lookup is not None:
+            lookup.account = account
+
+    def end_of_whois(self, nickname):
+        self._finish(irc_lower(nickname))
+
+    def _finish(self, key, cache=True):
+        lookup = self._pending.pop(key, None)
+        if lookup is None:
+            return
+        if lookup.timeout_call.active():
+            lookup.timeout_call.cancel()
+        if cache:
+            self._whois[key] = lookup.account
+        for d in lookup.waiting:
+            d.callback(lookup.account)
+
+    def renamed(self, old, new):
+        old_key, new_key = irc_lower(old), irc_lower(new)
+        account = self._notified.pop(old_key, UNKNOWN)
+        self._whois.pop(old_key)
+        self._whois.pop(new_key)
+        self._notified.pop(new_key, None)
+        if account is not UNKNOWN:
+            self._notified[new_key] = account
+
+    def forget(self, nickname):
+        key = irc_lower(nickname)
+        self._notified.pop(key, None)
+        self._whois.pop(key)
+
+    def clear(self):
+        self._notified.clear()
+        self._whois.clear()
+        for key in list(self._pending):
+            self._finish(key, False)
+
+    def stats(self):
+        return {
+            'notified': len(self._notified),
+            'whois': self._whois.stats(),
+            'whois_sent': self.whois_sent,
+            'pending': len(self._pending),
+        }
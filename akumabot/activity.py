@@ -0,0 +1,368 @@
+"""
+When each nick was last seen, and how busy each channel is, kept in a
+local SQLite database so that it survives restarts.
+"""
+import sqlite3
+
+from twisted.internet import defer, reactor, threads
+from twisted.logger import Logger
+from twisted.python.threadpool import ThreadPool
+
+from akumabot import metrics
+from akumabot.cache import LRUCache
+from akumabot.membership import irc_lower
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS seen (
+    network TEXT NOT NULL,
+    nick_key TEXT NOT NULL,
+    nickname TEXT NOT NULL,
+    channel TEXT,
+    event TEXT NOT NULL,
+    message TEXT,
+    at REAL NOT NULL,
+    PRIMARY KEY (network, nick_key)
+);
+CREATE TABLE IF NOT EXISTS channel_activity (
+    network TEXT NOT NULL,
+    channel_key TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    last_active REAL NOT NULL,
+    PRIMARY KEY (network, channel_key)
+);
+"""
+
+_missing = object()
+
+
+class Sighting(object):
+    """
+    The last thing a nick was seen doing.
+
+    ``event`` is one of ``message``, ``join``, ``part``, ``kick``,
+    ``quit``, ``renamed_to`` and ``renamed_from``; ``message`` is the
+    line said, the part, kick or quit message, or the other nick.
+    """
+    __slots__ = ('nickname', 'channel', 'event', 'message', 'at')
+
+    def __init__(self, nickname, channel, event, message, at):
+        self.nickname = nickname
+        self.channel = channel
+        self.event = event
+        self.message = message
+        self.at = at
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Sighting) and
+            self._fields() == other._fields())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Sighting({0})'.format(
+            ', '.join(repr(value) for value in self._fields()))
+
+    def _fields(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class ActivityStore(object):
+    """
+    Records who was last seen and how active channels are, fed from the
+    bot's events.
+
+    Updates are gathered in memory, with later updates for a nick
+    replacing earlier ones, and written to the database in one
+    transaction once ``max_pending`` have built up or ``flush_interval``
+    seconds after the first, on a thread of their own. A busy channel
+    costs one commit per batch rather than one per line.
+
+    The last sightings of the ``cache_size`` most recently seen or
+    asked about nicks are kept in memory, so `last_seen` only goes to
+    the database for nicks that haven't been around lately.
+    """
+    log = Logger()
+
+    def __init__(self, path, max_pending=500, flush_interval=1.0,
+                 cache_size=10000, clock=reactor, run_in_thread=None):
+        """
+        :param run_in_thread:
+            Called with a function and its arguments to run it away from
+            the reactor, returning a Deferred. By default the store runs
+            them, one at a time, on a thread of its own.
+        """
+        self.path = path
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._pool = None
+        if run_in_thread is None:
+            self._pool = ThreadPool(1, 1, 'akumabot-activity')
+            run_in_thread = self._run_in_pool
+        self._run_in_thread = run_in_thread
+        self._connection = None
+        # (network, nick key) -> Sighting, or None if never seen
+        self._cache = LRUCache(cache_size)
+        # (network, nick key) -> Sighting, not yet written
+        self._pending_seen = {}
+        # (network, channel key) -> [channel, lines, last active]
+        self._pending_channels = {}
+        self._pending = 0
+        # Sightings being written, until they are
+        self._writing = []
+        self._flush_call = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['activity.database'], config['activity.max_pending'],
+            config['activity.flush_interval'], config['activity.cache_size'])
+
+    def _run_in_pool(self, function, *args):
+        return threads.deferToThreadPool(
+            reactor, self._pool, function, *args)
+
+    def add_listeners(self, bot):
+        bot.add_listener('received_message', self.received_message)
+        bot.add_listener('user_joined', self.user_joined)
+        bot.add_listener('user_left', self.user_left)
+        bot.add_listener('user_kicked', self.user_kicked)
+        bot.add_listener('user_quit', self.user_quit)
+        bot.add_listener('user_renamed', self.user_renamed)
+        bot.add_listener('netsplit', self.netsplit)
+        bot.add_listener('netjoin', self.netjoin)
+
+    def open(self):
+        """
+        Start the writer thread and create the tables if need be.
+
+        :returns: A Deferred that fires once the database is ready.
+        """
+        if self._pool is not None:
+            self._pool.start()
+        return self._run_in_thread(self._open)
+
+    def _open(self):
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False)
+        # Nicks and messages are bytes off the wire, not always UTF-8;
+        # keep them as they came, in and out.
+        self._connection.text_factory = str
+        # WAL lets a commit get by with fewer syncs, and readers not
+        # wait for writers.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_schema)
+
+    def close(self):
+        """
+        Write what is pending, then close the database.
+
+        :returns: A Deferred that fires once it is closed.
+        """
+        d = self.flush()
+        d.addCallback(lambda _: self._run_in_thread(self._close))
+        if self._pool is not None:
+            d.addBoth(self._stop_pool)
+        return d
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _stop_pool(self, result):
+        self._pool.stop()
+        return result
+
+    def record(self, network, nickname, channel, event, message=None):
+        key = (network, irc_lower(nickname))
+        sighting = Sighting(
+            nickname, channel, event, message, self.clock.seconds())
+        self._pending_seen[key] = sighting
+        self._cache[key] = sighting
+        self._added()
+
+    def _added(self):
+        self._pending += 1
+        if self._pending >= self.max_pending:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = self.clock.callLater(
+                self.flush_interval, self.flush)
+
+    def received_message(self, network, nickname, channel, message):
+        self.record(network.name, nickname, channel, 'message', message)
+        key = (network.name, irc_lower(channel))
+        activity = self._pending_channels.get(key)
+        if activity is None:
+            activity = self._pending_channels[key] = [channel, 0, 0]
+        activity[1] += 1
+        activity[2] = self.clock.seconds()
+
+    def user_joined(self, network, nickname, channel):
+        self.record(network.name, nickname, channel, 'join')
+
+    def user_left(self, network, nickname, channel):
+        self.record(network.name, nickname, channel, 'part')
+
+    def user_kicked(self, network, nickname, channel, kicker, message):
+        self.record(network.name, nickname, channel, 'kick', message)
+
+    def user_quit(self, network, nickname, message):
+        self.record(network.name, nickname, None, 'quit', message)
+
+    def user_renamed(self, network, oldname, newname):
+        self.record(network.name, oldname, None, 'renamed_to', newname)
+        self.record(network.name, newname, None, 'renamed_from', oldname)
+
+    def netsplit(self, network, servers, lost):
+        message = ' '.join(servers)
+        for nickname, _ in lost:
+            self.record(network.name, nickname, None, 'quit', message)
+
+    def netjoin(self, network, servers, joins):
+        for nickname, channel in joins:
+            self.record(network.name, nickname, channel, 'join')
+
+    def flush(self):
+        """
+        Write the pending updates in one transaction.
+
+        :returns: A Deferred that fires once they are written.
+        """
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        if not self._pending:
+            return defer.succeed(None)
+        seen = [
+            (network, nick_key, sighting.nickname, sighting.channel,
+             sighting.event, sighting.message, sighting.at)
+            for (network, nick_key), sighting
+            in self._pending_seen.items()]
+        channels = [
+            (network, channel_key, channel, lines, last_active)
+            for (network, channel_key), (channel, lines, last_active)
+            in self._pending_channels.items()]
+        writing = self._pending_seen
+        self._writing.append(writing)
+        self._pending_seen = {}
+        self._pending_channels = {}
+        self._pending = 0
+        started = self.clock.seconds()
+        d = self._run_in_thread(self._write, seen, channels)
+
+        def written(result):
+            self._writing.remove(writing)
+            metrics.activity_flush_duration.observe(
+                self.clock.seconds() - started)
+            return result
+        d.addBoth(written)
+        d.addErrback(
+            lambda failure: self.log.failure(
+                'Writing {count} activity updates failed', failure,
+                count=len(seen) + len(channels)))
+        return d
+
+    def _write(self, seen, channels):
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO seen VALUES (?, ?, ?, ?, ?, ?, ?)',
+                seen)
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO channel_activity '
+                'VALUES (?, ?, ?, 0, 0)',
+                [row[:3] for row in channels])
+            self._connection.executemany(
+                'UPDATE channel_activity '
+                'SET channel = ?, lines = lines + ?, last_active = ? '
+                'WHERE network = ? AND channel_key = ?',
+                [(channel, lines, last_active, network, channel_key)
+                 for network, channel_key, channel, lines, last_active
+                 in channels])
+
+    def _unwritten(self, key):
+        sighting = self._pending_seen.get(key)
+        if sighting is not None:
+            return sighting
+        for writing in reversed(self._writing):
+            sighting = writing.get(key)
+            if sighting is not None:
+                return sighting
+        return None
+
+    def last_seen(self, network, nickname):
+        """
+        :returns:
+            A Deferred that fires with ``nickname``'s last `Sighting`
+            on ``network``, or None if it has never been seen.
+        """
+        key = (network, irc_lower(nickname))
+        sighting = self._cache.get(key, _missing)
+        if sighting is not _missing:
+            return defer.succeed(sighting)
+        sighting = self._unwritten(key)
+        if sighting is not None:
+            self._cache[key] = sighting
+            return defer.succeed(sighting)
+        d = self._run_in_thread(self._read_seen, key)
+        d.addCallback(self._got_seen, key)
+        return d
+
+    def _read_seen(self, key):
+        row = self._connection.execute(
+            'SELECT nickname, channel, event, message, at FROM seen '
+            'WHERE network = ? AND nick_key = ?', key).fetchone()
+        if row is None:
+            return None
+        return Sighting(*row)
+
+    def _got_seen(self, sighting, key):
+        # The nick may have turned up while the database was read.
+        newer = self._cache.get(key, _missing)
+        if newer is not _missing:
+            return newer
+        newer = self._unwritten(key)
+        if newer is not None:
+            sighting = newer
+        self._cache[key] = sighting
+        return sighting
+
+    def channel_activity(self, network, channel):
+        """
+        :returns:
+            A Deferred that fires with the number of lines said in
+            ``channel`` and when the last one was, or None if none have
+            been.
+        """
+        key = (network, irc_lower(channel))
+        d = self._run_in_thread(self._read_channel, key)
+        d.addCallback(self._add_pending_activity, key)
+        return d
+
+    def _read_channel(self, key):
+        return self._connection.execute(
+            'SELECT lines, last_active FROM channel_activity '
+            'WHERE network = ? AND channel_key = ?', key).fetchone()
+
+    def _add_pending_activity(self, row, key):
+        lines, last_active = row or (0, 0)
+        pending = self._pending_channels.get(key)
+        if pending is not None:
+            lines += pending[1]
+            last_active = max(last_active, pending[2])
+        if not lines:
+            return None
+        return lines, last_active
+
+    def stats(self):
+        return {
+            'pending': self._pending,
+            'writing': len(self._writing),
+            'cache': self._cache.stats(),
+        }
@@ -0,0 +1,258 @@
+"""
+Declarative argument schemas for commands.
+
+A command lists its arguments in an `Arguments` schema::
+
+    arguments = Arguments(
+        Nick('user'), Channel('channel'), Rest('reason', optional=True))
+
+which the command registry compiles once, when the command is loaded,
+into a parser that splits and checks an argument string in one pass,
+and into the command's usage line. The command's ``run`` then gets a
+list with one value per argument, None for optional ones left out, and
+never sees input that doesn't fit.
+
+Arguments are separated by whitespace; one may be put in double or
+single quotes to include spaces. A `Rest` argument takes everything
+from its first word to the end of the line as it was typed.
+"""
+import re
+
+from twisted.words.protocols import irc
+
+
+class ArgumentError(ValueError):
+    """
+    Raised by a compiled schema for input that doesn't fit it. The
+    message is meant for the user who sent the command.
+    """
+
+
+class Argument(object):
+    """
+    One argument, shown as ``<name>`` in usage lines, or ``[<name>]`` if
+    it may be left out.
+
+    Subclasses set ``kind``, used in error messages, and override
+    `convert`.
+    """
+    kind = 'word'
+
+    def __init__(self, name, optional=False):
+        self.name = name
+        self.optional = optional
+
+    def convert(self, token):
+        """
+        :returns: The value of ``token``.
+        :raises ArgumentError: If ``token`` isn't valid.
+        """
+        return token
+
+    def usage(self):
+        if self.optional:
+            return '[<{0}>]'.format(self.name)
+        return '<{0}>'.format(self.name)
+
+    def invalid(self, token):
+        return ArgumentError("{0!r} isn't a {1}, for <{2}>".format(
+            token, self.kind, self.name))
+
+
+class Word(Argument):
+    """
+    Any single word.
+    """
+
+
+class Int(Argument):
+    kind = 'whole number'
+
+    def __init__(self, name, minimum=None, maximum=None, optional=False):
+        Argument.__init__(self, name, optional)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def convert(self, token):
+        try:
+            value = int(token)
+        except ValueError:
+            raise self.invalid(token)
+        if self.minimum is not None and value < self.minimum:
+            raise self.out_of_range()
+        if self.maximum is not None and value > self.maximum:
+            raise self.out_of_range()
+        return value
+
+    def out_of_range(self):
+        if self.maximum is None:
+            bounds = 'at least {0}'.format(self.minimum)
+        elif self.minimum is None:
+            bounds = 'at most {0}'.format(self.maximum)
+        else:
+            bounds = 'from {0} to {1}'.format(self.minimum, self.maximum)
+        return ArgumentError('<{0}> must be a whole number {1}'.format(
+            self.name, bounds))
+
+
+class Duration(Argument):
+    """
+    A number of seconds, minutes, hours or days, such as ``90s``,
+    ``30m``, ``2h`` or ``1d``; converted to seconds.
+    """
+    kind = 'duration'
+
+    _pattern = re.compile(r'^(\d+)([smhd])$')
+    _units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def convert(self, token):
+        match = self._pattern.match(token)
+        if match is None:
+            raise self.invalid(token)
+        count, unit = match.groups()
+        return int(count) * self._units[unit]
+
+
+class Channel(Argument):
+    """
+    A channel name; ``#`` is put in front of one given without a prefix.
+    """
+    kind = 'channel'
+
+    _invalid_characters = re.compile(r'[\x00\x07\r\n ,:]')
+
+    def convert(self, token):
+        if self._invalid_characters.search(token):
+            raise self.invalid(token)
+        if token[:1] not in irc.CHANNEL_PREFIXES:
+            token = '#' + token
+        return token
+
+
+class Nick(Argument):
+    kind = 'nick'
+
+    _pattern = re.compile(
+        r'^[A-Za-z\[\]\\`_^{|}][A-Za-z0-9\[\]\\`_^{|}-]*$')
+
+    def convert(self, token):
+        if self._pattern.match(token) is None:
+            raise self.invalid(token)
+        return token
+
+
+class Rest(Argument):
+    """
+    The rest of the line, as typed. Only the last argument may be one.
+    """
+    kind = 'text'
+
+
+# A quoted string or a run of anything but whitespace.
+_token = re.compile(r'''\s*("[^"]*"|'[^']*'|\S+)''')
+
+
+def tokenize(argstring):
+    """
+    :returns:
+        A list of (word, offset) pairs, where quoted words have their
+        quotes removed and ``offset`` is where the word starts.
+    """
+    tokens = []
+    position = 0
+    while True:
+        match = _token.match(argstring, position)
+        if match is None:
+            return tokens
+        token = match.group(1)
+        if token[0] in '"\'' and len(token) > 1 and token[-1] == token[0]:
+            token = token[1:-1]
+        tokens.append((token, match.start(1)))
+        position = match.end()
+
+
+class Arguments(object):
+    """
+    A command's arguments, in order.
+
+    Optional arguments may come before required ones; an optional
+    argument is given a word only if enough words are left for the
+    required arguments after it, and, before a `Rest` argument, only if
+    the word is valid for it. An optional `Word` can't come before a
+    `Rest`, as there would be no telling them apart.
+
+    A schema with no arguments ignores any words after the command.
+    """
+    def __init__(self, *arguments):
+        for index, argument in enumerate(arguments):
+            if isinstance(argument, Rest) and index != len(arguments) - 1:
+                raise ValueError(
+                    'Rest argument <{0}> must be the last'.format(
+                        argument.name))
+        if arguments and isinstance(arguments[-1], Rest):
+            for argument in arguments[:-1]:
+                if argument.optional and type(argument) is Word:
+                    raise ValueError(
+                        'Optional word <{0}> before the rest of the line '
+                        'is ambiguous'.format(argument.name))
+        self.arguments = arguments
+
+    def usage(self):
+        return ' '.join(argument.usage() for argument in self.arguments)
+
+    def compile(self, usage):
+        """
+        :param usage:
+            What to reply with when the number of words is wrong.
+        :returns:
+            A function that parses an argument string into a list of
+            values, raising `ArgumentError` if it doesn't fit.
+        """
+        if not self.arguments:
+            return lambda argstring: []
+        arguments = self.arguments
+        rest = None
+        if arguments and isinstance(arguments[-1], Rest):
+            rest = arguments[-1]
+            arguments = arguments[:-1]
+        # How many words the arguments from each index on need at least.
+        needed = [0] * (len(arguments) + 1)
+        needed[-1] = 1 if rest is not None and not rest.optional else 0
+        for index in range(len(arguments) - 1, -1, -1):
+            needed[index] = needed[index + 1] + (
+                0 if arguments[index].optional else 1)
+        steps = [
+            (argument, needed[index + 1],
+             argument.optional and rest is not None)
+            for index, argument in enumerate(arguments)]
+
+        def parse(argstring):
+            tokens = tokenize(argstring)
+            if len(tokens) < needed[0]:
+                raise ArgumentError(usage)
+            values = []
+            position = 0
+            for argument, after, may_skip_invalid in steps:
+                if argument.optional and len(tokens) - position <= after:
+                    values.append(None)
+                    continue
+                try:
+                    values.append(argument.convert(tokens[position][0]))
+                except ArgumentError:
+                    if not may_skip_invalid:
+                        raise
+                    # The word belongs to the rest of the line.
+                    values.append(None)
+                    continue
+                position += 1
+            if rest is not None:
+                if position < len(tokens):
+                    values.append(argstring[tokens[position][1]:].rstrip())
+                elif rest.optional:
+                    values.append(None)
+                else:
+                    raise ArgumentError(usage)
+            elif position != len(tokens):
+                raise ArgumentError(usage)
+            return values
+        return parse
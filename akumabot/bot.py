@@ -1,84 +1,507 @@
-from collections import defaultdict
+from collections import OrderedDict
 
-from twisted.internet import endpoints
+from twisted.application.internet import ClientService, backoffPolicy
+from twisted.internet import defer, endpoints, reactor
 from twisted.python import log
+from twisted.words.protocols import irc
 
-from akumabot.commands import CommandProcessor
-from akumabot.proto import AkumaBotFactory
+from akumabot import metrics
+from akumabot.accounts import UNKNOWN, AccountTracker
+from akumabot.activity import ActivityStore
+from akumabot.commands import CommandProcessor, configured_commands
+from akumabot.events import EventBus
+from akumabot.membership import MembershipIndex, irc_lower
+from akumabot.outbound import (
+    OutboundScheduler, PRIORITY_HIGH, PRIORITY_NORMAL
+)
+from akumabot.paging import Pager, encode, split_lines
+from akumabot.proto import AkumaBotFactory, pack_joins
+from akumabot.ratelimit import RateLimiter
+from akumabot.scrollback import Scrollback
+from akumabot.workers import WorkerPool
 
 
 class AkumaBot(object):
+    """
+    Connects to every configured network, sharing one command processor
+    and event bus between them.
+
+    Listeners subscribed to `events` get the originating `Network`
+    followed by the event's own arguments.
+    """
     def __init__(self, config):
         self.config = config
-        self.admins = self.config['akumabot.admins']
         self.command_processor = CommandProcessor(self)
-        self.listeners = defaultdict(list)
-
-    def main(self, reactor, description):
-        endpoint = endpoints.clientFromString(reactor, description)
-        factory = AkumaBotFactory(self.config)
-        d = endpoint.connect(factory)
-        d.addCallback(self.got_protocol)
-        d.addCallback(lambda protocol: protocol.deferred)
-        return d
+        self.command_processor.commands = configured_commands(config)
+        self.command_processor.pager = Pager.from_config(config)
+        if config['ratelimit.enabled']:
+            self.command_processor.rate_limiter = RateLimiter.from_config(
+                config)
+        self.events = EventBus()
+        self.networks = OrderedDict(
+            (netconfig['network.name'], Network(self, netconfig))
+            for netconfig in config['networks'])
+        self.command_processor.add_listeners()
+        # An akumabot.activity.ActivityStore, if one is configured.
+        self.activity = None
+        if config['activity.database']:
+            self.activity = ActivityStore.from_config(config)
+            self.activity.add_listeners(self)
+        metrics.registry.gauge(
+            'akumabot_outbound_queue_depth',
+            'Lines waiting to be sent, by network and priority.',
+            ('network', 'priority'), self._outbound_depths)
+        metrics.registry.gauge(
+            'akumabot_scrollback_bytes',
+            'Memory taken by channel scrollback, by network and kind '
+            '(buffer or index).',
+            ('network', 'kind'), self._scrollback_bytes)
+        metrics.registry.gauge(
+            'akumabot_reply_cursors',
+            'Long replies with pages kept for "more".',
+            (), lambda: [((), len(self.command_processor.pager))])
+
+    def _outbound_depths(self):
+        for name, network in self.networks.items():
+            yield (name, 'high'), network.outbound.depth(PRIORITY_HIGH)
+            yield (name, 'normal'), network.outbound.depth(PRIORITY_NORMAL)
+
+    def _scrollback_bytes(self):
+        for name, network in self.networks.items():
+            if network.scrollback is None:
+                continue
+            channels = network.scrollback.memory().values()
+            for kind in ('buffer', 'index'):
+                yield (name, kind), sum(memory[kind] for memory in channels)
+
+    @defer.inlineCallbacks
+    def main(self, reactor):
+        self.command_processor.commands.preload()
+        if self.activity is not None:
+            yield self.activity.open()
+            reactor.addSystemEventTrigger(
+                'before', 'shutdown', self.activity.close)
+        if self.config['workers.count'] > 0:
+            pool = WorkerPool.from_config(self, reactor, self.config)
+            yield pool.start()
+            self.command_processor.worker_pool = pool
+        if self.config['metrics.port']:
+            yield metrics.listen(
+                reactor, self.config['metrics.port'],
+                self.config['metrics.interface'])
+        yield defer.DeferredList(
+            [network.connect(reactor) for network in self.networks.values()],
+            consumeErrors=True)
+
+    def add_listener(self, event, listener, max_in_flight=None):
+        self.events.subscribe(event, listener, max_in_flight)
+
+
+class Network(object):
+    """
+    The connection to one IRC network.
+
+    Commands are run with the network they came from as their ``bot``,
+    so that replies and other actions go back out the same connection.
+
+    The channels the bot should be in, the configured ones and any it
+    has joined since, are kept in `channels` and all joined again each
+    time it signs on.
+
+    With ``admin_accounts`` set, `admins` are services account names
+    rather than nicknames; see `is_admin`.
+    """
+    clock = reactor
+
+    def __init__(self, bot, config):
+        self.bot = bot
+        self.config = config
+        self.name = config['network.name']
+        self.nickname = config['akumabot.nickname']
+        self.admins = config['akumabot.admins']
+        self.admin_accounts = config['akumabot.admin_accounts']
+        self._admin_account_keys = set(
+            irc_lower(account) for account in self.admins)
+        self.accounts = AccountTracker(
+            config['accounts.ttl'], config['accounts.max_cached'],
+            config['accounts.timeout'])
+        self.services = set(
+            service.lower() for service in config['outbound.services'])
+        self.protocol = None
+        self.service = None
+        self.stopped = None
+        self.outbound = OutboundScheduler(
+            config['outbound.rate'], config['outbound.burst'])
+        # Lowercased channel -> (channel, key)
+        self.channels = OrderedDict(
+            (irc_lower(channel), (channel, None))
+            for channel in config['akumabot.channels'])
+        # Lowercased names of the channels the bot is in, and of those
+        # it has sent a JOIN for and not heard back about.
+        self.joined = set()
+        self._joining = set()
+        self._join_started = None
+        self._registered = False
+        self.members = MembershipIndex()
+        # What was said lately in each channel, if any is kept.
+        self.scrollback = None
+        if config['scrollback.max_bytes'] > 0:
+            self.scrollback = Scrollback(config['scrollback.max_bytes'])
 
-    def add_listener(self, event, listener):
-        self.listeners[event].append(listener)
+    @property
+    def commands(self):
+        return self.bot.command_processor.commands
 
-    def _run_listeners(self, event, *args):
-        for listener in self.listeners[event]:
-            listener(*args)
+    def connect(self, reactor):
+        """
+        Connect, and reconnect whenever the connection is lost.
+
+        :returns: A Deferred that fires once `disconnect` is called.
+        """
+        log.msg('Connecting to network {0!r}'.format(self.name))
+        endpoint = endpoints.clientFromString(
+            reactor, self.config['akumabot.endpoint'])
+        factory = AkumaBotFactory(self.config, self)
+        self.service = ClientService(
+            endpoint, factory, retryPolicy=backoffPolicy(maxDelay=300),
+            clock=reactor)
+        self.stopped = defer.Deferred()
+        self.service.startService()
+        return self.stopped
 
     def got_protocol(self, protocol):
         self.protocol = protocol
         self.protocol.bot = self
-        self.command_processor.add_listeners()
+        # Anything still queued was meant for the previous connection.
+        self.outbound.clear()
+        self.joined.clear()
+        self._joining.clear()
+        self._join_started = None
+        self._registered = False
+        self.members.clear()
+        self.accounts.clear()
         return protocol
 
+    def signed_on(self):
+        self._registered = True
+        self.members.set_prefixes(
+            self.protocol.supported.getFeature('PREFIX'))
+        self._join_channels(self.channels.values())
+
+    def _join_channels(self, channels):
+        """
+        Send as few JOIN lines as will hold ``channels``, a list of
+        (channel, key) pairs.
+        """
+        channels = [
+            (channel, key) for channel, key in channels
+            if irc_lower(channel) not in self.joined and
+            irc_lower(channel) not in self._joining]
+        if not channels:
+            return
+        if self._join_started is None:
+            self._join_started = self.clock.seconds()
+        self._joining.update(irc_lower(channel) for channel, _ in channels)
+        targmax = self.protocol.supported.getFeature('TARGMAX') or {}
+        for line in pack_joins(channels, max_targets=targmax.get('JOIN')):
+            self._send('JOIN', PRIORITY_HIGH, 'sendLine', (line,))
+
+    def joined_channel(self, channel):
+        key = irc_lower(channel)
+        # The server may put the bot in channels it didn't ask for.
+        self.channels.setdefault(key, (channel, None))
+        self.joined.add(key)
+        self._joined_or_failed(key)
+
+    def join_failed(self, channel, reason):
+        self._joined_or_failed(irc_lower(channel))
+
+    def _joined_or_failed(self, key):
+        if key not in self._joining:
+            return
+        self._joining.discard(key)
+        if not self._joining:
+            elapsed = self.clock.seconds() - self._join_started
+            self._join_started = None
+            metrics.join_duration.observe(elapsed, self.name)
+            log.msg('Joined {0} channels on network {1!r} in {2:.2f}s'.format(
+                len(self.joined), self.name, elapsed))
+
+    def left_channel(self, channel):
+        self.joined.discard(irc_lower(channel))
+        if self.scrollback is not None:
+            self.scrollback.remove(channel)
+        for nickname in self.members.remove_channel(channel):
+            self.accounts.forget(nickname)
+
+    def names_reply(self, channel, names):
+        # Only channels the bot is in are tracked, not ones someone
+        # asked for the NAMES of.
+        if irc_lower(channel) in self.joined:
+            self.members.names_reply(channel, names)
+
+    def end_of_names(self, channel):
+        self.members.end_of_names(channel)
+
+    def who_reply(self, channel, nickname, flags):
+        self.members.who_reply(channel, nickname, flags)
+
+    def mode_changed(self, channel, added, modes, args):
+        self.members.modes_changed(channel, added, modes, args)
+
+    def nick_changed(self, old, new):
+        self.members.rename(old, new)
+
+    def is_member(self, nickname, channel):
+        return self.members.is_member(nickname, channel)
+
+    def last_seen(self, nickname):
+        """
+        :returns:
+            A Deferred that fires with ``nickname``'s last
+            `akumabot.activity.Sighting`, or None if it hasn't been seen
+            or no activity is being kept.
+        """
+        if self.bot.activity is None:
+            return defer.succeed(None)
+        return self.bot.activity.last_seen(self.name, nickname)
+
+    def search_scrollback(self, channel, query, since=None, limit=10):
+        """
+        :returns:
+            Up to ``limit`` (time, nickname, message) tuples for the
+            lines said in ``channel`` since ``since`` that contain every
+            word in ``query``, newest first.
+        """
+        if self.scrollback is None:
+            return []
+        return self.scrollback.search(channel, query, since, limit)
+
+    def is_admin(self, nickname):
+        """
+        :returns:
+            Whether ``nickname`` is an admin, or None if that depends on
+            an account the bot doesn't know yet; see `check_admin`.
+        """
+        if not self.admin_accounts:
+            return nickname in self.admins
+        account = self.accounts.account(nickname)
+        if account is UNKNOWN:
+            return None
+        return (account is not None and
+                irc_lower(account) in self._admin_account_keys)
+
+    def check_admin(self, nickname):
+        """
+        Like `is_admin`, but sends a WHOIS if it has to.
+
+        :returns: A Deferred that fires with True or False.
+        """
+        d = self.accounts.lookup(nickname, self._whois)
+        d.addCallback(lambda _: bool(self.is_admin(nickname)))
+        return d
+
+    def _whois(self, nickname):
+        metrics.whois_lookups.inc(self.name)
+        self._send(nickname, PRIORITY_HIGH, 'whois', (nickname,))
+
+    def account_changed(self, nickname, account):
+        self.accounts.account_changed(nickname, account)
+
+    def whois_account(self, nickname, account):
+        self.accounts.whois_account(nickname, account)
+
+    def end_of_whois(self, nickname):
+        self.accounts.end_of_whois(nickname)
+
+    def _forget_if_gone(self, nickname):
+        # Once the bot shares no channel with a user it won't hear if
+        # they quit, so the nick could soon be someone else's.
+        if not self.members.channels(nickname):
+            self.accounts.forget(nickname)
+
+    def _priority(self, target, nickname=None):
+        """
+        Replies to admins and messages to services jump the queue.
+        """
+        if nickname and self.is_admin(nickname):
+            return PRIORITY_HIGH
+        if target.lower() in self.services:
+            return PRIORITY_HIGH
+        return PRIORITY_NORMAL
+
+    def _send(self, target, priority, method, args, on_sent=None):
+        self.outbound.enqueue(
+            target, priority, self._call_protocol, (method, args, on_sent))
+
+    def _send_text(self, target, priority, method, message, on_sent):
+        """
+        Queue ``message`` as one line to ``target`` per line it splits
+        into, calling ``on_sent`` after the last.
+        """
+        lines = split_lines(message, self.message_budget(target))
+        if not lines:
+            return
+        # The lines already fit, so IRCClient.msg mustn't split them
+        # again by its own guess at the hostmask.
+        for line in lines[:-1]:
+            self._send(
+                target, priority, method,
+                (target, line, irc.MAX_COMMAND_LENGTH))
+        self._send(
+            target, priority, method,
+            (target, lines[-1], irc.MAX_COMMAND_LENGTH), on_sent)
+
+    def _call_protocol(self, method, args, on_sent):
+        if self.protocol is not None:
+            getattr(self.protocol, method)(*args)
+            if on_sent is not None:
+                on_sent()
+
     def disconnect(self):
-        self.protocol.transport.loseConnection()
+        """
+        Close the connection for good.
+        """
+        if self.service is None:
+            self.protocol.transport.loseConnection()
+            return
+        if self.service.running:
+            d = self.service.stopService()
+            d.addCallback(lambda _: self.stopped.callback(None))
 
     def leave_channel(self, channel, message=None):
-        self.protocol.leave(channel, message)
+        self.channels.pop(irc_lower(channel), None)
+        self._send(channel, PRIORITY_HIGH, 'leave', (channel, message))
 
     def join_channel(self, channel, key=None):
-        self.protocol.join(channel, key)
+        if channel[:1] not in irc.CHANNEL_PREFIXES:
+            channel = '#' + channel
+        self.channels[irc_lower(channel)] = (channel, key)
+        # Before signing on, the channel is joined along with the rest.
+        if self._registered:
+            self._join_channels([(channel, key)])
+
+    def message_budget(self, target):
+        """
+        :returns:
+            How many bytes of text fit in one PRIVMSG to ``target``, as
+            the server relays it with the bot's hostmask in front.
+        """
+        hostmask = None
+        if self.protocol is not None:
+            hostmask = self.protocol.hostmask
+        if hostmask is None:
+            # Until the bot has seen its own, assume a long one.
+            hostmask = '{0}!{1}@{2}'.format(
+                self.nickname, 'u' * 10, 'h' * 63)
+        return (irc.MAX_COMMAND_LENGTH - 2 -
+                len(':{0} PRIVMSG {1} :'.format(hostmask, target)))
+
+    def send_private_message(self, message, nickname, on_sent=None):
+        """
+        Send ``message``, as several lines if it has line breaks or is
+        too long for one.
 
-    def send_private_message(self, message, nickname):
+        :param on_sent:
+            Called with no arguments once the message has been written
+            to the connection.
+        """
         if not message:
             return
-        self.protocol.msg(nickname, message)
+        priority = self._priority(nickname, nickname)
+        self._send_text(nickname, priority, 'msg', message, on_sent)
 
-    def send_channel_message(self, message, channel, nick=None):
+    def send_channel_message(self, message, channel, nick=None,
+                             on_sent=None):
         if not message:
             return
         if nick:
-            message = '{0}, {1}'.format(nick, message)
-        self.protocol.say(channel, message)
+            message = '{0}, {1}'.format(nick, encode(message))
+        priority = self._priority(channel, nick)
+        self._send_text(channel, priority, 'say', message, on_sent)
+
+    def send_next_page(self, channel, nickname):
+        """
+        Send ``nickname`` the next page of its last long reply in
+        ``channel``, or in private if ``channel`` is None.
+
+        :returns: Whether there was one.
+        """
+        return self.bot.command_processor.send_next_page(
+            self, channel, nickname)
 
     def kick_user(self, channel, user, reason=None):
-        self.protocol.kick(channel, user, reason)
+        self._send(channel, PRIORITY_HIGH, 'kick', (channel, user, reason))
 
     def received_notice(self, nickname, channel, message):
-        pass
+        self.bot.events.publish(
+            'received_notice', self, nickname, channel, message)
 
     def kicked(self, channel, kicker, message):
-        pass
+        self.channels.pop(irc_lower(channel), None)
+        self.joined.discard(irc_lower(channel))
+        if self.scrollback is not None:
+            self.scrollback.remove(channel)
+        for nickname in self.members.remove_channel(channel):
+            self.accounts.forget(nickname)
+        self.bot.events.publish('kicked', self, channel, kicker, message)
 
     def received_message(self, nickname, channel, message):
-        self._run_listeners('received_message', nickname, channel, message)
+        if self.scrollback is not None:
+            self.scrollback.add(
+                channel, self.clock.seconds(), nickname, message)
+        self.bot.events.publish(
+            'received_message', self, nickname, channel, message)
 
     def received_private_message(self, nickname, message):
-        self._run_listeners('received_private_message', nickname, message)
+        self.bot.events.publish(
+            'received_private_message', self, nickname, message)
 
     def user_joined(self, user, channel):
-        pass
+        self.members.add(user, channel)
+        self.bot.events.publish('user_joined', self, user, channel)
 
     def user_left(self, user, channel):
-        pass
+        self.members.remove(user, channel)
+        self._forget_if_gone(user)
+        self.bot.events.publish('user_left', self, user, channel)
+
+    def user_kicked(self, user, channel, kicker, message):
+        self.members.remove(user, channel)
+        self._forget_if_gone(user)
+        self.bot.events.publish(
+            'user_kicked', self, user, channel, kicker, message)
 
     def user_quit(self, user, message):
-        pass
+        self.members.quit(user)
+        self.accounts.forget(user)
+        self.bot.events.publish('user_quit', self, user, message)
+
+    def netsplit(self, servers, nicknames):
+        """
+        Handle the QUITs of a netsplit together.
+
+        Listeners to ``netsplit`` get the two servers and a list of
+        (nickname, channels) pairs for the users lost.
+        """
+        lost = []
+        for nickname in nicknames:
+            lost.append((nickname, self.members.quit(nickname)))
+            self.accounts.forget(nickname)
+        self.bot.events.publish('netsplit', self, servers, lost)
+
+    def netjoin(self, servers, joins):
+        """
+        Handle the JOINs of users coming back after a netsplit.
+
+        Listeners to ``netjoin`` get the two servers and a list of
+        (nickname, channel) pairs.
+        """
+        for nickname, channel in joins:
+            self.members.add(nickname, channel)
+        self.bot.events.publish('netjoin', self, servers, joins)
 
     def user_renamed(self, oldname, newname):
-        pass
+        self.members.rename(oldname, newname)
+        self.accounts.renamed(oldname, newname)
+        self.bot.events.publish('user_renamed', self, oldname, newname)
@@ -0,0 +1,93 @@
+import collections
+
+from twisted.internet import reactor
+
+
+_missing = object()
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that evicts the least recently used entry once
+    it holds ``maxsize`` entries.
+
+    Keeps ``hits`` and ``misses`` counters for lookups made via `get`.
+    """
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._store = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        value = self._store.pop(key, _missing)
+        if value is _missing:
+            self.misses += 1
+            return default
+        # Re-insert to mark the entry as most recently used.
+        self._store[key] = value
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._store.pop(key, None)
+        self._store[key] = value
+        if len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._store
+
+    def __len__(self):
+        return len(self._store)
+
+    def pop(self, key, default=None):
+        return self._store.pop(key, default)
+
+    def clear(self):
+        self._store.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'size': len(self._store),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class TTLCache(LRUCache):
+    """
+    An `LRUCache` whose entries also expire ``ttl`` seconds after they
+    were set.
+    """
+    def __init__(self, maxsize, ttl, clock=reactor):
+        LRUCache.__init__(self, maxsize)
+        self.ttl = ttl
+        self.clock = clock
+
+    def get(self, key, default=None):
+        entry = self._store.pop(key, _missing)
+        if entry is _missing or entry[0] <= self.clock.seconds():
+            self.misses += 1
+            return default
+        self._store[key] = entry
+        self.hits += 1
+        return entry[1]
+
+    def __setitem__(self, key, value):
+        LRUCache.__setitem__(
+            self, key, (self.clock.seconds() + self.ttl, value))
+
+    def __contains__(self, key):
+        entry = self._store.get(key, _missing)
+        return entry is not _missing and entry[0] > self.clock.seconds()
+
+    def stats(self):
+        stats = LRUCache.stats(self)
+        stats['ttl'] = self.ttl
+        return stats
@@ -0,0 +1,214 @@
+"""
+Evaluate calculator expressions in a bounded pool of sandboxed worker
+processes, so that expensive expressions can't stall the reactor.
+
+Each worker is ``python -m akumabot.calcpool`` speaking one JSON object
+per line over its stdin and stdout.
+"""
+import collections
+import json
+import math
+import os
+import resource
+import sys
+
+from twisted.internet import defer, error, protocol
+from twisted.python import log
+
+from akumabot.calculate import compile_expression, CalculatorParseError
+
+
+class CalculatorTooExpensive(Exception):
+    """
+    The expression exceeded the worker's time or memory limits.
+    """
+
+
+class CalculatorBusy(Exception):
+    """
+    Too many expressions are already waiting for a worker.
+    """
+
+
+# Error names sent by workers, mapped to the exceptions they stand for.
+_errors = {
+    'parse': CalculatorParseError,
+    'zerodivision': ZeroDivisionError,
+    'expensive': CalculatorTooExpensive,
+}
+
+
+class _WorkerProtocol(protocol.ProcessProtocol):
+    def __init__(self, pool):
+        self.pool = pool
+        self.job = None
+        self.deadline = None
+        self._buffer = ''
+
+    def send_job(self, job, deferred):
+        self.job = deferred
+        self.transport.write(job + '\n')
+
+    def outReceived(self, data):
+        self._buffer += data
+        while '\n' in self._buffer:
+            line, _, self._buffer = self._buffer.partition('\n')
+            self.pool._job_finished(self, json.loads(line))
+
+    def errReceived(self, data):
+        log.msg('Calculator worker stderr: {0!r}'.format(data))
+
+    def processEnded(self, reason):
+        self.pool._worker_ended(self, reason)
+
+
+class CalculatorPool(object):
+    """
+    Hands expressions to at most ``size`` worker processes, queueing at
+    most ``queue_limit`` more.
+
+    Workers are started on demand and replaced when they die. Each job
+    may use ``cpu_limit`` seconds of CPU time and the worker at most
+    ``memory_limit`` bytes of address space; a job that takes longer
+    than ``timeout`` seconds of wall time has its worker killed.
+    """
+    def __init__(self, reactor, size=2, queue_limit=20, timeout=2.0,
+                 cpu_limit=1, memory_limit=256 * 1024 * 1024,
+                 engine='parsley'):
+        self.reactor = reactor
+        self.size = size
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.engine = engine
+        self._queue = collections.deque()
+        self._idle = []
+        self._busy = set()
+        self._shutdown_trigger = None
+
+    def calculate(self, expression):
+        """
+        :returns:
+            A Deferred that fires with the value of ``expression``, or
+            fails with `CalculatorParseError`, `ZeroDivisionError`,
+            `CalculatorTooExpensive` or `CalculatorBusy`.
+        """
+        if len(self._queue) >= self.queue_limit:
+            return defer.fail(CalculatorBusy())
+        # Serialize before a worker is taken, so that bytes which aren't
+        # UTF-8, and so can't go in JSON, are turned away here.
+        try:
+            job = json.dumps({'expression': expression})
+        except UnicodeDecodeError:
+            return defer.fail(CalculatorParseError())
+        d = defer.Deferred()
+        self._queue.append((job, d))
+        self._dispatch()
+        return d
+
+    def stop(self):
+        for worker in list(self._idle) + list(self._busy):
+            worker.transport.signalProcess('KILL')
+
+    def _dispatch(self):
+        missing = min(
+            len(self._queue) - len(self._idle),
+            self.size - len(self._idle) - len(self._busy))
+        for _ in range(missing):
+            self._start_worker()
+        while self._queue and self._idle:
+            worker = self._idle.pop()
+            job, d = self._queue.popleft()
+            self._busy.add(worker)
+            worker.deadline = self.reactor.callLater(
+                self.timeout, self._job_expired, worker)
+            worker.send_job(job, d)
+
+    def _start_worker(self):
+        if self._shutdown_trigger is None:
+            self._shutdown_trigger = self.reactor.addSystemEventTrigger(
+                'before', 'shutdown', self.stop)
+        worker = _WorkerProtocol(self)
+        args = [
+            sys.executable, '-m', 'akumabot.calcpool',
+            str(self.cpu_limit), str(self.memory_limit), self.engine,
+        ]
+        self.reactor.spawnProcess(
+            worker, sys.executable, args, env=os.environ,
+            childFDs={0: 'w', 1: 'r', 2: 'r'})
+        self._idle.append(worker)
+
+    def _job_finished(self, worker, reply):
+        d, worker.job = worker.job, None
+        if d is None:
+            # The deadline passed and the worker is being killed.
+            return
+        deadline, worker.deadline = worker.deadline, None
+        if deadline is not None and deadline.active():
+            deadline.cancel()
+        self._busy.discard(worker)
+        self._idle.append(worker)
+        if 'error' in reply:
+            d.errback(_errors[reply['error']]())
+        else:
+            d.callback(reply['result'])
+        self._dispatch()
+
+    def _job_expired(self, worker):
+        worker.deadline = None
+        d, worker.job = worker.job, None
+        worker.transport.signalProcess('KILL')
+        d.errback(CalculatorTooExpensive())
+
+    def _worker_ended(self, worker, reason):
+        if worker in self._idle:
+            self._idle.remove(worker)
+        self._busy.discard(worker)
+        if worker.deadline is not None and worker.deadline.active():
+            worker.deadline.cancel()
+        if worker.job is not None:
+            # Killed by its resource limits while working.
+            d, worker.job = worker.job, None
+            d.errback(CalculatorTooExpensive())
+        if not reason.check(error.ProcessDone):
+            log.msg('Calculator worker ended: {0}'.format(
+                reason.getErrorMessage()))
+        self._dispatch()
+
+
+def _limit_cpu(seconds):
+    used = resource.getrusage(resource.RUSAGE_SELF)
+    used = used.ru_utime + used.ru_stime
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(
+        resource.RLIMIT_CPU, (int(math.ceil(used)) + seconds, hard))
+
+
+def _evaluate(expression, engine):
+    try:
+        return {'result': compile_expression(expression, engine)()}
+    except CalculatorParseError:
+        return {'error': 'parse'}
+    except ZeroDivisionError:
+        return {'error': 'zerodivision'}
+    except (MemoryError, RuntimeError):
+        # RuntimeError is what Python 2 raises on too-deep recursion.
+        return {'error': 'expensive'}
+
+
+def _worker_main(cpu_limit, memory_limit, engine):
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            return
+        _limit_cpu(cpu_limit)
+        job = json.loads(line)
+        reply = _evaluate(job['expression'], engine)
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    _worker_main(int(sys.argv[1]), int(sys.argv[2]), sys.argv[3])
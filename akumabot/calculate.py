@@ -7,23 +7,68 @@ import operator
 from parsley import makeGrammar
 from ometa.runtime import ParseError as _ParsleyParseError
 
+from akumabot.cache import LRUCache
+
 
 class CalculatorParseError(Exception):
     pass
 
 
-def calculate_expression(expression):
-    try:
-        return grammar(expression).expr()
-    except _ParsleyParseError:
-        raise CalculatorParseError
+# Parsed expressions, as closures that evaluate without parsley.
+_compiled_cache = LRUCache(1024)
+# Results of evaluating those expressions.
+_result_cache = LRUCache(256)
+
+
+def calculate_expression(expression, engine='parsley'):
+    key = engine, expression
+    result = _result_cache.get(key)
+    if result is None:
+        result = compile_expression(expression, engine)()
+        _result_cache[key] = result
+    return result
+
+
+def compile_expression(expression, engine='parsley'):
+    """
+    Parse ``expression`` into a callable that takes no arguments and
+    returns its value.
+
+    :param engine:
+        The name of the parser to use, one of the keys of `engines`.
+
+    :raises CalculatorParseError: if the expression is invalid.
+    """
+    key = engine, expression
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        try:
+            parse = engines[engine]
+        except KeyError:
+            raise ValueError(
+                'Unknown calculator engine {0!r}'.format(engine))
+        compiled = parse(expression)
+        _compiled_cache[key] = compiled
+    return compiled
+
+
+def cache_stats():
+    return {
+        'compiled': _compiled_cache.stats(),
+        'result': _result_cache.stats(),
+    }
+
+
+def clear_caches():
+    _compiled_cache.clear()
+    _result_cache.clear()
 
 
 _grammar_text = """
 integer = <'-'? digit+>:val -> val
 float = <integer '.' digit+>:val -> val
 scinote = <(float | integer) ('e' | 'E') ('+' | '-')? digit+>:val -> val
-number =  <scinote | float | integer>:n -> float(n)
+number =  <scinote | float | integer>:n -> constant(n)
 parens = '(' ws expr:e ws ')' -> e
 value = number | parens
 ws = ' '*
@@ -56,4 +101,146 @@ def _calculate(start, pairs):
     return result
 
 
-grammar = makeGrammar(_grammar_text, {'calculate': _calculate})
+def _compile_constant(text):
+    value = float(text)
+    return lambda: value
+
+
+def _compile_calculate(start, pairs):
+    if not pairs:
+        return start
+    steps = [(operations[op], operand) for op, operand in pairs]
+
+    def evaluate():
+        result = start()
+        for op, operand in steps:
+            result = op(result, operand())
+        return result
+    return evaluate
+
+
+def _compile_binary(op, left, right):
+    return lambda: op(left(), right())
+
+
+class _PrattParser(object):
+    """
+    Hand-written precedence climbing parser for the same language as
+    ``_grammar_text``, producing the same closures as ``_compiler``.
+
+    Like the grammar, ``+`` and ``-`` are left associative while ``*``
+    and ``/`` are right associative (``8 / 4 / 2`` is ``8 / (4 / 2)``),
+    spaces are only allowed around operators and inside parentheses,
+    and ``-`` is only unary as part of a number literal.
+    """
+    # Operator to (left binding power, right binding power).
+    _binding_powers = {
+        '+': (10, 11),
+        '-': (10, 11),
+        '*': (20, 20),
+        '/': (20, 20),
+    }
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+
+    def parse(self):
+        result = self.expr(0)
+        if self.pos != len(self.text):
+            raise CalculatorParseError
+        return result
+
+    def expr(self, min_power):
+        left = self.value()
+        text = self.text
+        while True:
+            start = self.pos
+            self.skip_spaces()
+            op = text[self.pos:self.pos + 1]
+            powers = self._binding_powers.get(op)
+            if powers is None or powers[0] < min_power:
+                self.pos = start
+                return left
+            self.pos += 1
+            self.skip_spaces()
+            right = self.expr(powers[1])
+            left = _compile_binary(operations[op], left, right)
+
+    def value(self):
+        if self.text[self.pos:self.pos + 1] == '(':
+            self.pos += 1
+            self.skip_spaces()
+            result = self.expr(0)
+            self.skip_spaces()
+            if self.text[self.pos:self.pos + 1] != ')':
+                raise CalculatorParseError
+            self.pos += 1
+            return result
+        return _compile_constant(self.number())
+
+    def number(self):
+        text = self.text
+        start = self.pos
+        pos = start
+        if text[pos:pos + 1] == '-':
+            pos += 1
+        pos = self._digits(pos)
+        if pos is None:
+            raise CalculatorParseError
+        end = pos
+        if text[end:end + 1] == '.':
+            fraction_end = self._digits(end + 1)
+            if fraction_end is not None:
+                end = fraction_end
+        if text[end:end + 1] in ('e', 'E'):
+            pos = end + 1
+            if text[pos:pos + 1] in ('+', '-'):
+                pos += 1
+            exponent_end = self._digits(pos)
+            if exponent_end is not None:
+                end = exponent_end
+        self.pos = end
+        return text[start:end]
+
+    def _digits(self, pos):
+        """
+        Return the position after a run of digits starting at ``pos``,
+        or None if there are no digits there.
+        """
+        text = self.text
+        end = pos
+        while end < len(text) and text[end].isdigit():
+            end += 1
+        if end == pos:
+            return None
+        return end
+
+    def skip_spaces(self):
+        text = self.text
+        while text[self.pos:self.pos + 1] == ' ':
+            self.pos += 1
+
+
+def _parse_with_parsley(expression):
+    try:
+        return _compiler(expression).expr()
+    except _ParsleyParseError:
+        raise CalculatorParseError
+
+
+def _parse_with_pratt(expression):
+    return _PrattParser(expression).parse()
+
+
+grammar = makeGrammar(
+    _grammar_text, {'constant': float, 'calculate': _calculate})
+_compiler = makeGrammar(
+    _grammar_text,
+    {'constant': _compile_constant, 'calculate': _compile_calculate})
+
+
+engines = {
+    'parsley': _parse_with_parsley,
+    'pratt': _parse_with_pratt,
+}
@@ -0,0 +1,640 @@
+"""
+Command processing, and the registry of commands.
+
+Commands live in plugin modules that are only imported when a command
+is first used: the registry holds each command's name, where to find
+its class and whether it is admin-only, which is enough to list them.
+
+A command may declare its arguments as an `akumabot.arguments.Arguments`
+schema in its ``arguments`` attribute, along with a ``description``;
+the schema is compiled when the command is loaded, and its usage line
+made from the two.
+"""
+import importlib
+import re
+import shlex
+from collections import defaultdict
+
+from zope.interface import Interface, Attribute, directlyProvides
+from zope.interface.verify import verifyObject
+from twisted.logger import Logger
+from twisted.internet import reactor, defer
+from twisted.python.failure import Failure
+
+from akumabot import metrics
+from akumabot.arguments import ArgumentError
+from akumabot.cache import TTLCache
+from akumabot.fuzzy import SuggestionIndex
+from akumabot.membership import irc_lower
+from akumabot.paging import Pager
+
+
+class ICommand(Interface):
+    name = Attribute("The name of the command")
+    admin_only = Attribute("True if the command is only usable by admins")
+    pm_only = Attribute("True if the command is only useable in a PM")
+    channel_only = Attribute("True if the command is only usable in-channel")
+    usage = Attribute("Help message with a format key the command name")
+    cache = Attribute(
+        "A CachePolicy for the command's responses, or None to always run "
+        "it. Commands with side effects must use None")
+
+    def run(bot, channel, nickname, command_args):
+        """
+        Run a command provided via IRC.
+
+        :param bot:
+            The `akumabot.bot.Network` the command came from. Its
+            ``commands`` attribute is the `CommandRegistry` of the
+            commands enabled on it, and ``is_admin(nickname)`` says
+            whether the sender is an admin.
+        :param channel:
+            The channel in which the command was received, or None
+            if it came from a private message.
+        :param nickname:
+            The IRC nickname who sent the command.
+        :param command_args:
+            A list of the values of the command's ``arguments``, or for
+            a command without them, of the words of its argument string
+            as split by `shlex.split`.
+
+        :returns:
+            A response string or None if no response is to be sent,
+            or a Deferred that fires with the above. Instead of a
+            string, a command may give an iterable of strings, which is
+            only read as far as the pages of the reply sent need.
+        """
+
+
+class CachePolicy(object):
+    """
+    Lets `CommandProcessor` reuse a command's responses for ``ttl``
+    seconds, keeping at most ``maxsize`` of them.
+
+    :param key:
+        Called with the command's arguments to get the part of the cache
+        key they make up, or None if the response can't be reused. By
+        default the arguments themselves are used.
+    """
+    def __init__(self, ttl, maxsize=256, key=tuple):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.key = key
+
+
+class TransientReply(str):
+    """
+    A response that must not be cached, e.g. because the bot was too
+    busy to work out the real answer.
+    """
+
+
+def parse_arguments(command, argstring):
+    """
+    Split ``argstring`` into ``command``'s arguments.
+
+    :raises ArgumentError: If they don't fit the command.
+    """
+    parse = getattr(command, 'parse_arguments', None)
+    if parse is not None:
+        return parse(argstring)
+    try:
+        return shlex.split(argstring)
+    except ValueError:
+        raise ArgumentError(command.usage.format(command.name))
+
+
+class CommandProcessor(object):
+    log = Logger()
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.commands = registry
+        # An akumabot.workers.WorkerPool to run commands in, if any.
+        self.worker_pool = None
+        # An akumabot.ratelimit.RateLimiter for non-admins, if any.
+        self.rate_limiter = None
+        # Command name -> TTLCache of responses
+        self.response_caches = {}
+        # Cuts long replies short, keeping the rest for "more".
+        self.pager = Pager()
+        self._triggers = {}
+        self.trigger, self.command_regex = self._get_trigger(
+            self.bot.config['akumabot.nickname'])
+
+    def _get_trigger(self, nickname):
+        """
+        Return the trigger and compiled command regex for a network on
+        which the bot is called ``nickname``.
+        """
+        try:
+            return self._triggers[nickname]
+        except KeyError:
+            pass
+        trigger = self.bot.config['commands.trigger']
+        if trigger == '<nick>':
+            trigger = nickname
+        pattern = '''
+            ^
+                (?P<trigger>{trigger}[,: ]*)
+                (?P<rest>.*)
+            $
+        '''.format(trigger=re.escape(trigger))
+        compiled = trigger, re.compile(pattern, re.VERBOSE)
+        self._triggers[nickname] = compiled
+        return compiled
+
+    def add_listeners(self):
+        self.bot.add_listener('received_message', self.process_message)
+        self.bot.add_listener(
+            'received_private_message', self.process_private_message)
+
+    def process_message(self, network, nickname, channel, message):
+        trigger, command_regex = self._get_trigger(network.nickname)
+        # Most channel lines aren't commands, so reject them as cheaply
+        # as possible before doing any real work. The protocol has
+        # already stripped the line.
+        if not message.startswith(trigger):
+            return
+        command_string = self._detect_command(message, command_regex)
+        if not command_string:
+            return
+        command, argstring = self._split_command(command_string)
+        self.run_command(network, command, channel, nickname, argstring)
+
+    def process_private_message(self, network, nickname, message):
+        command, argstring = self._split_command(message)
+        self.run_command(network, command, None, nickname, argstring)
+
+    def run_command(self, network, command_name, channel, nickname,
+                    argstring, is_admin=None):
+        """
+        :param is_admin:
+            Whether ``nickname`` is an admin, if already known.
+        """
+        command = self.commands.resolve(command_name)
+        if command is None:
+            self.log.info(
+                'Ignoring unknown command {command!r}',
+                event_type='unknown_command', command=command_name)
+            # Don't let arbitrary user input become a label value.
+            metrics.commands_rejected.inc('<unknown>', 'unknown')
+            self._suggest(network, command_name, channel, nickname)
+            return
+        # Aliases and abbreviations are counted under the real name.
+        command_name = command.name
+        if is_admin is None:
+            is_admin = network.is_admin(nickname)
+        if is_admin is None and command.admin_only:
+            # Only admin commands are worth a WHOIS; for anything else a
+            # nick whose account isn't known yet is treated as a user.
+            d = network.check_admin(nickname)
+            d.addCallback(
+                lambda is_admin: self.run_command(
+                    network, command_name, channel, nickname, argstring,
+                    is_admin))
+            d.addErrback(
+                lambda failure: self.log.failure(
+                    'Checking whether {nickname!r} is an admin failed',
+                    failure, nickname=nickname))
+            return
+        is_admin = bool(is_admin)
+        if command.admin_only and not is_admin:
+            self.log.info(
+                'Ignoring command {command!r} with args {argstring!r} '
+                'from non-admin nick {nickname!r} on {network!r}',
+                event_type='rejected_command', command=command_name,
+                argstring=argstring, nickname=nickname,
+                network=network.name)
+            metrics.commands_rejected.inc(command_name, 'not_admin')
+            return
+        if channel is None and command.channel_only:
+            metrics.commands_rejected.inc(command_name, 'channel_only')
+            return
+        if channel and command.pm_only:
+            metrics.commands_rejected.inc(command_name, 'pm_only')
+            return
+        if self.rate_limiter is not None and not is_admin:
+            scope = self.rate_limiter.allow(
+                network.name, nickname, channel, command_name)
+            if scope is not None:
+                self.log.debug(
+                    'Dropping command {command!r} from {nickname!r} on '
+                    '{network!r}: {scope} rate limit',
+                    event_type='rate_limited', command=command_name,
+                    nickname=nickname, network=network.name, scope=scope)
+                metrics.commands_rejected.inc(
+                    command_name, 'rate_limited_' + scope)
+                # Only a nick's own limit is worth a reply; one for each
+                # nick over a channel or network limit would add to the
+                # flood.
+                if scope == 'nick' and self.rate_limiter.should_warn(
+                        network.name, nickname):
+                    self._send_lines(
+                        ["You're sending commands too fast, slow down"],
+                        network, channel, nickname)
+                return
+
+        try:
+            args = parse_arguments(command, argstring)
+        except ArgumentError as e:
+            metrics.commands_rejected.inc(command_name, 'bad_arguments')
+            self._send_reply(
+                str(e), network, command_name, channel, nickname,
+                reactor.seconds())
+            return
+        cache, key = self._response_cache(command, is_admin, args)
+        if cache is not None:
+            reply = cache.get(key)
+            metrics.response_cache.inc(
+                command_name, 'miss' if reply is None else 'hit')
+            if reply is not None:
+                self._send_reply(
+                    reply, network, command_name, channel, nickname,
+                    reactor.seconds())
+                return
+
+        self.log.info(
+            'Running {command} command with args {args} on {network!r}',
+            event_type='command', command=command_name, args=args,
+            network=network.name)
+        metrics.commands_run.inc(command_name)
+        started = reactor.seconds()
+        if self.worker_pool is None:
+            d = defer.maybeDeferred(
+                command.run, network, channel, nickname, args)
+        else:
+            d = self.worker_pool.run_command(
+                network, command_name, channel, nickname, argstring,
+                is_admin)
+        if cache is not None:
+            d.addCallback(self._cache_reply, cache, key)
+        d.addErrback(self._show_error, command_name)
+        d.addCallback(
+            self._send_reply, network, command_name, channel, nickname,
+            started)
+
+    def _suggest(self, network, command_name, channel, nickname):
+        """
+        Reply with the commands ``command_name`` may have been a typo
+        for, if there are any that ``nickname`` may use.
+        """
+        suggestions = self.commands.suggest(command_name)
+        if not suggestions:
+            return
+        if not network.is_admin(nickname):
+            suggestions = [
+                name for name in suggestions
+                if not self.commands.get(name).admin_only]
+            if not suggestions:
+                return
+            # Replies to typos count against the limits like commands.
+            if self.rate_limiter is not None and self.rate_limiter.allow(
+                    network.name, nickname, channel,
+                    '<unknown>') is not None:
+                return
+        self._send_reply(
+            'Unknown command {0!r}, did you mean {1}?'.format(
+                command_name, ' or '.join(suggestions)),
+            network, '<unknown>', channel, nickname, reactor.seconds())
+
+    def _response_cache(self, command, is_admin, args):
+        """
+        Return the cache for ``command``'s response to ``args`` and the
+        key to look it up with, or (None, None) if it can't be cached.
+        """
+        policy = command.cache
+        if policy is None:
+            return None, None
+        args_key = policy.key(args)
+        if args_key is None:
+            return None, None
+        cache = self.response_caches.get(command.name)
+        if cache is None:
+            cache = self.response_caches[command.name] = TTLCache(
+                policy.maxsize, policy.ttl)
+        return cache, (args_key, is_admin)
+
+    def _cache_reply(self, reply, cache, key):
+        # A lazily produced reply can only be read once.
+        if (reply and isinstance(reply, basestring) and
+                not isinstance(reply, TransientReply)):
+            cache[key] = reply
+        return reply
+
+    def cache_stats(self):
+        return dict(
+            (name, cache.stats())
+            for name, cache in self.response_caches.items())
+
+    def _send_reply(self, reply, network, command_name, channel, nickname,
+                    started):
+        def sent():
+            metrics.command_latency.observe(
+                reactor.seconds() - started, command_name)
+        lines = None
+        if reply:
+            if channel:
+                # Leave room for the "nickname, " in front.
+                budget = (network.message_budget(channel) -
+                          len(nickname) - 2)
+            else:
+                budget = network.message_budget(nickname)
+            try:
+                lines = self.pager.first_page(
+                    self._page_key(network, channel, nickname), reply,
+                    budget)
+            except Exception:
+                lines = [self._show_error(Failure(), command_name)]
+        if not lines:
+            sent()
+            return
+        self._send_lines(lines, network, channel, nickname, sent)
+
+    def send_next_page(self, network, channel, nickname):
+        """
+        Send the next page of the last reply to ``nickname`` in
+        ``channel`` that didn't fit in one.
+
+        :returns: Whether there was one.
+        """
+        lines = self.pager.next_page(
+            self._page_key(network, channel, nickname))
+        if lines is None:
+            return False
+        self._send_lines(lines, network, channel, nickname)
+        return True
+
+    def _page_key(self, network, channel, nickname):
+        return (network.name, channel and irc_lower(channel),
+                irc_lower(nickname))
+
+    def _send_lines(self, lines, network, channel, nickname, on_sent=None):
+        message = '\n'.join(lines)
+        if not channel:
+            network.send_private_message(message, nickname, on_sent=on_sent)
+        else:
+            network.send_channel_message(
+                message, channel, nickname, on_sent=on_sent)
+
+    def _detect_command(self, message, command_regex=None):
+        if command_regex is None:
+            command_regex = self.command_regex
+        m = command_regex.match(message.strip())
+        if m:
+            return m.group('rest')
+        else:
+            return None
+
+    def _split_command(self, command_string):
+        command, _, argstring = command_string.strip().partition(' ')
+        return command, argstring.lstrip()
+
+    def _show_error(self, failure, command_name):
+        self.log.failure(
+            'Command {command!r} failed', failure, command=command_name)
+        metrics.command_errors.inc(command_name)
+        return "Something terrible has happened!"
+
+
+def _load_command(path):
+    """
+    Import and instantiate the command class at ``path``, in
+    ``package.module:ClassName`` form.
+    """
+    module_name, _, class_name = path.partition(':')
+    return _prepare_command(
+        getattr(importlib.import_module(module_name), class_name)())
+
+
+def _prepare_command(command):
+    """
+    Compile ``command``'s argument schema, if it has one, and check that
+    it is a valid `ICommand`.
+    """
+    arguments = getattr(command, 'arguments', None)
+    if arguments is not None:
+        # The usage line is a format string, with the name as {0}.
+        usage = '{0}'
+        for separator, part in (
+                (' ', arguments.usage()),
+                ('   ', getattr(command, 'description', None))):
+            if part:
+                usage += separator + part.replace('{', '{{').replace(
+                    '}', '}}')
+        command.usage = usage
+        command.parse_arguments = arguments.compile(
+            command.usage.format(command.name))
+    directlyProvides(command, ICommand)
+    verifyObject(ICommand, command)
+    return command
+
+
+class LazyCommand(object):
+    """
+    Stands in for a command whose module hasn't been imported yet.
+
+    ``name`` and, if given, ``admin_only`` are known up front; asking
+    for anything else imports the module.
+    """
+    log = Logger()
+
+    def __init__(self, name, path, admin_only=None, preload=None):
+        self.name = name
+        self.path = path
+        if admin_only is not None:
+            self.admin_only = admin_only
+        self.preload = preload
+        self._command = None
+
+    @property
+    def command(self):
+        if self._command is None:
+            self.log.info(
+                'Loading command {command!r} from {path}',
+                command=self.name, path=self.path)
+            self._command = _load_command(self.path)
+            if self._command.name != self.name:
+                raise ValueError(
+                    '{0} is called {1!r}, not {2!r}'.format(
+                        self.path, self._command.name, self.name))
+        return self._command
+
+    def __getattr__(self, attribute):
+        return getattr(self.command, attribute)
+
+
+class CommandRegistry(object):
+    """
+    The commands available, by name.
+
+    Besides by its name, a command can be found by any of its aliases or
+    by an abbreviation of either that is at least ``min_prefix`` long
+    and no other command shares. Names win over aliases, and aliases
+    over abbreviations. Every name, alias and abbreviation is worked out
+    on the first lookup after a command is registered, so a lookup is
+    one dict access; the misspellings `suggest` looks for are indexed
+    at the same time.
+    """
+    min_prefix = 2
+
+    def __init__(self):
+        self._registry = {}
+        # command name -> tuple of its aliases
+        self._aliases = {}
+        self._index = None
+        # Abbreviations shared by several commands -> their names
+        self._ambiguous = None
+        self._suggestions = None
+
+    def _add(self, name, command, aliases):
+        self._registry[name] = command
+        self._aliases[name] = tuple(aliases)
+        self._index = None
+
+    def register_class(self, command_class):
+        command = _prepare_command(command_class())
+        self._add(command.name, command, getattr(command, 'aliases', ()))
+        return command_class
+
+    def register_lazy(self, name, path, admin_only=None, preload=None,
+                      aliases=()):
+        """
+        Register the command class at ``path`` (``module:ClassName``)
+        without importing it.
+
+        :param preload:
+            The path of a function to call, with no arguments, when the
+            bot starts with this command enabled.
+        :param aliases: Other names the command can be run by.
+        """
+        self._add(
+            name, LazyCommand(name, path, admin_only, preload), aliases)
+
+    def _build_index(self):
+        index = {}
+        prefixes = defaultdict(set)
+        suggestions = SuggestionIndex()
+        for name, aliases in self._aliases.items():
+            for key in (name,) + aliases:
+                suggestions.add(key, name)
+                for length in range(self.min_prefix, len(key)):
+                    prefixes[key[:length]].add(name)
+        ambiguous = {}
+        for prefix, names in prefixes.items():
+            if len(names) == 1:
+                index[prefix] = names.pop()
+            else:
+                ambiguous[prefix] = sorted(names)
+        for name, aliases in self._aliases.items():
+            for alias in aliases:
+                index[alias] = name
+        for name in self._aliases:
+            index[name] = name
+        self._index = index
+        self._ambiguous = ambiguous
+        self._suggestions = suggestions
+
+    def register_entry_points(self, group='akumabot.commands'):
+        """
+        Register the commands other installed packages advertise in the
+        setuptools entry point ``group``, one entry point per command.
+        """
+        try:
+            import pkg_resources
+        except ImportError:
+            return
+        for entry_point in pkg_resources.iter_entry_points(group):
+            self.register_lazy(entry_point.name, '{0}:{1}'.format(
+                entry_point.module_name, '.'.join(entry_point.attrs)))
+
+    def select(self, enabled=(), disabled=()):
+        """
+        Return a registry of the commands named in ``enabled`` (or all
+        of them if it is empty) that aren't named in ``disabled``.
+
+        The commands themselves are shared with this registry.
+        """
+        selected = CommandRegistry()
+        for name, command in self._registry.items():
+            if (not enabled or name in enabled) and name not in disabled:
+                selected._add(name, command, self._aliases[name])
+        return selected
+
+    def preload(self):
+        """
+        Call the preload functions of the commands in this registry.
+        """
+        for command in self._registry.values():
+            if isinstance(command, LazyCommand) and command.preload:
+                module_name, _, function_name = command.preload.partition(
+                    ':')
+                module = importlib.import_module(module_name)
+                getattr(module, function_name)()
+
+    def get(self, command_name, default=None):
+        return self._registry.get(command_name, default)
+
+    def resolve(self, command_name):
+        """
+        :returns:
+            The command ``command_name`` is the name, an alias or an
+            unambiguous abbreviation of, or None.
+        """
+        if self._index is None:
+            self._build_index()
+        name = self._index.get(command_name.lower())
+        if name is None:
+            return None
+        return self._registry[name]
+
+    def aliases(self, command_name):
+        return self._aliases.get(command_name, ())
+
+    def suggest(self, command_name, limit=3):
+        """
+        :returns:
+            The names of up to ``limit`` commands ``command_name`` might
+            have been meant as, best first: those it abbreviates, or
+            failing that those it is a small misspelling of.
+        """
+        if self._index is None:
+            self._build_index()
+        command_name = command_name.lower()
+        names = self._ambiguous.get(command_name)
+        if names is not None:
+            return names[:limit]
+        return self._suggestions.suggest(command_name, limit)
+
+    def get_all_commands(self):
+        return self._registry.values()
+
+
+def configured_commands(config):
+    """
+    Return the registry of commands ``config`` enables.
+    """
+    if config['commands.entry_points']:
+        registry.register_entry_points()
+    return registry.select(
+        config['commands.enabled'], config['commands.disabled'])
+
+
+registry = CommandRegistry()
+registry.register_lazy('quit', 'akumabot.commands.admin:QuitCommand', True)
+registry.register_lazy('leave', 'akumabot.commands.admin:LeaveCommand', True)
+registry.register_lazy('join', 'akumabot.commands.admin:JoinCommand', True)
+registry.register_lazy('kick', 'akumabot.commands.admin:KickCommand', True)
+registry.register_lazy('pmme', 'akumabot.commands.basic:PMMeCommand', False)
+registry.register_lazy('ping', 'akumabot.commands.basic:PingCommand', False)
+registry.register_lazy('more', 'akumabot.commands.basic:MoreCommand', False)
+registry.register_lazy(
+    'help', 'akumabot.commands.basic:HelpCommand', False,
+    aliases=('commands',))
+registry.register_lazy(
+    'calc', 'akumabot.commands.calc:CalcCommand', False, aliases=('math',))
+registry.register_lazy('seen', 'akumabot.commands.seen:SeenCommand', False)
+registry.register_lazy('grep', 'akumabot.commands.grep:GrepCommand', False)
+registry.register_lazy(
+    'time', 'akumabot.commands.timeconv:TimeCommand', False,
+    preload='akumabot.timezones:preload', aliases=('tz',))
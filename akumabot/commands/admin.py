@@ -0,0 +1,90 @@
+"""
+Commands for managing the bot, usable only by admins.
+"""
+import random
+
+from twisted.internet import defer, reactor
+
+from akumabot.arguments import Arguments, Channel, Int, Nick, Rest
+
+
+class QuitCommand(object):
+    name = 'quit'
+    admin_only = True
+    pm_only = False
+    channel_only = False
+    arguments = Arguments(Int('delay_in_seconds', 5, 60))
+    description = 'Disconnect from the server'
+    cache = None
+
+    def run(self, bot, channel, nickname, command_args):
+        delay, = command_args
+        reactor.callLater(float(delay), bot.disconnect)
+        return 'Disconnecting in {0} seconds'.format(delay)
+
+
+class LeaveCommand(object):
+    name = 'leave'
+    admin_only = True
+    pm_only = False
+    channel_only = True
+    arguments = Arguments()
+    description = 'Leave the current channel'
+    cache = None
+    
+    _leave_rebukes = (
+        "I can tell when I'm not wanted.",
+        "Fine. Be that way.",
+        "I think you ought to know I'm feeling very depressed.",
+    )
+
+    def run(self, bot, channel, nickname, command_args):
+        reactor.callLater(1.0, bot.leave_channel, channel)
+        return random.choice(self._leave_rebukes)
+
+
+class JoinCommand(object):
+    name = 'join'
+    admin_only = True
+    pm_only = False
+    channel_only = False
+    arguments = Arguments(Channel('channel'))
+    description = 'Join another channel'
+    cache = None
+
+    def run(self, bot, channel, nickname, command_args):
+        target_channel, = command_args
+        bot.join_channel(target_channel)
+
+
+class KickCommand(object):
+    name = 'kick'
+    admin_only = True
+    pm_only = True
+    channel_only = False
+    arguments = Arguments(
+        Nick('user'), Channel('channel'), Rest('reason', optional=True))
+    description = 'Kick a user from this channel'
+    cache = None
+
+    def run(self, bot, channel, nickname, command_args):
+        target_user, target_channel, reason = command_args
+        reason = reason or ''
+        d = defer.maybeDeferred(bot.is_member, target_user, target_channel)
+        d.addCallback(
+            self._kick_member, bot, target_user, target_channel, reason)
+        return d
+
+    def _kick_member(self, is_member, bot, user, channel, reason):
+        if not is_member:
+            return "{0} isn't in {1}".format(user, channel)
+        self.do_kick(bot, user, channel, reason)
+
+    def do_kick(self, bot, user, channel, reason):
+        reactor.callLater(
+            1.0, bot.send_private_message,
+            'op {0}'.format(channel), 'chanserv')
+        reactor.callLater(3.0, bot.kick_user, channel, user, reason)
+        reactor.callLater(
+            5.0, bot.send_private_message,
+            'deop {0}'.format(channel), 'chanserv')
@@ -0,0 +1,97 @@
+"""
+Commands anyone can use that need nothing beyond the bot itself.
+"""
+import random
+
+from twisted.internet import defer
+
+from akumabot.arguments import Arguments, Rest, Word
+from akumabot.commands import CachePolicy
+
+
+class PMMeCommand(object):
+    name = 'pmme'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    arguments = Arguments(Rest('message'))
+    description = 'Have me send you a private message'
+    cache = None
+
+    def run(self, bot, channel, nickname, command_args):
+        message, = command_args
+        bot.send_private_message(message, nickname)
+
+
+def _emulate_ping():
+    nbytes = random.randint(24, 78)
+    ttl = random.choice([32, 64, 128])
+    time = random.random()
+    msg = '{0} bytes from 127.0.0.1: icmp_seq=1 ttl={1} time={2:.3f} ms'
+    return msg.format(nbytes, ttl, time)
+
+
+class PingCommand(object):
+    name = 'ping'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    arguments = Arguments()
+    description = "Verify I'm still attentive"
+    cache = None
+
+    _pings = (
+        lambda: 'Pong!',
+        lambda: 'WHAT, man?',
+    ) + (_emulate_ping,) * 10
+
+    def run(self, bot, channel, nickname, command_args):
+        return random.choice(self._pings)()
+
+
+class HelpCommand(object):
+    name = 'help'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    arguments = Arguments(Word('command', optional=True))
+    description = 'Show available, or more info about a specific one'
+    cache = CachePolicy(ttl=300, maxsize=64)
+
+    def run(self, bot, channel, nickname, command_args):
+        helpfor, = command_args
+        if helpfor is None:
+            # Show available commands
+            if bot.is_admin(nickname):
+                commands = bot.commands.get_all_commands()
+            else:
+                commands = [
+                    c for c in bot.commands.get_all_commands()
+                    if not c.admin_only]
+            return 'Available commands are: {0}'.format(
+                ' '.join(sorted(c.name for c in commands)))
+        else:
+            helpfor_command = bot.commands.resolve(helpfor)
+            if helpfor_command is None:
+                return 'Unknown command {0}'.format(helpfor)
+            usage = helpfor_command.usage.format(helpfor_command.name)
+            aliases = bot.commands.aliases(helpfor_command.name)
+            if aliases:
+                usage += ' (also: {0})'.format(', '.join(aliases))
+            return usage
+
+
+class MoreCommand(object):
+    name = 'more'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    arguments = Arguments()
+    description = 'Show the rest of my last reply to you that was cut short'
+    cache = None
+
+    def run(self, bot, channel, nickname, command_args):
+        d = defer.maybeDeferred(bot.send_next_page, channel, nickname)
+        d.addCallback(
+            lambda sent: None if sent else 'There is nothing more to show')
+        return d
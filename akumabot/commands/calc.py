@@ -0,0 +1,66 @@
+"""
+The calculator command.
+"""
+from twisted.internet import defer, reactor
+
+from akumabot.arguments import Arguments, Rest
+from akumabot.calculate import calculate_expression, CalculatorParseError
+from akumabot.calcpool import (
+    CalculatorPool, CalculatorTooExpensive, CalculatorBusy
+)
+from akumabot.commands import CachePolicy, TransientReply
+
+
+def _expression_key(command_args):
+    # Keyed on the expression as typed: whitespace can change whether
+    # it parses ("1 2" isn't "12", and tabs aren't allowed), and the
+    # reply may quote it.
+    return command_args[0] or None
+
+
+class CalcCommand(object):
+    name = 'calc'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    arguments = Arguments(Rest('expression'))
+    description = 'Evaluate math expression'
+    cache = CachePolicy(ttl=3600, maxsize=1024, key=_expression_key)
+
+    _pool = None
+
+    def run(self, bot, channel, nickname, command_args):
+        expression, = command_args
+        engine = bot.config['commands.calculator_engine']
+        if bot.config['calculator.workers'] > 0:
+            d = self._get_pool(bot.config).calculate(expression)
+        else:
+            d = defer.maybeDeferred(calculate_expression, expression, engine)
+        d.addCallback(lambda result: 'Result: {0:.6G}'.format(result))
+        d.addErrback(self._failed, expression)
+        return d
+
+    def _get_pool(self, config):
+        if self._pool is None:
+            self._pool = CalculatorPool(
+                reactor,
+                size=config['calculator.workers'],
+                queue_limit=config['calculator.queue_limit'],
+                timeout=config['calculator.timeout'],
+                cpu_limit=config['calculator.cpu_limit'],
+                memory_limit=config['calculator.memory_limit'] * 1024 * 1024,
+                engine=config['commands.calculator_engine'])
+        return self._pool
+
+    def _failed(self, failure, expression):
+        if failure.check(CalculatorParseError):
+            return "I didn't understand {0}".format(expression)
+        elif failure.check(CalculatorTooExpensive):
+            # Running out of wall-clock time may just mean we were busy.
+            return TransientReply(
+                "Sorry, {0} is too expensive for me to work out".format(
+                    expression))
+        elif failure.check(CalculatorBusy):
+            return TransientReply(
+                "I'm too busy to calculate that right now, try again later")
+        return failure
@@ -0,0 +1,42 @@
+"""
+The ``grep`` command, which searches a channel's scrollback.
+"""
+import time
+
+from twisted.internet import defer, reactor
+
+from akumabot.arguments import Arguments, Duration, Rest
+
+
+class GrepCommand(object):
+    name = 'grep'
+    admin_only = False
+    pm_only = False
+    channel_only = True
+    arguments = Arguments(Duration('within', optional=True), Rest('words'))
+    description = (
+        'Find recent lines in this channel containing every word, '
+        'optionally only those within e.g. 30m or 2h'
+    )
+    cache = None
+
+    # Matches shown, newest first
+    limit = 3
+
+    def run(self, bot, channel, nickname, command_args):
+        within, query = command_args
+        since = None
+        if within is not None:
+            since = reactor.seconds() - within
+        d = defer.maybeDeferred(
+            bot.search_scrollback, channel, query, since, self.limit)
+        d.addCallback(self._describe, query)
+        return d
+
+    def _describe(self, found, query):
+        if not found:
+            return 'Nothing matching {0!r}'.format(query)
+        return ' | '.join(
+            '[{0}] <{1}> {2}'.format(
+                time.strftime('%H:%M', time.gmtime(at)), nickname, message)
+            for at, nickname, message in found)
@@ -0,0 +1,95 @@
+"""
+The ``seen`` command, answered from `akumabot.activity`.
+"""
+from twisted.internet import defer, reactor
+
+from akumabot.arguments import Arguments, Nick
+from akumabot.membership import irc_lower
+
+
+_units = (
+    ('day', 86400),
+    ('hour', 3600),
+    ('minute', 60),
+    ('second', 1),
+)
+
+_doing = {
+    'message': lambda s: 'in {0}, saying: {1}'.format(s.channel, s.message),
+    'join': lambda s: 'joining {0}'.format(s.channel),
+    'part': lambda s: 'leaving {0}'.format(s.channel),
+    'kick': lambda s: 'being kicked from {0} ({1})'.format(
+        s.channel, s.message),
+    'quit': lambda s: 'quitting ({0})'.format(s.message),
+    'renamed_to': lambda s: 'changing nick to {0}'.format(s.message),
+    'renamed_from': lambda s: 'changing nick from {0}'.format(s.message),
+}
+
+# What is said instead to someone who isn't in the channel, which may
+# be secret.
+_doing_elsewhere = {
+    'message': 'in a channel',
+    'join': 'joining a channel',
+    'part': 'leaving a channel',
+    'kick': 'being kicked from a channel',
+}
+
+
+def time_ago(seconds):
+    """
+    Describe ``seconds`` in its largest whole unit, e.g. ``3 hours ago``.
+    """
+    for unit, length in _units:
+        count = int(seconds // length)
+        if count >= 1:
+            return '{0} {1}{2} ago'.format(
+                count, unit, '' if count == 1 else 's')
+    return 'just now'
+
+
+class SeenCommand(object):
+    name = 'seen'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    arguments = Arguments(Nick('nick'))
+    description = 'Say when I last saw someone, and doing what'
+    cache = None
+
+    def run(self, bot, channel, nickname, command_args):
+        target, = command_args
+        if irc_lower(target) == irc_lower(nickname):
+            return "That's you!"
+        if irc_lower(target) == irc_lower(bot.nickname):
+            return "I'm right here."
+        d = defer.maybeDeferred(bot.last_seen, target)
+        d.addCallback(self._check_channel, bot, channel, nickname)
+        d.addCallback(self._describe, target)
+        return d
+
+    def _check_channel(self, sighting, bot, channel, nickname):
+        """
+        :returns:
+            ``sighting`` and whether ``nickname``, asking in ``channel``,
+            may see where it was, or a Deferred that fires with them.
+        """
+        if sighting is None or sighting.channel is None:
+            return sighting, True
+        if channel is not None and (
+                irc_lower(channel) == irc_lower(sighting.channel)):
+            return sighting, True
+        d = defer.maybeDeferred(bot.is_member, nickname, sighting.channel)
+        d.addCallback(lambda is_member: (sighting, is_member))
+        return d
+
+    def _describe(self, result, target):
+        sighting, shown = result
+        if sighting is None:
+            return "I haven't seen {0}".format(target)
+        if shown:
+            doing = _doing[sighting.event](sighting)
+        else:
+            doing = _doing_elsewhere[sighting.event]
+        return '{0} was last seen {1} {2}'.format(
+            sighting.nickname, time_ago(reactor.seconds() - sighting.at),
+            doing)
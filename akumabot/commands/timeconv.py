@@ -0,0 +1,95 @@
+"""
+The time zone conversion command.
+"""
+import datetime
+
+import pytz
+
+from akumabot import timezones
+from akumabot.arguments import Arguments, Word
+from akumabot.commands import CachePolicy
+
+
+_iso_fmt = '%Y-%m-%dT%H:%M:%S'
+
+
+def _absolute_time_key(command_args):
+    # Converting "now", or a time of day on today's date, gives a
+    # different answer from one moment or day to the next.
+    if 'T' in command_args[0]:
+        return tuple(command_args)
+    return None
+
+
+class TimeCommand(object):
+    name = 'time'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    arguments = Arguments(
+        Word('time'), Word('fromzone', optional=True), Word('tozone'))
+    description = (
+        'Convert time from one time zone to another. <time> may be "now" '
+        'or a particular time in YYYY-MM-DDTHH:mm:SS or HH:mm:SS format'
+    )
+    cache = CachePolicy(ttl=3600, maxsize=256, key=_absolute_time_key)
+
+    def run(self, bot, channel, nickname, command_args):
+        time_string, fromzone_string, tozone_string = command_args
+
+        if time_string == 'now':
+            toconvert = datetime.datetime.utcnow()
+        else:
+            toconvert = self.parse_time(time_string)
+            if toconvert is None:
+                return "I didn't understand that time {0!r}".format(
+                    time_string)
+
+        fromzone = self.parse_timezone(fromzone_string)
+        if fromzone is None:
+            return self.unknown_timezone(fromzone_string)
+        tozone = self.parse_timezone(tozone_string)
+        if tozone is None:
+            return self.unknown_timezone(tozone_string)
+
+        fromtime = fromzone.localize(toconvert)
+        totime = fromtime.astimezone(tozone)
+
+        fmt = (
+            '{fromtime} {fromoffset} ({fromtz}) -> '
+            '{totime} {tooffset} ({totz})'
+        )
+        return fmt.format(
+            fromtime=fromtime.strftime(_iso_fmt),
+            fromoffset=fromtime.strftime('%z'),
+            fromtz=fromtime.strftime('%Z'),
+            totime=totime.strftime(_iso_fmt),
+            tooffset=totime.strftime('%z'),
+            totz=totime.strftime('%Z'),
+        )
+
+
+    def parse_time(self, time_string):
+        try:
+            return datetime.datetime.strptime(time_string, _iso_fmt)
+        except ValueError:
+            try:
+                time = datetime.datetime.strptime(
+                    time_string, '%H:%M:%S').time()
+            except ValueError:
+                return None
+            now = datetime.datetime.utcnow()
+            return datetime.datetime.combine(now.date(), time)
+
+    def parse_timezone(self, timezone_string):
+        if timezone_string is None:
+            return pytz.utc
+        return timezones.get_index().lookup(timezone_string)
+
+    def unknown_timezone(self, timezone_string):
+        message = "I didn't understand the time zone {0!r}".format(
+            timezone_string)
+        suggestions = timezones.get_index().suggest(timezone_string)
+        if suggestions:
+            message += ', did you mean {0}?'.format(' or '.join(suggestions))
+        return message
@@ -1,3 +1,4 @@
+import os
 from ConfigParser import RawConfigParser, NoSectionError, NoOptionError
 
 
@@ -13,6 +14,14 @@ def get_boolean(parser, section, option, default):
     return _get(parser.getboolean, section, option, default)
 
 
+def get_int(parser, section, option, default):
+    return _get(parser.getint, section, option, default)
+
+
+def get_float(parser, section, option, default):
+    return _get(parser.getfloat, section, option, default)
+
+
 def get_list(parser, section, option, default):
     value = _get(parser.get, section, option, default)
     return [chunk for chunk in value.split() if chunk]
@@ -22,6 +31,38 @@ def get_set(parser, section, option, default):
     return set(get_list(parser, section, option, default))
 
 
+def get_float_map(parser, section, option, default):
+    """
+    Read a list of ``key:number`` pairs into a dict.
+    """
+    mapping = {}
+    for chunk in get_list(parser, section, option, default):
+        key, _, value = chunk.rpartition(':')
+        if not key:
+            raise ValueError(
+                'Expected key:number in {0}.{1}, got {2!r}'.format(
+                    section, option, chunk))
+        mapping[key] = float(value)
+    return mapping
+
+
+def get_calculator_engine(parser, section, option, default):
+    """
+    Read the name of one of `akumabot.calculate.engines`.
+    """
+    engine = get(parser, section, option, default)
+    if engine != default:
+        # Importing akumabot.calculate builds its grammars, so it is
+        # only done to check an engine other than the default.
+        from akumabot.calculate import engines
+        if engine not in engines:
+            raise ValueError(
+                'Unknown calculator engine {0!r} in {1}.{2}, expected one '
+                'of: {3}'.format(
+                    engine, section, option, ', '.join(sorted(engines))))
+    return engine
+
+
 def _get(getmethod, section, option, default):
     try:
         return getmethod(section, option)
@@ -39,10 +80,87 @@ options = {
     ('akumabot', 'channels'): get_list,
     ('akumabot', 'admins'): get_set,
     ('akumabot', 'debug', False): get_boolean,
+    ('akumabot', 'endpoint', 'ssl:host=irc.freenode.net:port=6697'): get,
+    ('akumabot', 'networks', ''): get_list,
+    ('akumabot', 'admin_accounts', False): get_boolean,
     ('commands', 'trigger', '<nick>'): get,
+    ('commands', 'calculator_engine', 'parsley'): get_calculator_engine,
+    ('commands', 'enabled', ''): get_set,
+    ('commands', 'disabled', ''): get_set,
+    ('commands', 'entry_points', False): get_boolean,
+    ('calculator', 'workers', 0): get_int,
+    ('calculator', 'queue_limit', 20): get_int,
+    ('calculator', 'timeout', 2.0): get_float,
+    ('calculator', 'cpu_limit', 1): get_int,
+    ('calculator', 'memory_limit', 256): get_int,
+    ('outbound', 'rate', 1.0): get_float,
+    ('outbound', 'burst', 5): get_int,
+    ('outbound', 'services', 'chanserv nickserv'): get_set,
+    ('workers', 'count', 0): get_int,
+    ('workers', 'socket', ''): get,
+    ('workers', 'max_waiting', 100): get_int,
+    ('workers', 'wait_timeout', 10.0): get_float,
+    ('metrics', 'port', 0): get_int,
+    ('metrics', 'interface', '127.0.0.1'): get,
+    ('logging', 'level', 'info'): get,
+    ('logging', 'sample', ''): get_float_map,
+    ('logging', 'rate_limit', ''): get_float_map,
+    ('ratelimit', 'enabled', False): get_boolean,
+    ('ratelimit', 'nick_rate', 0.2): get_float,
+    ('ratelimit', 'nick_burst', 5): get_int,
+    ('ratelimit', 'channel_rate', 1.0): get_float,
+    ('ratelimit', 'channel_burst', 10): get_int,
+    ('ratelimit', 'network_rate', 5.0): get_float,
+    ('ratelimit', 'network_burst', 20): get_int,
+    ('ratelimit', 'max_tracked', 10000): get_int,
+    ('ratelimit', 'costs', 'calc:2'): get_float_map,
+    ('accounts', 'ttl', 60.0): get_float,
+    ('accounts', 'max_cached', 1000): get_int,
+    ('accounts', 'timeout', 10.0): get_float,
+    ('activity', 'database', ''): get,
+    ('activity', 'max_pending', 500): get_int,
+    ('activity', 'flush_interval', 1.0): get_float,
+    ('activity', 'cache_size', 10000): get_int,
+    ('scrollback', 'max_bytes', 65536): get_int,
+    ('replies', 'max_lines', 3): get_int,
+    ('replies', 'max_pages', 10): get_int,
+    ('replies', 'more_ttl', 300.0): get_float,
+    ('replies', 'max_cursors', 1000): get_int,
 }
 
 
+# Options that a [network <name>] section may override, mapped to get_*
+# functions. The defaults come from the [akumabot] section.
+network_options = {
+    'endpoint': get,
+    'nickname': get,
+    'password': get,
+    'channels': get_list,
+    'admins': get_set,
+    'admin_accounts': get_boolean,
+    'debug': get_boolean,
+}
+
+
+def _network_configs(parser, config):
+    """
+    Return a config dict for each network named by ``akumabot.networks``,
+    or for a single network called "default" if there are none.
+    """
+    networks = []
+    for name in config['akumabot.networks'] or ['default']:
+        section = 'network {0}'.format(name)
+        netconfig = dict(config)
+        netconfig['network.name'] = name
+        for option, getfunc in network_options.items():
+            if parser.has_option(section, option):
+                confkey = 'akumabot.{0}'.format(option)
+                netconfig[confkey] = getfunc(
+                    parser, section, option, REQUIRED)
+        networks.append(netconfig)
+    return networks
+
+
 def process_config_file(config_file):
     parser = RawConfigParser()
     parser.readfp(config_file)
@@ -55,4 +173,10 @@ def process_config_file(config_file):
             section, option, default = opt_sec_def
         confkey = '{0}.{1}'.format(section, option)
         config[confkey] = getfunc(parser, section, option, default)
+    config['networks'] = _network_configs(parser, config)
+    # Worker processes re-read the same file.
+    config_path = getattr(config_file, 'name', None)
+    if config_path is not None:
+        config_path = os.path.abspath(config_path)
+    config['config.path'] = config_path
     return config
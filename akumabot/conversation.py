@@ -1,14 +1,23 @@
 import collections
-import datetime
+import heapq
+
+from twisted.internet import reactor
 
 
 class Conversation(object):
-    def __init__(self, protocol, channel, nickname):
+    __slots__ = (
+        'protocol', 'channel', 'nickname', 'messages', 'last_active',
+        '_clock', '_serial',
+    )
+
+    def __init__(self, protocol, channel, nickname, max_messages=20,
+                 clock=reactor):
         self.protocol = protocol
         self.channel = channel
         self.nickname = nickname
-        self.messages = collections.deque()
-        self.last_active = datetime.datetime.now()
+        self.messages = collections.deque(maxlen=max_messages)
+        self._clock = clock
+        self.last_active = clock.seconds()
 
     def __nonzero__(self):
         return bool(self.messages)
@@ -18,11 +27,12 @@ class Conversation(object):
             self.protocol._sendMessage(message, self.nickname)
         else:
             self.protocol._sendMessage(message, self.channel, self.nickname)
-        self.last_active = datetime.datetime.now()
+        self.last_active = self._clock.seconds()
 
     def received(self, message):
+        # Once full, the oldest message is dropped.
         self.messages.appendleft(message)
-        self.last_active = datetime.datetime.now()
+        self.last_active = self._clock.seconds()
 
     def pop_received(self):
         try:
@@ -38,27 +48,99 @@ class ConversationMap(collections.Mapping):
     Automatically creates keys requested that don't exist.
     Nicks are converted to lowercase.
 
+    Holds at most ``max_conversations``, dropping the least recently
+    used, and removes conversations that have been inactive for
+    ``max_age`` seconds.
+
     Does not support mutation via normal mapping methods.
     """
-    def __init__(self, protocol):
+    def __init__(self, protocol, max_age=3600, max_conversations=10000,
+                 max_messages=20, clock=reactor):
         self._protocol = protocol
-        self._store = {}
+        self.max_age = max_age
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self._clock = clock
+        self._store = collections.OrderedDict()
+        # (last_active, serial, key) entries, one per live conversation.
+        # The serial tells a live entry apart from one left behind by a
+        # conversation that has since been dropped.
+        self._expiry_heap = []
+        self._serial = 0
+        self._expiry_call = None
 
     def expire(self, age):
         """
         Remove conversations older than ``age`` (in seconds).
         """
-        now = datetime.datetime.now()
-        for key, conversation in list(self.items()):
-            if (now - conversation.last_active).total_seconds() < age:
+        cutoff = self._clock.seconds() - age
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= cutoff:
+            _, serial, key = heapq.heappop(heap)
+            conversation = self._store.get(key)
+            if conversation is None or conversation._serial != serial:
+                continue
+            if conversation.last_active <= cutoff:
                 del self._store[key]
+            else:
+                heapq.heappush(
+                    heap, (conversation.last_active, serial, key))
+
+    def stop(self):
+        """
+        Stop expiring conversations in the background.
+        """
+        if self._expiry_call is not None and self._expiry_call.active():
+            self._expiry_call.cancel()
+        self._expiry_call = None
+
+    def _expire_due(self):
+        self._expiry_call = None
+        self.expire(self.max_age)
+        self._schedule_expiry()
+
+    def _schedule_expiry(self):
+        if self._expiry_call is not None or not self._expiry_heap:
+            return
+        delay = self._expiry_heap[0][0] + self.max_age - self._clock.seconds()
+        self._expiry_call = self._clock.callLater(
+            max(delay, 0), self._expire_due)
 
     def __getitem__(self, key):
         channel, nickname = key
         key = channel, nickname.lower()
-        if key not in self._store:
-            self._store[key] = Conversation(self._protocol, channel, nickname)
-        return self._store[key]
+        conversation = self._store.pop(key, None)
+        if conversation is None:
+            conversation = Conversation(
+                self._protocol, channel, nickname, self.max_messages,
+                self._clock)
+            self._serial += 1
+            conversation._serial = self._serial
+            heapq.heappush(
+                self._expiry_heap,
+                (conversation.last_active, self._serial, key))
+            if len(self._store) >= self.max_conversations:
+                self._store.popitem(last=False)
+                if len(self._expiry_heap) > 2 * self.max_conversations:
+                    self._compact_expiry_heap()
+            self._schedule_expiry()
+        # Most recently used conversations live at the end.
+        self._store[key] = conversation
+        return conversation
+
+    def _compact_expiry_heap(self):
+        """
+        Drop the entries left behind by conversations evicted to stay
+        under ``max_conversations``.
+        """
+        self._expiry_heap = [
+            (conversation.last_active, conversation._serial, key)
+            for key, conversation in self._store.items()]
+        heapq.heapify(self._expiry_heap)
+
+    def __contains__(self, key):
+        channel, nickname = key
+        return (channel, nickname.lower()) in self._store
 
     def __len__(self):
         return len(self._store)
@@ -0,0 +1,123 @@
+"""
+Delivery of bot events (messages, joins, quits, ...) to listeners.
+"""
+from collections import defaultdict
+
+from twisted.internet import defer, reactor
+from twisted.logger import Logger
+from twisted.python.failure import Failure
+
+
+class _Subscription(object):
+    __slots__ = ('listener', 'semaphore', 'failures')
+
+    def __init__(self, listener, max_in_flight):
+        self.listener = listener
+        self.semaphore = None
+        if max_in_flight is not None:
+            self.semaphore = defer.DeferredSemaphore(max_in_flight)
+        self.failures = 0
+
+
+class LatencyStats(object):
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        self.count += 1
+        self.total += latency
+        if latency > self.max:
+            self.max = latency
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+        }
+
+
+class EventBus(object):
+    """
+    Calls every listener subscribed to an event when it is published.
+
+    Listeners may return a Deferred. A listener that raises or fails
+    is logged without affecting the others, and one subscribed with
+    ``max_in_flight`` has further events queued while that many of its
+    Deferreds are still waiting.
+
+    Records how long each event type takes to dispatch, up to the last
+    listener's Deferred firing.
+    """
+    log = Logger()
+
+    def __init__(self, clock=reactor):
+        self.clock = clock
+        self._subscriptions = defaultdict(list)
+        self.latency = defaultdict(LatencyStats)
+
+    def subscribe(self, event, listener, max_in_flight=None):
+        self._subscriptions[event].append(
+            _Subscription(listener, max_in_flight))
+
+    def unsubscribe(self, event, listener):
+        self._subscriptions[event] = [
+            subscription for subscription in self._subscriptions[event]
+            if subscription.listener != listener]
+
+    def listeners(self, event):
+        return [
+            subscription.listener
+            for subscription in self._subscriptions[event]]
+
+    def failures(self, event):
+        """
+        Return a list of (listener, number of failures) pairs.
+        """
+        return [
+            (subscription.listener, subscription.failures)
+            for subscription in self._subscriptions[event]]
+
+    def publish(self, event, *args):
+        """
+        :returns:
+            None if every listener finished synchronously, or else a
+            Deferred that fires with None once they are all done.
+        """
+        started = self.clock.seconds()
+        pending = None
+        for subscription in self._subscriptions.get(event, ()):
+            if subscription.semaphore is not None:
+                d = subscription.semaphore.run(subscription.listener, *args)
+            else:
+                try:
+                    d = subscription.listener(*args)
+                except Exception:
+                    self._failed(Failure(), event, subscription)
+                    continue
+                if not isinstance(d, defer.Deferred):
+                    continue
+            d.addErrback(self._failed, event, subscription)
+            if pending is None:
+                pending = []
+            pending.append(d)
+        if pending is None:
+            self.latency[event].record(self.clock.seconds() - started)
+            return None
+        d = defer.gatherResults(pending)
+        d.addCallback(self._finished, event, started)
+        return d
+
+    def _failed(self, failure, event, subscription):
+        subscription.failures += 1
+        self.log.failure(
+            'Listener {listener!r} for event {event!r} failed', failure,
+            event_type='listener_failed', listener=subscription.listener,
+            event=event)
+
+    def _finished(self, _, event, started):
+        self.latency[event].record(self.clock.seconds() - started)
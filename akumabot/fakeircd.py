@@ -0,0 +1,317 @@
+"""
+A minimal IRC server for load tests and local development.
+
+It speaks just enough of RFC 1459 for `akumabot.proto.AkumaBotProtocol`
+to sign on, join channels and talk: NICK, USER, PASS, JOIN, PART,
+PRIVMSG, NOTICE, KICK, NAMES, PING and QUIT. There is no flood control,
+no modes and no other servers.
+
+Besides real connections, a channel can hold *virtual* users that exist
+only in the server; `FakeIRCServer.inject` makes one of them speak. This
+lets a load test simulate thousands of users without a connection each.
+
+Run a standalone server with ``python -m akumabot.fakeircd [port]``.
+"""
+import sys
+from collections import defaultdict
+
+from twisted.internet import defer, endpoints, protocol
+from twisted.words.protocols import irc
+
+
+SERVER_NAME = 'fake.ircd'
+
+
+def irc_lower(name):
+    return name.lower()
+
+
+def _format_line(prefix, command, params):
+    params = list(params)
+    if params and (' ' in params[-1] or params[-1][:1] in ('', ':')):
+        params[-1] = ':' + params[-1]
+    line = ' '.join([command] + params)
+    if prefix:
+        line = ':{0} {1}'.format(prefix, line)
+    return line
+
+
+class FakeIRCConnection(irc.IRC):
+    """
+    One client connection to a `FakeIRCServer`.
+    """
+    hostname = SERVER_NAME
+
+    def __init__(self, server):
+        self.server = server
+        self.nickname = None
+        self.username = None
+        self.registered = False
+        # Lowercased names of the channels this client is in.
+        self.joined = set()
+
+    @property
+    def hostmask(self):
+        return '{0}!{1}@localhost'.format(self.nickname, self.username)
+
+    def send(self, prefix, command, *params):
+        self.server.lines_out += 1
+        self.sendLine(_format_line(prefix, command, params))
+
+    def numeric(self, code, *params):
+        self.send(SERVER_NAME, code, self.nickname or '*', *params)
+
+    def connectionLost(self, reason):
+        if self.nickname is not None:
+            self.server.quit(self, 'Connection closed')
+
+    def handleCommand(self, command, prefix, params):
+        self.server.lines_in += 1
+        if not self.registered and command not in (
+                'NICK', 'USER', 'PASS', 'CAP'):
+            self.numeric('451', 'You have not registered')
+            return
+        irc.IRC.handleCommand(self, command, prefix, params)
+        for observer in self.server.observers:
+            observer(self, command, params)
+
+    def irc_unknown(self, prefix, command, params):
+        self.numeric('421', command, 'Unknown command')
+
+    def irc_PASS(self, prefix, params):
+        pass
+
+    def irc_NICK(self, prefix, params):
+        nickname = params[0]
+        if self.server.nick_in_use(nickname):
+            self.numeric('433', nickname, 'Nickname is already in use')
+            return
+        if self.nickname is not None:
+            self.server.rename(self, nickname)
+        else:
+            self.nickname = nickname
+            self._maybe_register()
+
+    def irc_USER(self, prefix, params):
+        self.username = params[0]
+        self._maybe_register()
+
+    def _maybe_register(self):
+        if self.registered or not (self.nickname and self.username):
+            return
+        self.registered = True
+        self.server.users[irc_lower(self.nickname)] = self
+        self.numeric('001', 'Welcome to the fake IRC server')
+        self.numeric('375', '- {0} Message of the day -'.format(SERVER_NAME))
+        self.numeric('372', '- Nothing to see here')
+        self.numeric('376', 'End of /MOTD command')
+
+    def irc_PING(self, prefix, params):
+        self.send(SERVER_NAME, 'PONG', SERVER_NAME, *params[:1])
+
+    def irc_JOIN(self, prefix, params):
+        for channel in params[0].split(','):
+            self.server.join(self, channel)
+
+    def irc_PART(self, prefix, params):
+        message = params[1] if len(params) > 1 else ''
+        for channel in params[0].split(','):
+            self.server.part(self, channel, message)
+
+    def irc_KICK(self, prefix, params):
+        channel, nickname = params[:2]
+        reason = params[2] if len(params) > 2 else nickname
+        self.server.kick(self, channel, nickname, reason)
+
+    def irc_NAMES(self, prefix, params):
+        for channel in params[0].split(','):
+            self.server.send_names(self, channel)
+
+    def irc_PRIVMSG(self, prefix, params):
+        self.server.message(self, 'PRIVMSG', params[0], params[-1])
+
+    def irc_NOTICE(self, prefix, params):
+        self.server.message(self, 'NOTICE', params[0], params[-1])
+
+    def irc_MODE(self, prefix, params):
+        pass
+
+    def irc_QUIT(self, prefix, params):
+        self.server.quit(self, params[0] if params else 'Quit')
+        self.transport.loseConnection()
+
+
+class FakeIRCServer(protocol.Factory):
+    """
+    Holds the users and channels of the fake network.
+
+    :ivar observers:
+        Callables called with (connection, command, params) for every
+        line a connected client sends.
+    """
+    def __init__(self):
+        # Lowercased nick -> FakeIRCConnection, or None if virtual.
+        self.users = {}
+        # Lowercased channel -> {lowercased nick: nick}
+        self.channels = defaultdict(dict)
+        self.observers = []
+        self.lines_in = 0
+        self.lines_out = 0
+
+    def buildProtocol(self, addr):
+        connection = FakeIRCConnection(self)
+        connection.factory = self
+        return connection
+
+    def nick_in_use(self, nickname):
+        return irc_lower(nickname) in self.users
+
+    def members(self, channel):
+        return self.channels.get(irc_lower(channel), {})
+
+    def _broadcast(self, channel, prefix, command, params, exclude=None):
+        for key in self.members(channel):
+            connection = self.users.get(key)
+            if connection is not None and connection is not exclude:
+                connection.send(prefix, command, *params)
+
+    def add_virtual_user(self, nickname, channels):
+        """
+        Add a user without a connection to ``channels``. Connected
+        members are not told, as if they were there before them.
+        """
+        key = irc_lower(nickname)
+        self.users[key] = None
+        for channel in channels:
+            self.channels[irc_lower(channel)][key] = nickname
+
+    def inject(self, nickname, target, message, command='PRIVMSG'):
+        """
+        Have the virtual user ``nickname`` send ``message`` to ``target``.
+        """
+        prefix = '{0}!{0}@virtual'.format(nickname)
+        if target.startswith('#'):
+            self._broadcast(target, prefix, command, (target, message))
+        else:
+            connection = self.users.get(irc_lower(target))
+            if connection is not None:
+                connection.send(prefix, command, target, message)
+
+    def join(self, connection, channel):
+        members = self.channels[irc_lower(channel)]
+        key = irc_lower(connection.nickname)
+        if key in members:
+            return
+        members[key] = connection.nickname
+        connection.joined.add(irc_lower(channel))
+        self._broadcast(channel, connection.hostmask, 'JOIN', (channel,))
+        self.send_names(connection, channel)
+
+    def send_names(self, connection, channel):
+        names = list(self.members(channel).values())
+        # Keep lines comfortably under 512 bytes.
+        for start in range(0, len(names), 40):
+            connection.numeric(
+                '353', '=', channel, ' '.join(names[start:start + 40]))
+        connection.numeric('366', channel, 'End of /NAMES list')
+
+    def part(self, connection, channel, message):
+        members = self.members(channel)
+        key = irc_lower(connection.nickname)
+        if key not in members:
+            connection.numeric('442', channel, "You're not on that channel")
+            return
+        self._broadcast(
+            channel, connection.hostmask, 'PART', (channel, message))
+        del members[key]
+        connection.joined.discard(irc_lower(channel))
+
+    def kick(self, connection, channel, nickname, reason):
+        members = self.members(channel)
+        key = irc_lower(nickname)
+        if key not in members:
+            connection.numeric('441', nickname, channel, "They aren't there")
+            return
+        self._broadcast(
+            channel, connection.hostmask, 'KICK', (channel, nickname, reason))
+        del members[key]
+        kicked = self.users.get(key)
+        if kicked is not None:
+            kicked.joined.discard(irc_lower(channel))
+
+    def message(self, connection, command, target, message):
+        if target.startswith('#'):
+            if irc_lower(target) not in self.channels:
+                connection.numeric('403', target, 'No such channel')
+                return
+            self._broadcast(
+                target, connection.hostmask, command, (target, message),
+                exclude=connection)
+        else:
+            recipient = self.users.get(irc_lower(target), False)
+            if recipient is False:
+                connection.numeric('401', target, 'No such nick/channel')
+            elif recipient is not None:
+                recipient.send(
+                    connection.hostmask, command, target, message)
+
+    def rename(self, connection, nickname):
+        old_key, new_key = irc_lower(connection.nickname), irc_lower(nickname)
+        told = set([connection])
+        connection.send(connection.hostmask, 'NICK', nickname)
+        for channel in connection.joined:
+            members = self.channels[channel]
+            for key in members:
+                member = self.users.get(key)
+                if member is not None and member not in told:
+                    told.add(member)
+                    member.send(connection.hostmask, 'NICK', nickname)
+            del members[old_key]
+            members[new_key] = nickname
+        del self.users[old_key]
+        self.users[new_key] = connection
+        connection.nickname = nickname
+
+    def quit(self, connection, message):
+        key = irc_lower(connection.nickname)
+        if self.users.get(key) is not connection:
+            return
+        told = set([connection])
+        for channel in connection.joined:
+            members = self.channels[channel]
+            members.pop(key, None)
+            for member_key in members:
+                member = self.users.get(member_key)
+                if member is not None and member not in told:
+                    told.add(member)
+                    member.send(connection.hostmask, 'QUIT', message)
+        connection.joined.clear()
+        del self.users[key]
+
+
+def listen(reactor, port=0, interface='127.0.0.1'):
+    """
+    Start a `FakeIRCServer` on ``interface`` and ``port``.
+
+    :returns:
+        A Deferred that fires with (server, listening port).
+    """
+    server = FakeIRCServer()
+    endpoint = endpoints.TCP4ServerEndpoint(
+        reactor, port, interface=interface)
+    d = endpoint.listen(server)
+    d.addCallback(lambda port: (server, port))
+    return d
+
+
+def main(reactor, port='6667'):
+    from twisted.logger import globalLogBeginner, textFileLogObserver
+    globalLogBeginner.beginLoggingTo([textFileLogObserver(sys.stdout)])
+    d = listen(reactor, int(port))
+    d.addCallback(lambda _: defer.Deferred())
+    return d
+
+
+if __name__ == '__main__':
+    from twisted.internet import task
+    task.react(main, sys.argv[1:])
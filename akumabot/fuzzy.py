@@ -0,0 +1,81 @@
+"""
+Approximate string matching for "did you mean" suggestions.
+"""
+from collections import defaultdict
+
+
+def edit_distance(a, b):
+    """
+    Levenshtein distance between strings ``a`` and ``b``.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = range(len(b) + 1)
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def _deletions(word, distance):
+    """
+    Return ``word`` and every string made by deleting up to ``distance``
+    characters from it.
+    """
+    variants = set([word])
+    edge = variants
+    for _ in range(distance):
+        edge = set(
+            variant[:i] + variant[i + 1:]
+            for variant in edge for i in range(len(variant)))
+        variants |= edge
+    return variants
+
+
+class SuggestionIndex(object):
+    """
+    Finds keys close to a misspelled query without scanning every key.
+
+    Each key is stored under all of its deletion variants, so a query
+    only has to look up its own deletion variants ("symmetric delete").
+    Keys within ``max_distance`` edits of the query are always found.
+    """
+    def __init__(self, max_distance=1):
+        self.max_distance = max_distance
+        self._variants = defaultdict(set)
+        self._values = {}
+
+    def add(self, key, value):
+        self._values[key] = value
+        for variant in _deletions(key, self.max_distance):
+            self._variants[variant].add(key)
+
+    def suggest(self, query, limit=3):
+        """
+        Return up to ``limit`` distinct values whose keys are closest to
+        ``query``, best match first.
+        """
+        candidates = set()
+        for variant in _deletions(query, self.max_distance):
+            candidates.update(self._variants.get(variant, ()))
+        ranked = sorted(
+            (edit_distance(query, key), key) for key in candidates)
+        suggestions = []
+        for distance, key in ranked:
+            value = self._values[key]
+            if distance > 2 * self.max_distance:
+                break
+            if value not in suggestions:
+                suggestions.append(value)
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+    def __len__(self):
+        return len(self._values)
@@ -0,0 +1,97 @@
+"""
+Sampling and rate limiting for chatty log events.
+
+Log calls on hot paths pass an ``event_type`` field, e.g.::
+
+    self.log.debug('Received {message!r}', event_type='privmsg', ...)
+
+and `EventTypeFilter` decides per type whether the event reaches the
+observers. Events are filtered before they are formatted, so dropping
+one costs a dict lookup.
+"""
+import random
+from collections import defaultdict
+
+from twisted.internet import reactor
+from twisted.logger import (
+    FilteringLogObserver, ILogFilterPredicate, LogLevel,
+    LogLevelFilterPredicate, PredicateResult, textFileLogObserver
+)
+from zope.interface import implementer
+
+from akumabot import metrics
+
+
+class _Bucket(object):
+    __slots__ = ('rate', 'size', 'tokens', 'updated')
+
+    def __init__(self, rate, now):
+        self.rate = rate
+        # Holds one second's worth of events, but at least one event,
+        # so that rates below one a second still let some through.
+        self.size = max(rate, 1)
+        self.tokens = self.size
+        self.updated = now
+
+    def take(self, now):
+        self.tokens = min(
+            self.size, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+@implementer(ILogFilterPredicate)
+class EventTypeFilter(object):
+    """
+    Keeps a random ``sample_rates[event_type]`` fraction of each event
+    type, then at most ``rate_limits[event_type]`` of them per second.
+
+    Events without an ``event_type``, or of a type with no settings,
+    are left to the other predicates.
+    """
+    def __init__(self, sample_rates=None, rate_limits=None, clock=reactor,
+                 random=random.random):
+        self.sample_rates = dict(sample_rates or {})
+        self.clock = clock
+        self._random = random
+        self._buckets = dict(
+            (event_type, _Bucket(rate, clock.seconds()))
+            for event_type, rate in (rate_limits or {}).items())
+        self.dropped = defaultdict(int)
+
+    def __call__(self, event):
+        event_type = event.get('event_type')
+        if event_type is None:
+            return PredicateResult.maybe
+        rate = self.sample_rates.get(event_type)
+        if rate is not None and self._random() >= rate:
+            return self._drop(event_type)
+        bucket = self._buckets.get(event_type)
+        if bucket is not None and not bucket.take(self.clock.seconds()):
+            return self._drop(event_type)
+        return PredicateResult.maybe
+
+    def _drop(self, event_type):
+        self.dropped[event_type] += 1
+        metrics.log_events_dropped.inc(event_type)
+        return PredicateResult.no
+
+
+def make_observer(config, output):
+    """
+    Return an observer writing the events allowed by ``config``'s
+    ``[logging]`` section to the file ``output``.
+
+    Debug events are let through when any network has debugging on.
+    """
+    level = LogLevel.levelWithName(config['logging.level'])
+    if any(netconfig['akumabot.debug'] for netconfig in config['networks']):
+        level = LogLevel.debug
+    return FilteringLogObserver(textFileLogObserver(output), [
+        LogLevelFilterPredicate(level),
+        EventTypeFilter(
+            config['logging.sample'], config['logging.rate_limit']),
+    ])
@@ -1,15 +1,17 @@
 import sys
 
 from twisted.internet import task
-from twisted.python import log
+from twisted.logger import globalLogBeginner
 
 from akumabot.bot import AkumaBot
 from akumabot.config import process_config_file
+from akumabot.logfilter import make_observer
 
 
 if __name__ == '__main__':
-    log.startLogging(sys.stderr)
-    with open('akumabot.conf', 'rb') as f:
+    config_path = sys.argv[1] if len(sys.argv) > 1 else 'akumabot.conf'
+    with open(config_path, 'rb') as f:
         config = process_config_file(f)
+    globalLogBeginner.beginLoggingTo([make_observer(config, sys.stderr)])
     bot = AkumaBot(config)
-    task.react(bot.main, ['ssl:host=irc.freenode.net:port=6697'])
+    task.react(bot.main)
@@ -0,0 +1,260 @@
+"""
+Who is in which channel on one network, and with what status.
+"""
+import string
+
+
+_rfc1459_lower = string.maketrans(
+    string.ascii_uppercase + '[]\\~', string.ascii_lowercase + '{}|^')
+
+# Twisted's default for servers that don't send PREFIX: mode letter ->
+# (status prefix, rank).
+DEFAULT_PREFIXES = {'o': ('@', 0), 'h': ('%', 1), 'v': ('+', 2)}
+
+
+def irc_lower(name):
+    """
+    Lowercase ``name`` the RFC 1459 way, where ``[]\\~`` are the upper
+    case of ``{}|^``.
+    """
+    return name.translate(_rfc1459_lower)
+
+
+class MembershipIndex(object):
+    """
+    Tracks the members of the channels the bot is in.
+
+    Each channel maps its members' lowercased nicks to the status
+    prefixes (``@``, ``+``, ...) they hold there, most powerful first.
+    Nicks and prefixes are interned, so a nick in many channels is
+    stored once. A nick's channels are kept too, as a single channel
+    for the many nicks that are only in one and as a set otherwise, so
+    both "is X in #y" and "where is X" are dict lookups.
+
+    Names are only stored in their original case when that differs from
+    the lowercased key.
+    """
+    def __init__(self, prefixes=DEFAULT_PREFIXES):
+        # channel key -> {nick key: prefixes}
+        self._channels = {}
+        # nick key -> channel key, or a set of them
+        self._nick_channels = {}
+        # key -> name, for names that aren't all lower case
+        self._names = {}
+        # channel key -> {nick key: prefixes}, while NAMES replies arrive
+        self._syncing = {}
+        self.set_prefixes(prefixes)
+
+    def set_prefixes(self, prefixes):
+        """
+        :param prefixes:
+            The server's PREFIX, as parsed by `ServerSupportedFeatures`:
+            a dict mapping mode letters to (prefix, rank) pairs.
+        """
+        ranked = sorted(prefixes.items(), key=lambda item: item[1][1])
+        self._mode_prefixes = dict(
+            (mode, prefix) for mode, (prefix, _) in ranked)
+        self._prefix_order = ''.join(prefix for _, (prefix, _) in ranked)
+
+    def _key(self, name):
+        key = intern(irc_lower(name))
+        if key != name:
+            self._names[key] = name
+        return key
+
+    def _name(self, key):
+        return self._names.get(key, key)
+
+    def _sort_prefixes(self, prefixes):
+        if len(prefixes) > 1:
+            prefixes = ''.join(
+                p for p in self._prefix_order if p in prefixes)
+        return intern(prefixes)
+
+    def _split_prefixes(self, name):
+        """
+        Split ``@+nick`` into ``('@+', 'nick')``.
+        """
+        index = 0
+        while index < len(name) and name[index] in self._prefix_order:
+            index += 1
+        return self._sort_prefixes(name[:index]), name[index:]
+
+    def _link(self, key, channel_key):
+        current = self._nick_channels.get(key)
+        if current is None:
+            self._nick_channels[key] = channel_key
+        elif isinstance(current, set):
+            current.add(channel_key)
+        elif current != channel_key:
+            self._nick_channels[key] = set([current, channel_key])
+
+    def _unlink(self, key, channel_key):
+        current = self._nick_channels.get(key)
+        if isinstance(current, set):
+            current.discard(channel_key)
+            if len(current) == 1:
+                self._nick_channels[key] = current.pop()
+        elif current == channel_key:
+            del self._nick_channels[key]
+            self._names.pop(key, None)
+
+    def _channel_keys(self, key):
+        current = self._nick_channels.get(key)
+        if current is None:
+            return ()
+        if isinstance(current, set):
+            return list(current)
+        return (current,)
+
+    def add(self, nickname, channel, prefixes=''):
+        channel_key = self._key(channel)
+        key = self._key(nickname)
+        self._channels.setdefault(channel_key, {})[key] = (
+            self._sort_prefixes(prefixes))
+        self._link(key, channel_key)
+
+    def remove(self, nickname, channel):
+        channel_key = irc_lower(channel)
+        key = irc_lower(nickname)
+        members = self._channels.get(channel_key)
+        if members is not None and members.pop(key, None) is not None:
+            self._unlink(key, channel_key)
+
+    def remove_channel(self, channel):
+        """
+        Forget ``channel`` and its members, when the bot leaves it.
+
+        :returns: The members that are now in none of the channels.
+        """
+        channel_key = irc_lower(channel)
+        self._syncing.pop(channel_key, None)
+        gone = []
+        for key in self._channels.pop(channel_key, ()):
+            name = self._name(key)
+            self._unlink(key, channel_key)
+            if key not in self._nick_channels:
+                gone.append(name)
+        self._names.pop(channel_key, None)
+        return gone
+
+    def quit(self, nickname):
+        """
+        Remove ``nickname`` from every channel.
+
+        :returns: The channels it was in.
+        """
+        key = irc_lower(nickname)
+        channel_keys = self._channel_keys(key)
+        channels = [self._name(channel_key) for channel_key in channel_keys]
+        for channel_key in channel_keys:
+            self._channels[channel_key].pop(key, None)
+        self._nick_channels.pop(key, None)
+        self._names.pop(key, None)
+        return channels
+
+    def rename(self, old, new):
+        old_key = irc_lower(old)
+        channel_keys = self._channel_keys(old_key)
+        if not channel_keys:
+            return
+        current = self._nick_channels.pop(old_key)
+        self._names.pop(old_key, None)
+        new_key = self._key(new)
+        for channel_key in channel_keys:
+            members = self._channels[channel_key]
+            members[new_key] = members.pop(old_key)
+        self._nick_channels[new_key] = current
+
+    def modes_changed(self, channel, added, modes, args):
+        """
+        Apply a MODE change, as passed to `IRCClient.modeChanged`, to
+        the status of members of ``channel``.
+        """
+        members = self._channels.get(irc_lower(channel))
+        if members is None:
+            return
+        for mode, nickname in zip(modes, args):
+            prefix = self._mode_prefixes.get(mode)
+            key = irc_lower(nickname or '')
+            if prefix is None or key not in members:
+                continue
+            current = members[key]
+            if added and prefix not in current:
+                members[key] = self._sort_prefixes(current + prefix)
+            elif not added and prefix in current:
+                members[key] = intern(current.replace(prefix, ''))
+
+    def names_reply(self, channel, names):
+        """
+        Record a line of a NAMES reply (353). ``channel``'s members are
+        replaced by the ones listed once `end_of_names` is called.
+        """
+        channel_key = self._key(channel)
+        members = self._syncing.setdefault(channel_key, {})
+        for name in names:
+            prefixes, nickname = self._split_prefixes(name)
+            if nickname:
+                members[self._key(nickname)] = prefixes
+
+    def end_of_names(self, channel):
+        channel_key = irc_lower(channel)
+        members = self._syncing.pop(channel_key, None)
+        if members is None:
+            return
+        old = self._channels.get(channel_key, {})
+        for key in old:
+            if key not in members:
+                self._unlink(key, channel_key)
+        for key in members:
+            if key not in old:
+                self._link(key, channel_key)
+        self._channels[channel_key] = members
+
+    def who_reply(self, channel, nickname, flags):
+        """
+        Record a WHO reply (352) for a member of a channel the bot is
+        in. ``flags`` is e.g. ``H@`` or ``G*+``.
+        """
+        if irc_lower(channel) not in self._channels:
+            return
+        prefixes = ''.join(
+            flag for flag in flags if flag in self._prefix_order)
+        self.add(nickname, channel, prefixes)
+
+    def clear(self):
+        self._channels.clear()
+        self._nick_channels.clear()
+        self._names.clear()
+        self._syncing.clear()
+
+    def is_member(self, nickname, channel):
+        return irc_lower(nickname) in self._channels.get(
+            irc_lower(channel), ())
+
+    def prefixes(self, nickname, channel):
+        """
+        :returns:
+            The status prefixes ``nickname`` holds in ``channel``, or
+            None if it isn't there.
+        """
+        return self._channels.get(irc_lower(channel), {}).get(
+            irc_lower(nickname))
+
+    def channels(self, nickname):
+        return [
+            self._name(channel_key)
+            for channel_key in self._channel_keys(irc_lower(nickname))]
+
+    def members(self, channel):
+        return [
+            self._name(key)
+            for key in self._channels.get(irc_lower(channel), ())]
+
+    def stats(self):
+        return {
+            'channels': len(self._channels),
+            'nicks': len(self._nick_channels),
+            'memberships': sum(
+                len(members) for members in self._channels.values()),
+        }
@@ -0,0 +1,234 @@
+"""
+Counters, gauges and histograms, served in the Prometheus text format.
+
+Updating a metric is a dict lookup and an addition, so instrumentation
+can stay on in production. Nothing is served unless `listen` is called.
+"""
+import bisect
+from collections import defaultdict
+
+from twisted.internet import endpoints
+from twisted.web import resource, server
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('\n', '\\n')
+        .replace('"', '\\"'))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{0}="{1}"'.format(name, _escape(value))
+        for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = defaultdict(float)
+
+    def inc(self, *label_values):
+        self.values[label_values] += 1
+
+    def add(self, amount, *label_values):
+        self.values[label_values] += amount
+
+    def samples(self):
+        for label_values, value in sorted(self.values.items()):
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Gauge(object):
+    """
+    A value that can go up and down.
+
+    If ``callback`` is given it is called at collection time and must
+    return an iterable of (label values, value) pairs.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=(), callback=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.callback = callback
+        self.values = {}
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+    def samples(self):
+        if self.callback is not None:
+            values = self.callback()
+        else:
+            values = self.values.items()
+        for label_values, value in sorted(values):
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+# Default latency buckets, in seconds.
+latency_buckets = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0,
+)
+
+
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=latency_buckets):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Label values -> [per-bucket counts..., sum]
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        counts = self.values.get(label_values)
+        if counts is None:
+            counts = self.values[label_values] = [0] * len(self.buckets) + [0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self):
+        for label_values, counts in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labels, label_values,
+                    [('le', _format_value(bound))])
+                yield self.name + '_bucket', labels, cumulative
+            labels = _format_labels(self.labels, label_values)
+            yield self.name + '_sum', labels, counts[-1]
+            yield self.name + '_count', labels, cumulative
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        """
+        Add ``metric``, replacing any earlier metric with the same name.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), callback=None):
+        return self.register(Gauge(name, help, labels, callback))
+
+    def histogram(self, name, help, labels=(), buckets=latency_buckets):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append('# HELP {0} {1}'.format(name, metric.help))
+            lines.append('# TYPE {0} {1}'.format(name, metric.kind))
+            for sample_name, labels, value in metric.samples():
+                lines.append('{0}{1} {2}'.format(
+                    sample_name, labels, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class MetricsResource(resource.Resource):
+    isLeaf = True
+
+    def __init__(self, registry):
+        resource.Resource.__init__(self)
+        self.registry = registry
+
+    def render_GET(self, request):
+        request.setHeader(
+            'Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        return self.registry.render()
+
+
+def listen(reactor, port, interface='127.0.0.1', registry=registry):
+    """
+    Serve ``registry`` over HTTP on ``interface`` and ``port``.
+
+    :returns: A Deferred that fires with the listening port.
+    """
+    endpoint = endpoints.TCP4ServerEndpoint(
+        reactor, port, interface=interface)
+    return endpoint.listen(server.Site(MetricsResource(registry)))
+
+
+inbound_lines = registry.counter(
+    'akumabot_inbound_lines_total',
+    'Lines received from IRC servers, by network and IRC command.',
+    ('network', 'type'))
+commands_run = registry.counter(
+    'akumabot_commands_run_total', 'Commands run, by name.', ('command',))
+commands_rejected = registry.counter(
+    'akumabot_commands_rejected_total',
+    'Commands not run, by name and reason.', ('command', 'reason'))
+command_errors = registry.counter(
+    'akumabot_command_errors_total',
+    'Commands that failed with an unexpected error, by name.', ('command',))
+command_latency = registry.histogram(
+    'akumabot_command_latency_seconds',
+    'Time from running a command to sending its reply, by name.',
+    ('command',))
+connections = registry.counter(
+    'akumabot_connections_total',
+    'Connections made to IRC servers, by network.', ('network',))
+reconnects = registry.counter(
+    'akumabot_reconnects_total',
+    'Connections made after the first, by network.', ('network',))
+log_events_dropped = registry.counter(
+    'akumabot_log_events_dropped_total',
+    'Log events dropped by sampling or rate limits, by event type.',
+    ('event_type',))
+response_cache = registry.counter(
+    'akumabot_response_cache_requests_total',
+    'Response cache lookups, by command and result (hit or miss).',
+    ('command', 'result'))
+join_duration = registry.histogram(
+    'akumabot_join_duration_seconds',
+    'Time from signing on to being in every channel, by network.',
+    ('network',), buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600))
+whois_lookups = registry.counter(
+    'akumabot_whois_lookups_total',
+    'WHOIS queries sent to find out if a nick is an admin, by network.',
+    ('network',))
+activity_flush_duration = registry.histogram(
+    'akumabot_activity_flush_seconds',
+    'Time taken to write a batch of activity updates to the database.')
+worker_commands = registry.counter(
+    'akumabot_worker_commands_total',
+    'Commands run in worker processes, by worker and result (completed '
+    'or failed).', ('worker', 'result'))
+worker_busy_time = registry.counter(
+    'akumabot_worker_busy_seconds_total',
+    'Time spent waiting for commands run in workers, by worker.',
+    ('worker',))
+worker_restarts = registry.counter(
+    'akumabot_worker_restarts_total',
+    'Worker processes respawned after exiting, by worker.', ('worker',))
@@ -0,0 +1,196 @@
+"""
+Gather the QUITs of a netsplit and the JOINs of the netjoin that
+follows into one batch each, instead of thousands of separate events.
+"""
+import re
+
+from twisted.internet import reactor
+
+
+# Servers make a netsplit's QUIT message the names of the two servers
+# that lost each other, and put "Quit: " before users' own messages so
+# that they can't fake one. Networks that hide their servers use names
+# like "*.net *.split".
+_split_message = re.compile(r'^(\S+\.\S+) (\S+\.\S+)$')
+
+
+def split_servers(message):
+    """
+    :returns:
+        The two servers named by a netsplit QUIT message, or None if
+        ``message`` isn't one.
+    """
+    match = _split_message.match(message)
+    if match is None:
+        return None
+    return match.groups()
+
+
+class _Batch(object):
+    __slots__ = ('kind', 'servers', 'events', 'nicks', 'checked', 'ended')
+
+    def __init__(self, kind, servers):
+        self.kind = kind
+        self.servers = servers
+        # (nickname, message) for netsplits, (nickname, channel) for
+        # netjoins
+        self.events = []
+        # Nicks as the server sent them; a user's QUIT and JOIN give
+        # their nick in the same case.
+        self.nicks = set()
+        # How many events there were when last checked for quiet.
+        self.checked = 0
+        self.ended = None
+
+
+class NetsplitTracker(object):
+    """
+    Collects netsplit QUITs and netjoin JOINs, and hands each batch to
+    ``on_batch(kind, servers, events)`` once it is complete.
+
+    A batch is complete when the server ends it, for IRCv3 ``netsplit``
+    and ``netjoin`` batches, or else once ``quiet`` seconds pass (give
+    or take as much again) without another QUIT or JOIN for it. A JOIN
+    is taken to be part of a netjoin if the user quit in a netsplit in
+    the last ``rejoin_window`` seconds.
+
+    Adding to a batch is kept to a few appends, since this is the one
+    thing done per user in a split.
+    """
+    def __init__(self, on_batch, quiet=1.0, rejoin_window=600,
+                 clock=reactor):
+        self.on_batch = on_batch
+        self.quiet = quiet
+        self.rejoin_window = rejoin_window
+        self.clock = clock
+        # Batches from IRCv3 BATCH, by reference tag.
+        self._tagged = {}
+        # Batches recognised by their messages, by (kind, servers).
+        self._guessed = {}
+        self._flush_call = None
+        # Finished netsplits whose users may still come back, oldest
+        # first.
+        self._splits = []
+        self._last_message = self._last_servers = None
+
+    def start_batch(self, reference, kind, params):
+        """
+        Record an IRCv3 ``BATCH +reference kind params...``; returns
+        False if ``kind`` isn't a batch type collected here.
+        """
+        if kind not in ('netsplit', 'netjoin'):
+            return False
+        self._tagged[reference] = _Batch(kind, tuple(params[:2]))
+        return True
+
+    def end_batch(self, reference):
+        batch = self._tagged.pop(reference, None)
+        if batch is not None:
+            self._finish(batch)
+
+    def quit(self, nickname, message, reference=None):
+        """
+        :returns: True if the QUIT is part of a netsplit, and so held.
+        """
+        batch = self._tagged.get(reference)
+        if batch is None or batch.kind != 'netsplit':
+            # Every QUIT in a split has the same message.
+            if message != self._last_message:
+                self._last_message = message
+                self._last_servers = split_servers(message)
+            if self._last_servers is None:
+                return False
+            batch = self._guessed_batch('netsplit', self._last_servers)
+        batch.events.append((nickname, message))
+        batch.nicks.add(nickname)
+        return True
+
+    def join(self, nickname, channel, reference=None):
+        """
+        :returns: True if the JOIN is part of a netjoin, and so held.
+        """
+        batch = self._tagged.get(reference)
+        if batch is None or batch.kind != 'netjoin':
+            if not self._splits and not self._guessed:
+                return False
+            servers = self._split_servers(nickname)
+            if servers is None:
+                return False
+            batch = self._guessed_batch('netjoin', servers)
+        batch.events.append((nickname, channel))
+        batch.nicks.add(nickname)
+        return True
+
+    def _split_servers(self, nickname):
+        """
+        The servers of the recent netsplit ``nickname`` quit in, if any.
+        """
+        # The netsplit must be handled before the user is back.
+        for pending in list(self._guessed.values()):
+            if pending.kind == 'netsplit' and nickname in pending.nicks:
+                del self._guessed[pending.kind, pending.servers]
+                self._finish(pending)
+        expired = self.clock.seconds() - self.rejoin_window
+        while self._splits and self._splits[0].ended < expired:
+            self._splits.pop(0)
+        for split in reversed(self._splits):
+            if nickname in split.nicks:
+                return split.servers
+        return None
+
+    def _guessed_batch(self, kind, servers):
+        batch = self._guessed.get((kind, servers))
+        if batch is None:
+            batch = self._guessed[kind, servers] = _Batch(kind, servers)
+            if self._flush_call is None:
+                self._flush_call = self.clock.callLater(
+                    self.quiet, self._flush_quiet)
+        return batch
+
+    def _flush_quiet(self):
+        # Rather than push a timer back for every QUIT, check every
+        # ``quiet`` seconds which batches have had nothing added.
+        self._flush_call = None
+        for key, batch in list(self._guessed.items()):
+            if len(batch.events) == batch.checked:
+                del self._guessed[key]
+                self._finish(batch)
+            else:
+                batch.checked = len(batch.events)
+        if self._guessed:
+            self._flush_call = self.clock.callLater(
+                self.quiet, self._flush_quiet)
+
+    def _finish(self, batch):
+        batch.ended = self.clock.seconds()
+        if batch.kind == 'netsplit':
+            self._splits.append(batch)
+        else:
+            # Later JOINs from these users are their own.
+            for split in self._splits:
+                split.nicks.difference_update(batch.nicks)
+        if batch.events:
+            self.on_batch(batch.kind, batch.servers, batch.events)
+
+    def flush(self):
+        """
+        Finish every batch now.
+        """
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        batches = list(self._guessed.values()) + list(self._tagged.values())
+        self._guessed.clear()
+        self._tagged.clear()
+        for batch in batches:
+            self._finish(batch)
+
+    def stop(self):
+        """
+        Drop every batch, when the connection is lost.
+        """
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        self._guessed.clear()
+        self._tagged.clear()
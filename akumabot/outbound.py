@@ -0,0 +1,125 @@
+"""
+Flood control for lines the bot sends to the server.
+"""
+import collections
+
+from twisted.internet import reactor
+
+
+# Priority classes, most urgent first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+_priorities = (PRIORITY_HIGH, PRIORITY_NORMAL)
+
+
+class OutboundScheduler(object):
+    """
+    Sends queued lines no faster than a token bucket allows.
+
+    The bucket holds at most ``burst`` tokens and refills at ``rate``
+    tokens per second; sending costs one token per line. Higher priority
+    lines always go first, and within a priority class targets take
+    turns, so one busy channel can't hold up replies everywhere else.
+    """
+    def __init__(self, rate=1.0, burst=5, clock=reactor):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self._updated = clock.seconds()
+        # Per priority, target -> deque of (queued_at, cost, func, args),
+        # in the order the targets take their turns.
+        self._queues = dict(
+            (priority, collections.OrderedDict()) for priority in _priorities)
+        self._depth = 0
+        self._pump_call = None
+        # Whether _pump is sending, so that a line queued by one being
+        # sent doesn't start another pump.
+        self._pumping = False
+        self.sent = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def enqueue(self, target, priority, func, args=(), cost=1):
+        """
+        Call ``func(*args)`` once there are ``cost`` tokens to spare and
+        nothing more urgent is waiting.
+        """
+        queue = self._queues[priority].setdefault(target, collections.deque())
+        queue.append((self.clock.seconds(), cost, func, args))
+        self._depth += 1
+        if self._pump_call is None and not self._pumping:
+            self._pump()
+
+    def clear(self):
+        for targets in self._queues.values():
+            targets.clear()
+        self._depth = 0
+        if self._pump_call is not None and self._pump_call.active():
+            self._pump_call.cancel()
+        self._pump_call = None
+
+    def depth(self, priority=None):
+        if priority is None:
+            return self._depth
+        return sum(len(queue) for queue in self._queues[priority].values())
+
+    def stats(self):
+        return {
+            'depth': self._depth,
+            'depth_high': self.depth(PRIORITY_HIGH),
+            'depth_normal': self.depth(PRIORITY_NORMAL),
+            'tokens': self.tokens,
+            'sent': self.sent,
+            'mean_wait': self.total_wait / self.sent if self.sent else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+    def _refill(self):
+        now = self.clock.seconds()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def _next(self):
+        """
+        Return the target queue whose turn it is, and its targets map.
+        """
+        for priority in _priorities:
+            targets = self._queues[priority]
+            if targets:
+                target = next(iter(targets))
+                return target, targets[target], targets
+        return None
+
+    def _pump(self):
+        self._pump_call = None
+        self._pumping = True
+        try:
+            self._send_queued()
+        finally:
+            self._pumping = False
+
+    def _send_queued(self):
+        now = self._refill()
+        while self._depth:
+            target, queue, targets = self._next()
+            queued_at, cost, func, args = queue[0]
+            if self.tokens < min(cost, self.burst):
+                self._pump_call = self.clock.callLater(
+                    (min(cost, self.burst) - self.tokens) / self.rate,
+                    self._pump)
+                return
+            queue.popleft()
+            del targets[target]
+            if queue:
+                # Back of the line for this target.
+                targets[target] = queue
+            self._depth -= 1
+            self.tokens -= cost
+            wait = now - queued_at
+            self.sent += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            func(*args)
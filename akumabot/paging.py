@@ -0,0 +1,182 @@
+"""
+Splitting replies into IRC lines, and sending long ones a page at a time.
+
+A server relays a PRIVMSG as ``:nick!user@host PRIVMSG target :text``,
+and cuts off whatever doesn't fit in 512 bytes, so how much text a line
+can hold depends on the bot's own hostmask and on the target; see
+`akumabot.bot.Network.message_budget`. Lines are split on UTF-8 bytes,
+at spaces where possible and never inside a character.
+
+A command may return an iterable of strings, e.g. a generator, instead
+of one string; its items are only produced as the pages they end up on
+are sent.
+"""
+import collections
+import itertools
+
+from twisted.internet import reactor
+
+from akumabot.cache import TTLCache
+
+
+def encode(message):
+    """
+    :returns: ``message`` as UTF-8 bytes.
+    """
+    if isinstance(message, unicode):
+        return message.encode('utf-8')
+    return message
+
+
+def split_lines(message, budget):
+    """
+    Split ``message`` into lines of at most ``budget`` bytes.
+
+    Line breaks in ``message`` are kept and blank lines dropped; a line
+    that is too long is broken at the last space that fits, or, in a
+    word longer than a line, before the first character that doesn't.
+    """
+    if budget < 1:
+        raise ValueError('No room for a message')
+    lines = []
+    for line in encode(message).splitlines():
+        line = line.rstrip()
+        while len(line) > budget:
+            cut = line.rfind(' ', 0, budget + 1)
+            if cut > 0:
+                head, line = line[:cut], line[cut + 1:]
+            else:
+                cut = budget
+                # Back up over UTF-8 continuation bytes.
+                while cut > 0 and 0x80 <= ord(line[cut]) < 0xc0:
+                    cut -= 1
+                if cut == 0:
+                    cut = budget
+                head, line = line[:cut], line[cut:]
+            head = head.rstrip()
+            if head:
+                lines.append(head)
+        if line:
+            lines.append(line)
+    return lines
+
+
+def join_chunks(chunks, limit):
+    """
+    :returns:
+        The first ``limit`` strings from the iterable ``chunks``, as one
+        string with a line for each.
+    """
+    return '\n'.join(
+        encode(chunk) for chunk in itertools.islice(chunks, limit))
+
+
+class _Cursor(object):
+    """
+    Where a reply being paged has got to: lines split but not yet sent,
+    and, for a reply produced lazily, the iterator of what remains.
+    """
+    __slots__ = ('budget', 'lines', 'chunks', 'room')
+
+    def __init__(self, reply, budget, room):
+        self.budget = budget
+        # How many more lines may be read in.
+        self.room = room
+        self.lines = collections.deque()
+        if isinstance(reply, basestring):
+            self.chunks = None
+            self._add(reply)
+        else:
+            self.chunks = iter(reply)
+
+    def _add(self, chunk):
+        lines = split_lines(chunk, self.budget)
+        if len(lines) >= self.room:
+            del lines[self.room:]
+            self.chunks = None
+        self.room -= len(lines)
+        self.lines.extend(lines)
+
+    def page(self, count):
+        """
+        :returns:
+            The next ``count`` lines, or fewer at the end, and whether
+            there are more after them.
+        """
+        # Read one line ahead, to know whether there is more.
+        while len(self.lines) <= count and self.chunks is not None:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.chunks = None
+            else:
+                self._add(chunk)
+        lines = [
+            self.lines.popleft() for _ in range(min(count, len(self.lines)))]
+        return lines, bool(self.lines)
+
+
+class Pager(object):
+    """
+    Cuts replies to ``max_lines`` lines, keeping the rest for `next_page`.
+
+    Up to ``max_pages`` pages of a reply are sent; anything after that
+    is dropped. The rest of a reply is kept per key, which says whose
+    reply it was and where, for ``ttl`` seconds after its last page was
+    sent, and for at most ``max_cursors`` keys at once; so at most
+    ``max_cursors * max_lines * max_pages`` lines are held, and fewer
+    for replies that are produced lazily.
+    """
+    # Put on the last line of a page that has more after it.
+    more_hint = ' (more)'
+
+    def __init__(self, max_lines=3, max_pages=10, ttl=300.0,
+                 max_cursors=1000, clock=reactor):
+        if max_lines < 1:
+            raise ValueError('max_lines must be at least 1')
+        self.max_lines = max_lines
+        self.max_pages = max_pages
+        self._cursors = TTLCache(max_cursors, ttl, clock)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['replies.max_lines'], config['replies.max_pages'],
+            config['replies.more_ttl'], config['replies.max_cursors'])
+
+    def __len__(self):
+        return len(self._cursors)
+
+    def first_page(self, key, reply, budget):
+        """
+        :param reply: A string, or an iterable of strings.
+        :param budget: The most bytes a line may take.
+        :returns:
+            A list of the lines to send now, the last with `more_hint`
+            on it if there are more. Anything kept for ``key`` before is
+            dropped either way.
+        """
+        self._cursors.pop(key)
+        cursor = _Cursor(
+            reply, budget - len(self.more_hint),
+            self.max_lines * self.max_pages)
+        return self._page(key, cursor)
+
+    def next_page(self, key):
+        """
+        :returns:
+            The next page of the reply kept for ``key``, like
+            `first_page`, or None if there isn't one.
+        """
+        cursor = self._cursors.get(key)
+        if cursor is None:
+            return None
+        self._cursors.pop(key)
+        return self._page(key, cursor)
+
+    def _page(self, key, cursor):
+        lines, more = cursor.page(self.max_lines)
+        if more:
+            lines[-1] += self.more_hint
+            self._cursors[key] = cursor
+        return lines
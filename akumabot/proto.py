@@ -1,56 +1,198 @@
 """
 Original code by habnabit: https://gist.github.com/habnabit/5823693
 """
-from twisted.internet import defer, protocol, reactor
-from twisted.python import log
+from twisted.internet import protocol
+from twisted.logger import Logger
 from twisted.words.protocols import irc
 
+from akumabot import metrics
 from akumabot.conversation import ConversationMap
+from akumabot.netsplit import NetsplitTracker
 
 
 class AkumaBotProtocol(irc.IRCClient):
+    """
+    Debug events are only emitted when ``debug`` is set, and carry an
+    ``event_type`` so that `akumabot.logfilter` can sample them.
+    """
+    log = Logger()
+    network_name = None
+    _signed_on = False
+    # IRCv3 capabilities to ask for, if the server has them.
+    wanted_capabilities = ('account-notify', 'extended-join', 'batch')
+    # The IRCv3 batch the line being handled belongs to, if any.
+    _line_batch = None
+    # The bot's own nick!user@host, once a JOIN of its own shows it.
+    hostmask = None
 
     def __init__(self, nickname, password, debug):
-        self.deferred = defer.Deferred()
-
         self.nickname = nickname
         self.password = password
         self.debug = debug
 
         self.conversations = ConversationMap(self)
         self.notice_conversations = ConversationMap(self)
+        # Capabilities the server has, and those it agreed to enable.
+        self.available_capabilities = set()
+        self.capabilities = set()
+        self.splits = NetsplitTracker(self._netsplit_batch)
 
     def connectionLost(self, reason):
-        log.msg('Disconnected')
-        self.deferred.errback(reason)
+        self.log.info(
+            'Disconnected from network {network!r}',
+            network=self.network_name)
+        self.conversations.stop()
+        self.notice_conversations.stop()
+        self.splits.stop()
+
+    def lineReceived(self, line):
+        # Of IRCv3 message tags, only "batch" matters here.
+        self._line_batch = None
+        if line.startswith('@'):
+            tags, _, line = line[1:].partition(' ')
+            for tag in tags.split(';'):
+                if tag.startswith('batch='):
+                    self._line_batch = tag[6:]
+        irc.IRCClient.lineReceived(self, line)
+
+    def handleCommand(self, command, prefix, params):
+        metrics.inbound_lines.inc(self.network_name, command)
+        irc.IRCClient.handleCommand(self, command, prefix, params)
+
+    def register(self, nickname, hostname='foo', servername='bar'):
+        # A server that supports CAP holds registration until CAP END;
+        # one that doesn't just says it's an unknown command.
+        self.sendLine('CAP LS 302')
+        irc.IRCClient.register(self, nickname, hostname, servername)
+
+    def irc_CAP(self, prefix, params):
+        subcommand = params[1].upper()
+        if subcommand == 'LS':
+            self.available_capabilities.update(
+                capability.partition('=')[0]
+                for capability in params[-1].split())
+            # "CAP * LS * :..." means more are coming.
+            if len(params) > 3 and params[2] == '*':
+                return
+            wanted = [
+                capability for capability in self.wanted_capabilities
+                if capability in self.available_capabilities]
+            if wanted:
+                self.sendLine('CAP REQ :' + ' '.join(wanted))
+                return
+        elif subcommand == 'ACK':
+            self.capabilities.update(params[-1].split())
+        elif subcommand != 'NAK':
+            return
+        self.sendLine('CAP END')
+
+    def irc_JOIN(self, prefix, params):
+        nickname = prefix.split('!')[0]
+        if nickname == self.nickname:
+            self.hostmask = prefix
+        # With extended-join, JOIN also gives the account and real name.
+        if 'extended-join' in self.capabilities and len(params) > 2:
+            if nickname != self.nickname:
+                self.bot.account_changed(nickname, params[1])
+            params = params[:1]
+        irc.IRCClient.irc_JOIN(self, prefix, params)
+
+    def irc_396(self, prefix, params):
+        # RPL_HOSTHIDDEN: services gave the bot a cloak.
+        if self.hostmask is not None:
+            self.hostmask = '{0}@{1}'.format(
+                self.hostmask.partition('@')[0], params[1])
+
+    def irc_BATCH(self, prefix, params):
+        reference = params[0]
+        if reference.startswith('+'):
+            self.splits.start_batch(reference[1:], params[1], params[2:])
+        elif reference.startswith('-'):
+            self.splits.end_batch(reference[1:])
+
+    def _netsplit_batch(self, kind, servers, events):
+        self.log.info(
+            '{kind} between {servers!r}: {count} users',
+            event_type=kind, kind=kind.capitalize(), servers=servers,
+            count=len(set(nickname for nickname, _ in events)))
+        if kind == 'netsplit':
+            self.bot.netsplit(
+                servers, [nickname for nickname, _ in events])
+        else:
+            self.bot.netjoin(servers, events)
 
-    def signedOn(self):
-        reactor.callLater(0.5, self._join_channels)
+    def irc_ACCOUNT(self, prefix, params):
+        self.bot.account_changed(prefix.split('!')[0], params[0])
+
+    def irc_330(self, prefix, params):
+        # RPL_WHOISACCOUNT, which Twisted has no name for.
+        self.bot.whois_account(params[1], params[2])
+
+    def irc_RPL_ENDOFWHOIS(self, prefix, params):
+        self.bot.end_of_whois(params[1])
+
+    def irc_RPL_ENDOFMOTD(self, prefix, params):
+        irc.IRCClient.irc_RPL_ENDOFMOTD(self, prefix, params)
+        self._registration_finished()
+
+    def irc_ERR_NOMOTD(self, prefix, params):
+        self._registration_finished()
+
+    def _registration_finished(self):
+        # RPL_ISUPPORT, which says how many channels a JOIN may name
+        # and what the status prefixes are, comes after RPL_WELCOME
+        # (`signedOn`) but before the MOTD.
+        if not self._signed_on:
+            self._signed_on = True
+            self.bot.signed_on()
 
     def joined(self, channel):
-        log.msg('Joined channel {0!r}'.format(channel))
+        self.log.info('Joined channel {channel!r}', channel=channel)
+        self.bot.joined_channel(channel)
 
-    def _join_channels(self):
-        for channel in self.factory.channels:
-            log.msg('Attempting to join {0}'.format(channel))
-            self.join(channel)
+    def left(self, channel):
+        self.log.info('Left channel {channel!r}', channel=channel)
+        self.bot.left_channel(channel)
 
-    def _debug(self, message):
-        if self.debug:
-            log.msg('DEBUG ' + message)
+    def _join_failed(self, prefix, params):
+        channel, reason = params[1], params[-1]
+        self.log.warn(
+            'Could not join {channel!r}: {reason!r}',
+            channel=channel, reason=reason)
+        self.bot.join_failed(channel, reason)
+
+    irc_ERR_NOSUCHCHANNEL = _join_failed
+    irc_ERR_TOOMANYCHANNELS = _join_failed
+    irc_ERR_CHANNELISFULL = _join_failed
+    irc_ERR_INVITEONLYCHAN = _join_failed
+    irc_ERR_BANNEDFROMCHAN = _join_failed
+    irc_ERR_BADCHANNELKEY = _join_failed
+
+    def irc_RPL_NAMREPLY(self, prefix, params):
+        self.bot.names_reply(params[2], params[3].split())
+
+    def irc_RPL_ENDOFNAMES(self, prefix, params):
+        self.bot.end_of_names(params[1])
+
+    def irc_RPL_WHOREPLY(self, prefix, params):
+        self.bot.who_reply(params[1], params[5], params[6])
 
     def noticed(self, user, channel, message):
-        self._debug(
-            'Received notice from user {0!r}, channel {1!r}: {2!r}'.format(
-                user, channel, message))
+        if self.debug:
+            self.log.debug(
+                'Received notice from user {user!r}, channel {channel!r}: '
+                '{message!r}', event_type='notice', user=user,
+                channel=channel, message=message)
         nickname, _, host = user.partition('!')
         message = message.strip()
         self.bot.received_notice(nickname, channel, message)
 
     def privmsg(self, user, channel, message):
-        self._debug(
-            'Received message from user {0!r}, channel {1!r}: {2!r}'.format(
-                user, channel, message))
+        if self.debug:
+            self.log.debug(
+                'Received message from user {user!r}, channel {channel!r}: '
+                '{message!r}', event_type='privmsg', user=user,
+                channel=channel, message=message)
         nickname, _, host = user.partition('!')
         message = message.strip()
         if channel == self.nickname:
@@ -59,58 +201,153 @@ class AkumaBotProtocol(irc.IRCClient):
             self.bot.received_message(nickname, channel, message)
 
     def msg(self, user, message, length=None):
-        self._debug('Sending message to user/channel {0!r}: {1!r}'.format(
-            user, message))
+        if self.debug:
+            self.log.debug(
+                'Sending message to user/channel {target!r}: {message!r}',
+                event_type='msg', target=user, message=message)
         irc.IRCClient.msg(self, user, message, length)
 
     def notice(self, user, message, length=None):
-        self._debug('Sending notice to user/channel {0!r}: {1!r}'.format(
-            user, message))
+        if self.debug:
+            self.log.debug(
+                'Sending notice to user/channel {target!r}: {message!r}',
+                event_type='send_notice', target=user, message=message)
         irc.IRCClient.notice(self, user, message, length)
 
     def modeChanged(self, user, channel, set, modes, args):
-        action = 'set' if set else 'removed'
-        fmt = 'User {0!r} {1} mode(s) {2!r} for {3!r} with args {4!r}'
-        log.msg(fmt.format(user, action, modes, channel, args))
+        self.log.info(
+            'User {user!r} {action} mode(s) {modes!r} for {channel!r} '
+            'with args {args!r}', event_type='mode', user=user,
+            action='set' if set else 'removed', modes=modes,
+            channel=channel, args=args)
+        self.bot.mode_changed(channel, set, modes, args)
+
+    def nickChanged(self, nick):
+        old = self.nickname
+        irc.IRCClient.nickChanged(self, nick)
+        if self.hostmask is not None:
+            self.hostmask = nick + '!' + self.hostmask.partition('!')[2]
+        self.bot.nick_changed(old, nick)
 
     def kickedFrom(self, channel, kicker, message):
-        self._debug('Kicked from {0!r} by {1!r}: {2!r}'.format(
-            channel, kicker, message))
+        if self.debug:
+            self.log.debug(
+                'Kicked from {channel!r} by {kicker!r}: {message!r}',
+                event_type='kicked', channel=channel, kicker=kicker,
+                message=message)
         self.bot.kicked(channel, kicker, message)
 
+    def userKicked(self, kickee, channel, kicker, message):
+        if self.debug:
+            self.log.debug(
+                'User {kickee!r} was kicked from {channel!r} by {kicker!r}: '
+                '{message!r}', event_type='user_kicked', kickee=kickee,
+                channel=channel, kicker=kicker, message=message)
+        self.bot.user_kicked(kickee, channel, kicker, message)
+
     def userJoined(self, user, channel):
-        self._debug('User {0!r} has joined {1!r}'.format(user, channel))
+        if self.splits.join(user, channel, self._line_batch):
+            return
+        if self.debug:
+            self.log.debug(
+                'User {user!r} has joined {channel!r}',
+                event_type='user_joined', user=user, channel=channel)
         self.bot.user_joined(user, channel)
 
     def userLeft(self, user, channel):
-        self._debug('User {0!r} has left {1!r}'.format(user, channel))
+        if self.debug:
+            self.log.debug(
+                'User {user!r} has left {channel!r}',
+                event_type='user_left', user=user, channel=channel)
         self.bot.user_left(user, channel)
 
     def userQuit(self, user, quitMessage):
-        self._debug('User {0!r} has quit: {1!r}'.format(user, quitMessage))
+        if self.splits.quit(user, quitMessage, self._line_batch):
+            return
+        if self.debug:
+            self.log.debug(
+                'User {user!r} has quit: {message!r}',
+                event_type='user_quit', user=user, message=quitMessage)
         self.bot.user_quit(user, quitMessage)
 
     def userRenamed(self, oldname, newname):
-        self._debug(
-            'User {0!r} is now known as {1!r}'.format(oldname, newname))
+        if self.debug:
+            self.log.debug(
+                'User {oldname!r} is now known as {newname!r}',
+                event_type='user_renamed', oldname=oldname, newname=newname)
         self.bot.user_renamed(oldname, newname)
 
     def receivedMOTD(self, motd):
-        for msg in motd:
-            log.msg('MOTD: {0!r}'.format(msg))
+        for line in motd:
+            self.log.info('MOTD: {line!r}', event_type='motd', line=line)
 
 
-class AkumaBotFactory(protocol.ReconnectingClientFactory):
+class AkumaBotFactory(protocol.Factory):
+    """
+    Builds a protocol for each connection to ``network``, which is told
+    about it through ``got_protocol``. Reconnecting is left to the
+    `ClientService` the factory is used with.
+    """
     protocol = AkumaBotProtocol
 
-    def __init__(self, config):
+    def __init__(self, config, network=None):
         self.config = config
-        self.channels = config['akumabot.channels']
+        self.network = network
+        self.network_name = config.get('network.name')
+        self.connections = 0
 
     def buildProtocol(self, addr):
+        self.connections += 1
+        metrics.connections.inc(self.network_name)
+        if self.connections > 1:
+            metrics.reconnects.inc(self.network_name)
         p = self.protocol(
             self.config['akumabot.nickname'],
             self.config['akumabot.password'],
             self.config['akumabot.debug'])
         p.factory = self
+        p.network_name = self.network_name
+        if self.network is not None:
+            self.network.got_protocol(p)
         return p
+
+
+def pack_joins(channels, max_length=510, max_targets=None):
+    """
+    Pack JOINs for ``channels`` into as few lines as possible.
+
+    Keys apply to a line's channels in order, so channels with keys are
+    joined first.
+
+    :param channels: (channel, key) pairs; key may be None.
+    :param max_length:
+        Longest line in bytes, not counting the line ending.
+    :param max_targets:
+        Most channels per line, from the server's TARGMAX, or None.
+    :returns: A list of lines to send.
+    """
+    lines = []
+    names, keys, length = [], [], 0
+    for name, key in sorted(channels, key=lambda pair: not pair[1]):
+        # Each name or key adds itself plus a comma or space.
+        added = len(name) + 1 + (len(key) + 1 if key else 0)
+        if names and (length + added > max_length or
+                      len(names) == max_targets):
+            lines.append(_join_line(names, keys))
+            names, keys, length = [], [], 0
+        if not names:
+            length = len('JOIN')
+        names.append(name)
+        if key:
+            keys.append(key)
+        length += added
+    if names:
+        lines.append(_join_line(names, keys))
+    return lines
+
+
+def _join_line(names, keys):
+    line = 'JOIN ' + ','.join(names)
+    if keys:
+        line += ' ' + ','.join(keys)
+    return line
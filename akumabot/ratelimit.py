@@ -0,0 +1,126 @@
+"""
+Token-bucket limits on how often commands may be run.
+"""
+from collections import defaultdict
+
+from twisted.internet import reactor
+
+from akumabot.cache import LRUCache
+
+
+class TokenBucket(object):
+    """
+    Holds at most ``burst`` tokens and refills at ``rate`` per second.
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+
+class RateLimiter(object):
+    """
+    Limits commands per nickname, per channel and per network.
+
+    Each scope has its own bucket ``rate`` and ``burst``; a rate of 0
+    turns that scope off. A command is allowed only if every bucket it
+    falls in has ``cost`` tokens, and then takes them from all of them.
+    Nick and channel buckets are kept for the ``max_tracked`` most
+    recently seen of each; one evicted after that many others comes
+    back full, by which time it would have refilled anyway unless the
+    limits are very tight.
+
+    `should_warn` says whether a nick over its own limit is yet to be
+    told so, once until it next gets a command through.
+    """
+    scopes = ('nick', 'channel', 'network')
+
+    def __init__(self, limits, costs=None, max_tracked=10000,
+                 clock=reactor):
+        """
+        :param limits: A dict mapping scopes to (rate, burst) pairs.
+        :param costs: A dict mapping command names to their costs.
+        """
+        self.limits = dict(
+            (scope, limits[scope]) for scope in self.scopes
+            if limits.get(scope, (0, 0))[0] > 0)
+        self.costs = dict(costs or {})
+        self.clock = clock
+        self._buckets = dict(
+            (scope, LRUCache(max_tracked)) for scope in self.limits)
+        # (network, nick) of those told they are over their limit
+        self._warned = LRUCache(max_tracked)
+        self.rejected = defaultdict(int)
+
+    @classmethod
+    def from_config(cls, config):
+        limits = dict(
+            (scope, (config['ratelimit.{0}_rate'.format(scope)],
+                     config['ratelimit.{0}_burst'.format(scope)]))
+            for scope in cls.scopes)
+        return cls(
+            limits, config['ratelimit.costs'],
+            config['ratelimit.max_tracked'])
+
+    def allow(self, network, nickname, channel, command_name):
+        """
+        Take the tokens for a command, if there are enough.
+
+        :returns:
+            None if the command may run, or else the name of the scope
+            whose bucket is empty.
+        """
+        cost = self.costs.get(command_name, 1)
+        now = self.clock.seconds()
+        keys = {
+            'nick': (network, nickname.lower()),
+            'channel': (network, channel.lower()) if channel else None,
+            'network': network,
+        }
+        buckets = []
+        for scope, (rate, burst) in self.limits.items():
+            key = keys[scope]
+            if key is None:
+                continue
+            bucket = self._buckets[scope].get(key)
+            if bucket is None:
+                bucket = self._buckets[scope][key] = TokenBucket(
+                    rate, burst, now)
+            # A command costing more than the burst could never run.
+            if bucket.refill(now) < min(cost, burst):
+                self.rejected[scope] += 1
+                return scope
+            buckets.append(bucket)
+        for bucket in buckets:
+            bucket.tokens -= cost
+        self._warned.pop(keys['nick'])
+        return None
+
+    def should_warn(self, network, nickname):
+        """
+        :returns:
+            True the first time this is asked about ``nickname`` since
+            it last had a command allowed.
+        """
+        key = (network, nickname.lower())
+        if key in self._warned:
+            return False
+        self._warned[key] = True
+        return True
+
+    def stats(self):
+        return {
+            'tracked': dict(
+                (scope, len(buckets))
+                for scope, buckets in self._buckets.items()),
+            'rejected': dict(self.rejected),
+        }
@@ -0,0 +1,202 @@
+"""
+Recent lines said in each channel, searchable by word.
+"""
+import re
+import struct
+import sys
+from collections import deque
+
+from akumabot.membership import irc_lower
+
+
+# Seconds since the epoch and payload length, before each record's
+# ``nickname\0message`` payload.
+_header = struct.Struct('<IH')
+
+_word = re.compile(r'\w+', re.UNICODE)
+
+# Words indexed per line, so that one long line can't bloat the index.
+MAX_WORDS = 32
+
+
+def words(text):
+    """
+    The distinct lowercased words in ``text``, a UTF-8 string, in the
+    order they first appear.
+    """
+    seen = []
+    for word in _word.findall(text.decode('utf-8', 'replace').lower()):
+        word = intern(word.encode('utf-8'))
+        if word not in seen:
+            seen.append(word)
+            if len(seen) == MAX_WORDS:
+                break
+    return seen
+
+
+class ChannelScrollback(object):
+    """
+    The lines said in one channel, newest last, in a ring buffer of
+    ``max_bytes`` bytes. Adding a line past the end overwrites the
+    oldest.
+
+    Each line is stored as a small header followed by the nickname and
+    message, and is known by the offset it was written at, counting from
+    when the buffer was made. An index maps each word to the offsets of
+    the lines containing it, oldest first; it is updated as lines are
+    added and overwritten, so that it only ever covers what is in the
+    buffer.
+    """
+    def __init__(self, max_bytes):
+        if max_bytes <= _header.size:
+            raise ValueError(
+                'max_bytes must be more than {0}'.format(_header.size))
+        self.capacity = max_bytes
+        self._buffer = bytearray(max_bytes)
+        # Offsets of the oldest line and of the end of the newest.
+        self._start = 0
+        self._end = 0
+        self.lines = 0
+        # word -> deque of line offsets, oldest first
+        self._index = {}
+        self._postings = 0
+
+    def _write(self, offset, data):
+        position = offset % self.capacity
+        first = min(len(data), self.capacity - position)
+        self._buffer[position:position + first] = data[:first]
+        self._buffer[:len(data) - first] = data[first:]
+
+    def _read(self, offset, length):
+        position = offset % self.capacity
+        first = min(length, self.capacity - position)
+        return bytes(
+            self._buffer[position:position + first] +
+            self._buffer[:length - first])
+
+    def _line(self, offset):
+        """
+        :returns: (time, nickname, message, offset of the next line)
+        """
+        at, length = _header.unpack(self._read(offset, _header.size))
+        payload = self._read(offset + _header.size, length)
+        nickname, _, message = payload.partition('\0')
+        return at, nickname, message, offset + _header.size + length
+
+    def add(self, at, nickname, message):
+        payload = '{0}\0{1}'.format(nickname, message)
+        payload = payload[:min(0xffff, self.capacity - _header.size)]
+        record = _header.pack(int(at), len(payload)) + payload
+        end = self._end + len(record)
+        while self._start < self._end and self._start < end - self.capacity:
+            self._evict()
+        self._write(self._end, record)
+        # Index what was kept, so eviction finds the same words.
+        indexed = words(payload.partition('\0')[2])
+        for word in indexed:
+            postings = self._index.get(word)
+            if postings is None:
+                postings = self._index[word] = deque()
+            postings.append(self._end)
+        self._postings += len(indexed)
+        self._end = end
+        self.lines += 1
+
+    def _evict(self):
+        _, _, message, following = self._line(self._start)
+        for word in words(message):
+            postings = self._index[word]
+            # The oldest line is first in every list it is in.
+            postings.popleft()
+            self._postings -= 1
+            if not postings:
+                del self._index[word]
+        self._start = following
+        self.lines -= 1
+
+    def search(self, query, since=None, limit=10):
+        """
+        Find the lines containing every word in ``query``, newest first.
+
+        Only the lines containing the least common of the words are
+        looked at, so a search for a rare word is quick however full the
+        buffer is.
+
+        :param since: Leave out lines from before this time.
+        :returns: Up to ``limit`` (time, nickname, message) tuples.
+        """
+        wanted = words(query)
+        if not wanted:
+            return []
+        postings = [self._index.get(word) for word in wanted]
+        if None in postings:
+            return []
+        rarest = min(postings, key=len)
+        found = []
+        for offset in reversed(rarest):
+            at, nickname, message, _ = self._line(offset)
+            if since is not None and at < since:
+                break
+            if len(wanted) > 1 and not set(wanted).issubset(words(message)):
+                continue
+            found.append((at, nickname, message))
+            if len(found) == limit:
+                break
+        return found
+
+    def memory(self):
+        """
+        :returns:
+            A dict of the bytes taken by the ring buffer (``buffer``) and
+            the bytes of it in use (``used``), and an estimate of the
+            bytes taken by the word index (``index``).
+        """
+        index = sys.getsizeof(self._index) + sum(
+            sys.getsizeof(word) + sys.getsizeof(postings)
+            for word, postings in self._index.items())
+        return {
+            'buffer': sys.getsizeof(self._buffer),
+            'used': self._end - self._start,
+            'index': index,
+            'lines': self.lines,
+            'words': len(self._index),
+            'postings': self._postings,
+        }
+
+
+class Scrollback(object):
+    """
+    A `ChannelScrollback` of ``max_bytes`` for each channel on a
+    network, made when something is first said there.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._channels = {}
+
+    def add(self, channel, at, nickname, message):
+        key = irc_lower(channel)
+        scrollback = self._channels.get(key)
+        if scrollback is None:
+            scrollback = self._channels[key] = ChannelScrollback(
+                self.max_bytes)
+        scrollback.add(at, nickname, message)
+
+    def search(self, channel, query, since=None, limit=10):
+        scrollback = self._channels.get(irc_lower(channel))
+        if scrollback is None:
+            return []
+        return scrollback.search(query, since, limit)
+
+    def remove(self, channel):
+        self._channels.pop(irc_lower(channel), None)
+
+    def clear(self):
+        self._channels.clear()
+
+    def memory(self):
+        """
+        :returns: A dict mapping channel keys to `ChannelScrollback.memory`.
+        """
+        return dict(
+            (key, scrollback.memory())
+            for key, scrollback in self._channels.items())
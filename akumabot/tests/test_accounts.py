@@ -0,0 +1,77 @@
+import unittest
+
+from twisted.internet.task import Clock
+
+from akumabot.accounts import UNKNOWN, AccountTracker
+
+
+class AccountTrackerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.tracker = AccountTracker(ttl=60, timeout=10, clock=self.clock)
+        self.whoised = []
+
+    def lookup(self, nickname):
+        results = []
+        self.tracker.lookup(nickname, self.whoised.append).addCallback(
+            results.append)
+        return results
+
+    def test_notified_accounts_need_no_whois(self):
+        self.tracker.account_changed('Alice', 'alice_acct')
+        self.tracker.account_changed('bob', '*')
+        self.assertEqual(self.lookup('alice'), ['alice_acct'])
+        self.assertEqual(self.lookup('BOB'), [None])
+        self.assertEqual(self.whoised, [])
+
+    def test_whois_shared_and_cached(self):
+        first, second = self.lookup('alice'), self.lookup('Alice')
+        self.assertEqual(self.whoised, ['alice'])
+        self.assertEqual(first, [])
+        self.tracker.whois_account('alice', 'alice_acct')
+        self.tracker.end_of_whois('alice')
+        self.assertEqual(first + second, ['alice_acct', 'alice_acct'])
+        self.assertEqual(self.lookup('alice'), ['alice_acct'])
+        self.assertEqual(self.whoised, ['alice'])
+
+    def test_whois_without_account(self):
+        results = self.lookup('alice')
+        self.tracker.end_of_whois('alice')
+        self.assertEqual(results, [None])
+        self.assertIsNone(self.tracker.account('alice'))
+
+    def test_whois_answers_expire(self):
+        self.lookup('alice')
+        self.tracker.end_of_whois('alice')
+        self.clock.advance(61)
+        self.assertIs(self.tracker.account('alice'), UNKNOWN)
+
+    def test_whois_timeout_not_cached(self):
+        results = self.lookup('alice')
+        self.clock.advance(10)
+        self.assertEqual(results, [None])
+        self.assertIs(self.tracker.account('alice'), UNKNOWN)
+
+    def test_nick_change(self):
+        self.tracker.account_changed('alice', 'alice_acct')
+        self.lookup('bob')
+        self.tracker.whois_account('bob', 'bob_acct')
+        self.tracker.end_of_whois('bob')
+        self.tracker.renamed('alice', 'alice_away')
+        self.tracker.renamed('bob', 'bobby')
+        self.assertIs(self.tracker.account('alice'), UNKNOWN)
+        self.assertEqual(self.tracker.account('alice_away'), 'alice_acct')
+        # A WHOIS answer was about the nick, not the connection.
+        self.assertIs(self.tracker.account('bob'), UNKNOWN)
+        self.assertIs(self.tracker.account('bobby'), UNKNOWN)
+
+    def test_forget(self):
+        self.tracker.account_changed('alice', 'alice_acct')
+        self.tracker.forget('ALICE')
+        self.assertIs(self.tracker.account('alice'), UNKNOWN)
+
+    def test_clear_fails_pending_lookups(self):
+        results = self.lookup('alice')
+        self.tracker.clear()
+        self.assertEqual(results, [None])
+        self.assertEqual(self.tracker.stats()['pending'], 0)
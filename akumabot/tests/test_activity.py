@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from twisted.internet import defer, reactor
+from twisted.internet.task import Clock
+
+from akumabot.activity import ActivityStore, Sighting
+from akumabot.commands import parse_arguments, registry
+from akumabot.commands.seen import time_ago
+from akumabot.workers import LastSeen
+
+
+class FakeNetwork(object):
+    name = 'testnet'
+    nickname = 'mybot'
+
+
+class ActivityStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'activity.db')
+        self.clock = Clock()
+        self.clock.advance(1000)
+        self.writes = []
+        self.store = self.make_store()
+        self.network = FakeNetwork()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def make_store(self):
+        def run_in_thread(function, *args):
+            if function.__name__ == '_write':
+                self.writes.append(args)
+            return defer.maybeDeferred(function, *args)
+        store = ActivityStore(
+            self.path, max_pending=3, flush_interval=1.0, cache_size=2,
+            clock=self.clock, run_in_thread=run_in_thread)
+        store.open()
+        return store
+
+    def last_seen(self, nickname, store=None):
+        results = []
+        (store or self.store).last_seen('testnet', nickname).addCallback(
+            results.append)
+        return results[0]
+
+    def test_writes_grouped_by_size(self):
+        self.store.received_message(self.network, 'alice', '#chan', 'hi')
+        self.store.received_message(self.network, 'alice', '#chan', 'again')
+        self.assertEqual(self.writes, [])
+        self.store.user_joined(self.network, 'bob', '#chan')
+        [(seen, channels)] = self.writes
+        # Only alice's last message is written.
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(channels, [('testnet', '#chan', '#chan', 2, 1000)])
+
+    def test_writes_grouped_by_time(self):
+        self.store.user_quit(self.network, 'alice', 'bye')
+        self.clock.advance(0.5)
+        self.store.user_quit(self.network, 'bob', 'bye')
+        self.assertEqual(self.writes, [])
+        self.clock.advance(0.5)
+        self.assertEqual(len(self.writes), 1)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_last_seen_survives_restart(self):
+        self.store.received_message(self.network, 'Alice', '#chan', 'hi')
+        self.store.user_renamed(self.network, 'Alice', 'alice_away')
+        self.store.close()
+        store = self.make_store()
+        self.assertEqual(
+            self.last_seen('ALICE', store),
+            Sighting('Alice', None, 'renamed_to', 'alice_away', 1000))
+        self.assertEqual(
+            self.last_seen('alice_away', store),
+            Sighting('alice_away', None, 'renamed_from', 'Alice', 1000))
+        self.assertIsNone(self.last_seen('nobody', store))
+        store.close()
+
+    def test_non_ascii_survives_restart(self):
+        # UTF-8, then a Latin-1 byte.
+        message = 'caf\xc3\xa9 or caf\xe9'
+        self.store.received_message(self.network, 'alice', '#chan', message)
+        self.store.close()
+        store = self.make_store()
+        sighting = self.last_seen('alice', store)
+        self.assertEqual(
+            sighting, Sighting('alice', '#chan', 'message', message, 1000))
+        for value in (sighting.nickname, sighting.channel, sighting.event):
+            self.assertIsInstance(value, str)
+        # The worker side of LastSeen only takes str.
+        response = dict(
+            (name, getattr(sighting, name)) for name in Sighting.__slots__)
+        box = LastSeen.makeResponse(response, None)
+        self.assertEqual(LastSeen.parseResponse(box, None), response)
+        store.close()
+
+    def test_pending_sightings_read_before_database(self):
+        self.store.user_joined(self.network, 'alice', '#chan')
+        self.store.user_joined(self.network, 'bob', '#chan')
+        # The cache holds two nicks, so alice is only pending.
+        self.last_seen('bob')
+        self.last_seen('carol')
+        self.assertEqual(self.writes, [])
+        self.assertEqual(
+            self.last_seen('alice'),
+            Sighting('alice', '#chan', 'join', None, 1000))
+
+    def test_netsplit_and_channel_activity(self):
+        self.store.netsplit(
+            self.network, ('a.net', 'b.net'), [('alice', ['#chan'])])
+        self.assertEqual(
+            self.last_seen('alice'),
+            Sighting('alice', None, 'quit', 'a.net b.net', 1000))
+        self.store.received_message(self.network, 'bob', '#Chan', 'hi')
+        self.store.flush()
+        self.clock.advance(10)
+        self.store.received_message(self.network, 'bob', '#chan', 'hi')
+        results = []
+        self.store.channel_activity('testnet', '#CHAN').addCallback(
+            results.append)
+        self.store.channel_activity('testnet', '#other').addCallback(
+            results.append)
+        self.assertEqual(results, [(2, 1010), None])
+
+
+class SeenCommandTestCase(unittest.TestCase):
+    def run_seen(self, sighting, argstring, channel='#chan', members=()):
+        command = registry.get('seen').command
+        network = FakeNetwork()
+        network.last_seen = lambda nickname: defer.succeed(sighting)
+        network.is_member = lambda nickname, channel: (
+            (nickname, channel) in members)
+        results = []
+        d = defer.maybeDeferred(
+            command.run, network, channel, 'carol',
+            parse_arguments(command, argstring))
+        d.addCallback(results.append)
+        return results[0]
+
+    def test_seen(self):
+        self.assertEqual(
+            self.run_seen(Sighting(
+                'alice', '#chan', 'join', None, reactor.seconds() - 7300),
+                'alice'),
+            'alice was last seen 2 hours ago joining #chan')
+        self.assertEqual(
+            self.run_seen(None, 'bob'), "I haven't seen bob")
+        self.assertEqual(self.run_seen(None, 'Carol'), "That's you!")
+        self.assertEqual(self.run_seen(None, 'mybot'), "I'm right here.")
+
+    def test_other_channels_kept_from_outsiders(self):
+        sighting = Sighting(
+            'alice', '#secret', 'message', 'the plan', reactor.seconds())
+        self.assertEqual(
+            self.run_seen(sighting, 'alice', '#secret'),
+            'alice was last seen just now in #secret, saying: the plan')
+        for channel in ('#chan', None):
+            self.assertEqual(
+                self.run_seen(sighting, 'alice', channel),
+                'alice was last seen just now in a channel')
+        self.assertEqual(
+            self.run_seen(
+                sighting, 'alice', None, [('carol', '#secret')]),
+            'alice was last seen just now in #secret, saying: the plan')
+        self.assertEqual(
+            self.run_seen(Sighting(
+                'alice', '#secret', 'kick', 'spoilers', reactor.seconds()),
+                'alice'),
+            'alice was last seen just now being kicked from a channel')
+
+    def test_time_ago(self):
+        self.assertEqual(time_ago(0.5), 'just now')
+        self.assertEqual(time_ago(1), '1 second ago')
+        self.assertEqual(time_ago(7300), '2 hours ago')
+        self.assertEqual(time_ago(86400 * 3), '3 days ago')
@@ -0,0 +1,81 @@
+import unittest
+
+from akumabot.arguments import (
+    ArgumentError, Arguments, Channel, Duration, Int, Nick, Rest, Word,
+    tokenize
+)
+
+
+class TokenizeTestCase(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            tokenize(' one "two three"  \'four\' "five'),
+            [('one', 1), ('two three', 5), ('four', 18), ('"five', 25)])
+        self.assertEqual(tokenize('   '), [])
+
+
+class ArgumentsTestCase(unittest.TestCase):
+    def parser(self, *arguments):
+        return Arguments(*arguments).compile('usage')
+
+    def assertRejected(self, parse, argstring, message='usage'):
+        with self.assertRaises(ArgumentError) as caught:
+            parse(argstring)
+        self.assertEqual(str(caught.exception), message)
+
+    def test_count_checked(self):
+        parse = self.parser(Word('a'), Word('b'))
+        self.assertEqual(parse('x y'), ['x', 'y'])
+        self.assertRejected(parse, 'x')
+        self.assertRejected(parse, 'x y z')
+        self.assertEqual(self.parser()(''), [])
+        # Words after a command that takes none are ignored.
+        self.assertEqual(self.parser()('x y'), [])
+
+    def test_optional_in_the_middle(self):
+        parse = self.parser(
+            Word('time'), Word('fromzone', optional=True), Word('tozone'))
+        self.assertEqual(parse('now UTC'), ['now', None, 'UTC'])
+        self.assertEqual(parse('now EST UTC'), ['now', 'EST', 'UTC'])
+
+    def test_types(self):
+        parse = self.parser(Int('n', 1, 5), Channel('channel'), Nick('nick'))
+        self.assertEqual(parse('3 chan alice'), [3, '#chan', 'alice'])
+        self.assertEqual(parse('3 &chan a[b]'), [3, '&chan', 'a[b]'])
+        self.assertRejected(
+            parse, 'x #chan alice', "'x' isn't a whole number, for <n>")
+        self.assertRejected(
+            parse, '9 #chan alice', '<n> must be a whole number from 1 to 5')
+        self.assertRejected(
+            parse, '1 #a,#b alice', "'#a,#b' isn't a channel, for <channel>")
+        self.assertRejected(
+            parse, '1 #chan 9lives', "'9lives' isn't a nick, for <nick>")
+        self.assertRejected(
+            self.parser(Int('n', minimum=0)), '-1',
+            '<n> must be a whole number at least 0')
+
+    def test_rest_of_line(self):
+        parse = self.parser(
+            Nick('user'), Rest('reason', optional=True))
+        self.assertEqual(
+            parse('alice  being "rude" ok  '),
+            ['alice', 'being "rude" ok'])
+        self.assertEqual(parse('alice'), ['alice', None])
+        self.assertRejected(self.parser(Rest('text')), '  ')
+
+    def test_optional_before_rest_must_be_valid(self):
+        parse = self.parser(Duration('within', optional=True), Rest('words'))
+        self.assertEqual(parse('2h foo bar'), [7200, 'foo bar'])
+        self.assertEqual(parse('foo bar'), [None, 'foo bar'])
+        self.assertEqual(parse('30m'), [None, '30m'])
+
+    def test_invalid_schemas(self):
+        with self.assertRaises(ValueError):
+            Arguments(Rest('text'), Word('word'))
+        with self.assertRaises(ValueError):
+            Arguments(Word('word', optional=True), Rest('text'))
+
+    def test_usage(self):
+        self.assertEqual(
+            Arguments(Word('a'), Int('b', optional=True)).usage(),
+            '<a> [<b>]')
@@ -0,0 +1,338 @@
+import unittest
+from StringIO import StringIO
+
+from twisted.internet.task import Clock
+from twisted.words.protocols.irc import ServerSupportedFeatures
+
+from akumabot import metrics
+from akumabot.bot import AkumaBot
+from akumabot.commands import registry
+from akumabot.config import process_config_file
+from akumabot.outbound import OutboundScheduler
+
+
+_config = """
+[akumabot]
+nickname = mybot
+password = secret
+channels = #chan
+admins = me
+networks = first second
+
+[network second]
+nickname = otherbot
+"""
+
+
+class FakeProtocol(object):
+    hostmask = None
+
+    def __init__(self):
+        self.said = []
+        self.messaged = []
+        self.lines = []
+        self.left = []
+        self.supported = ServerSupportedFeatures()
+
+    def say(self, channel, message, length=None):
+        self.said.append((channel, message))
+
+    def msg(self, user, message, length=None):
+        self.messaged.append((user, message))
+
+    def sendLine(self, line):
+        self.lines.append(line)
+
+    def leave(self, channel, message=None):
+        self.left.append(channel)
+
+    def whois(self, nickname):
+        self.lines.append('WHOIS ' + nickname)
+
+
+class NetworkRoutingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bot = AkumaBot(process_config_file(StringIO(_config)))
+        self.protocols = {}
+        for name, network in self.bot.networks.items():
+            self.protocols[name] = FakeProtocol()
+            network.got_protocol(self.protocols[name])
+
+    def test_networks_share_command_processor(self):
+        self.assertEqual(list(self.bot.networks), ['first', 'second'])
+        self.assertEqual(
+            len(self.bot.events.listeners('received_message')), 1)
+
+    def test_channel_reply_goes_to_originating_network(self):
+        second = self.bot.networks['second']
+        second.received_message('me', '#chan', 'otherbot: help help')
+        self.assertEqual(self.protocols['first'].said, [])
+        [(channel, message)] = self.protocols['second'].said
+        self.assertEqual(channel, '#chan')
+        self.assertTrue(message.startswith('me, help'))
+
+    def test_private_reply_goes_to_originating_network(self):
+        self.bot.networks['first'].received_private_message('me', 'help')
+        self.assertEqual(len(self.protocols['first'].messaged), 1)
+        self.assertEqual(self.protocols['second'].messaged, [])
+
+    def test_trigger_uses_network_nickname(self):
+        self.bot.networks['first'].received_message(
+            'me', '#chan', 'otherbot: help')
+        self.assertEqual(self.protocols['first'].said, [])
+
+
+class ChannelTrackingTestCase(unittest.TestCase):
+    def setUp(self):
+        config = process_config_file(StringIO(_config.replace(
+            'channels = #chan', 'channels = #chan #other')))
+        self.bot = AkumaBot(config)
+        self.network = self.bot.networks['first']
+        self.network.clock = Clock()
+        self.protocol = self.connect()
+
+    def connect(self):
+        protocol = FakeProtocol()
+        self.network.got_protocol(protocol)
+        self.network.signed_on()
+        return protocol
+
+    def test_configured_channels_joined_in_one_line(self):
+        self.assertEqual(self.protocol.lines, ['JOIN #chan,#other'])
+
+    def test_server_targmax_respected(self):
+        protocol = FakeProtocol()
+        protocol.supported.parse(['TARGMAX=JOIN:1'])
+        self.network.got_protocol(protocol)
+        self.network.signed_on()
+        self.assertEqual(protocol.lines, ['JOIN #chan', 'JOIN #other'])
+
+    def test_runtime_channels_rejoined_on_reconnect(self):
+        self.network.join_channel('#new', 'key')
+        self.network.join_channel('extra')
+        self.assertEqual(
+            self.protocol.lines[1:], ['JOIN #new key', 'JOIN #extra'])
+        protocol = self.connect()
+        self.assertEqual(protocol.lines, ['JOIN #new,#chan,#other,#extra key'])
+
+    def test_left_and_kicked_channels_not_rejoined(self):
+        self.network.leave_channel('#chan')
+        self.assertEqual(self.protocol.left, ['#chan'])
+        self.network.kicked('#OTHER', 'op', 'bye')
+        protocol = self.connect()
+        self.assertEqual(protocol.lines, [])
+
+    def test_forced_join_tracked(self):
+        self.network.joined_channel('#forced')
+        self.assertIn('#forced', self.network.channels)
+        protocol = self.connect()
+        self.assertEqual(protocol.lines, ['JOIN #chan,#other,#forced'])
+
+    def test_already_joined_not_joined_again(self):
+        self.network.joined_channel('#chan')
+        self.network.join_channel('#CHAN')
+        self.network.join_channel('#other')
+        self.assertEqual(self.protocol.lines, ['JOIN #chan,#other'])
+
+    def test_join_channel_before_sign_on_waits(self):
+        protocol = FakeProtocol()
+        self.network.got_protocol(protocol)
+        self.network.join_channel('#early')
+        self.assertEqual(protocol.lines, [])
+        self.network.signed_on()
+        self.assertEqual(protocol.lines, ['JOIN #chan,#other,#early'])
+
+    def test_time_to_join_all_channels(self):
+        values = metrics.join_duration.values
+        before = values.get(('first',), [0])[-1]
+        self.network.clock.advance(2)
+        self.network.joined_channel('#chan')
+        self.assertEqual(values.get(('first',), [0])[-1], before)
+        self.network.join_failed('#other', 'Cannot join channel (+b)')
+        self.assertEqual(values[('first',)][-1], before + 2)
+        self.assertEqual(self.network.joined, set(['#chan']))
+
+
+class MembershipTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bot = AkumaBot(process_config_file(StringIO(_config)))
+        self.network = self.bot.networks['first']
+        self.network.got_protocol(FakeProtocol())
+        self.network.signed_on()
+        self.network.joined_channel('#chan')
+        self.network.names_reply('#chan', ['@mybot', 'alice', 'bob'])
+        self.network.end_of_names('#chan')
+
+    def test_callbacks_keep_index_current(self):
+        self.network.user_joined('carol', '#chan')
+        self.network.user_left('alice', '#chan')
+        self.network.user_kicked('bob', '#chan', 'mybot', 'bye')
+        self.network.user_renamed('carol', 'caroline')
+        self.assertEqual(
+            sorted(self.network.members.members('#chan')),
+            ['caroline', 'mybot'])
+        self.network.user_quit('caroline', 'leaving')
+        self.assertFalse(self.network.is_member('caroline', '#chan'))
+
+    def test_names_for_other_channels_ignored(self):
+        self.network.names_reply('#elsewhere', ['dave'])
+        self.network.end_of_names('#elsewhere')
+        self.assertEqual(self.network.members.channels('dave'), [])
+
+    def test_kicked_forgets_channel(self):
+        self.network.kicked('#chan', 'op', 'bye')
+        self.assertFalse(self.network.is_member('alice', '#chan'))
+
+    def test_scrollback_kept_until_leaving(self):
+        self.network.received_message('alice', '#chan', 'hello world')
+        [(_, nickname, message)] = self.network.search_scrollback(
+            '#chan', 'WORLD')
+        self.assertEqual((nickname, message), ('alice', 'hello world'))
+        self.network.left_channel('#chan')
+        self.assertEqual(self.network.search_scrollback('#chan', 'world'), [])
+
+    def test_netsplit_and_netjoin(self):
+        events = []
+        self.bot.add_listener('netsplit', lambda *args: events.append(args))
+        self.network.netsplit(('a.b', 'c.d'), ['alice', 'nobody'])
+        self.assertEqual(events, [
+            (self.network, ('a.b', 'c.d'),
+             [('alice', ['#chan']), ('nobody', [])]),
+        ])
+        self.assertFalse(self.network.is_member('alice', '#chan'))
+        self.network.netjoin(('a.b', 'c.d'), [('alice', '#chan')])
+        self.assertTrue(self.network.is_member('alice', '#chan'))
+
+    def test_kick_checks_target(self):
+        kick = registry.get('kick').command
+        results = []
+        d = kick.run(self.network, None, 'me', ['dave', '#chan', None])
+        d.addCallback(results.append)
+        self.assertEqual(results, ["dave isn't in #chan"])
+
+        kicked = []
+        kick.do_kick = lambda *args: kicked.append(args)
+        try:
+            kick.run(self.network, None, 'me', ['alice', '#chan', 'why'])
+        finally:
+            del kick.do_kick
+        self.assertEqual(kicked, [(self.network, 'alice', '#chan', 'why')])
+
+
+class AdminAccountTestCase(unittest.TestCase):
+    def setUp(self):
+        config = process_config_file(StringIO(_config.replace(
+            'admins = me', 'admins = Me_Acct\nadmin_accounts = true')))
+        self.bot = AkumaBot(config)
+        self.bot.command_processor.rate_limiter = None
+        self.network = self.bot.networks['first']
+        self.protocol = FakeProtocol()
+        self.network.got_protocol(self.protocol)
+        self.network.signed_on()
+        del self.protocol.lines[:]
+
+    def test_nickname_alone_is_not_enough(self):
+        self.assertIsNone(self.network.is_admin('Me_Acct'))
+        self.network.account_changed('me', 'someone_else')
+        self.network.received_private_message('me', 'join #secret')
+        self.assertEqual(self.protocol.lines, [])
+
+    def test_known_account_needs_no_whois(self):
+        self.network.user_joined('me', '#chan')
+        self.network.account_changed('me', 'me_acct')
+        self.network.received_private_message('me', 'join #secret')
+        self.assertEqual(self.protocol.lines, ['JOIN #secret'])
+
+    def test_unknown_account_looked_up_once(self):
+        self.network.received_private_message('me', 'join #one')
+        self.network.received_private_message('me', 'join #two')
+        self.assertEqual(self.protocol.lines, ['WHOIS me'])
+        self.network.whois_account('me', 'me_acct')
+        self.network.end_of_whois('me')
+        self.assertEqual(
+            self.protocol.lines, ['WHOIS me', 'JOIN #one', 'JOIN #two'])
+        self.network.received_private_message('me', 'join #three')
+        self.assertEqual(self.protocol.lines[-1], 'JOIN #three')
+
+    def test_everyday_commands_do_not_whois(self):
+        self.network.received_private_message('me', 'ping')
+        self.assertEqual(self.protocol.lines, [])
+        self.assertEqual(len(self.protocol.messaged), 1)
+
+    def test_account_forgotten_when_no_channel_shared(self):
+        self.network.user_joined('me', '#chan')
+        self.network.account_changed('me', 'me_acct')
+        self.assertTrue(self.network.is_admin('me'))
+        self.network.user_left('me', '#chan')
+        self.assertIsNone(self.network.is_admin('me'))
+
+    def test_account_forgotten_on_quit(self):
+        self.network.user_joined('me', '#chan')
+        self.network.account_changed('me', 'me_acct')
+        self.network.user_quit('me', 'bye')
+        self.assertIsNone(self.network.is_admin('me'))
+
+
+class CountdownCommand(object):
+    name = 'countdown'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    usage = '{0}'
+    cache = None
+
+    def __init__(self):
+        self.produced = 0
+
+    def run(self, bot, channel, nickname, command_args):
+        for n in range(int(command_args[0]), 0, -1):
+            self.produced += 1
+            yield str(n)
+
+
+class LongReplyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bot = AkumaBot(process_config_file(StringIO(_config)))
+        self.bot.command_processor.rate_limiter = None
+        self.bot.command_processor.commands.register_class(CountdownCommand)
+        self.network = self.bot.networks['first']
+        self.protocol = FakeProtocol()
+        self.network.got_protocol(self.protocol)
+        self.network.outbound = OutboundScheduler(burst=20)
+
+    def test_lines_fit_with_real_hostmask(self):
+        self.protocol.hostmask = 'mybot!~bot@example.com'
+        message = u'\xe9t\xe9 ' * 200
+        self.network.send_channel_message(message, '#chan', 'me')
+        said = self.protocol.said
+        self.assertEqual(len(said), 3)
+        self.assertTrue(said[0][1].startswith('me, '))
+        for channel, line in said:
+            self.assertLessEqual(
+                len(':mybot!~bot@example.com PRIVMSG #chan :' + line), 510)
+            line.decode('utf-8')
+        self.assertEqual(
+            ' '.join(line for _, line in said)[4:],
+            message.encode('utf-8').strip())
+        # Lines are cut shorter for a hostmask that isn't known yet.
+        self.protocol.hostmask = None
+        self.assertLess(
+            self.network.message_budget('#chan'),
+            510 - len(':mybot!~bot@example.com PRIVMSG #chan :'))
+
+    def test_more(self):
+        command = self.bot.command_processor.commands.get('countdown')
+        self.network.received_private_message('me', 'countdown 100')
+        self.assertEqual(
+            self.protocol.messaged,
+            [('me', '100'), ('me', '99'), ('me', '98 (more)')])
+        self.assertEqual(command.produced, 4)
+        del self.protocol.messaged[:]
+        self.network.received_message('me', '#chan', 'mybot: more')
+        self.assertEqual(
+            self.protocol.said, [('#chan', 'me, There is nothing more to show')])
+        self.network.received_private_message('Me', 'more')
+        self.assertEqual(
+            self.protocol.messaged,
+            [('Me', '97'), ('Me', '96'), ('Me', '95 (more)')])
+        self.assertEqual(command.produced, 7)
@@ -0,0 +1,55 @@
+import unittest
+
+from twisted.internet.task import Clock
+
+from akumabot.cache import LRUCache, TTLCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache.get('a')
+        cache['c'] = 3
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_rejects_empty_cache(self):
+        with self.assertRaises(ValueError):
+            LRUCache(0)
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def test_entries_expire(self):
+        clock = Clock()
+        cache = TTLCache(2, 10, clock)
+        cache['a'] = 1
+        clock.advance(9)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIn('a', cache)
+        clock.advance(1)
+        self.assertNotIn('a', cache)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_setting_again_refreshes(self):
+        clock = Clock()
+        cache = TTLCache(2, 10, clock)
+        cache['a'] = 1
+        clock.advance(5)
+        cache['a'] = 2
+        clock.advance(6)
+        self.assertEqual(cache.get('a'), 2)
@@ -0,0 +1,112 @@
+import json
+import unittest
+
+from twisted.internet import error, task
+from twisted.python.failure import Failure
+
+from akumabot.calculate import CalculatorParseError
+from akumabot.calcpool import (
+    CalculatorPool, CalculatorTooExpensive, CalculatorBusy
+)
+
+
+class FakeProcessTransport(object):
+    def __init__(self):
+        self.written = []
+        self.signals = []
+
+    def write(self, data):
+        self.written.append(json.loads(data))
+
+    def signalProcess(self, signal):
+        self.signals.append(signal)
+
+
+class FakeReactor(task.Clock):
+    def __init__(self):
+        task.Clock.__init__(self)
+        self.processes = []
+
+    def spawnProcess(self, process_protocol, executable, args, env, **kw):
+        transport = FakeProcessTransport()
+        process_protocol.makeConnection(transport)
+        self.processes.append(process_protocol)
+        return transport
+
+    def addSystemEventTrigger(self, phase, event, callable):
+        return object()
+
+
+class CalculatorPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.pool = CalculatorPool(
+            self.reactor, size=1, queue_limit=1, timeout=2.0)
+        self.results = []
+
+    def calculate(self, expression):
+        d = self.pool.calculate(expression)
+        d.addBoth(self.results.append)
+
+    def reply(self, worker, **reply):
+        worker.outReceived(json.dumps(reply) + '\n')
+
+    def test_result_is_delivered(self):
+        self.calculate('1 + 2')
+        [worker] = self.reactor.processes
+        self.assertEqual(
+            worker.transport.written, [{'expression': '1 + 2'}])
+        self.reply(worker, result=3.0)
+        self.assertEqual(self.results, [3.0])
+
+    def test_worker_errors_are_raised(self):
+        self.calculate('bogus')
+        [worker] = self.reactor.processes
+        self.reply(worker, error='parse')
+        [failure] = self.results
+        self.assertTrue(failure.check(CalculatorParseError))
+
+    def test_undecodable_input_rejected_up_front(self):
+        self.calculate('1 + \xe9')
+        [failure] = self.results
+        self.assertTrue(failure.check(CalculatorParseError))
+        self.assertEqual(self.reactor.processes, [])
+        self.calculate('1')
+        [worker] = self.reactor.processes
+        self.assertEqual(worker.transport.written, [{'expression': '1'}])
+
+    def test_jobs_queue_for_a_busy_worker(self):
+        self.calculate('1')
+        self.calculate('2')
+        [worker] = self.reactor.processes
+        self.reply(worker, result=1.0)
+        self.assertEqual(len(worker.transport.written), 2)
+        self.reply(worker, result=2.0)
+        self.assertEqual(self.results, [1.0, 2.0])
+
+    def test_full_queue_sheds_load(self):
+        self.calculate('1')
+        self.calculate('2')
+        self.calculate('3')
+        [failure] = self.results
+        self.assertTrue(failure.check(CalculatorBusy))
+
+    def test_deadline_kills_worker(self):
+        self.calculate('1')
+        [worker] = self.reactor.processes
+        self.reactor.advance(2.0)
+        [failure] = self.results
+        self.assertTrue(failure.check(CalculatorTooExpensive))
+        self.assertEqual(worker.transport.signals, ['KILL'])
+
+        worker.processEnded(Failure(error.ProcessTerminated(signal=9)))
+        self.calculate('2')
+        self.assertEqual(len(self.reactor.processes), 2)
+
+    def test_worker_dying_mid_job_fails_job(self):
+        self.calculate('1')
+        [worker] = self.reactor.processes
+        worker.processEnded(Failure(error.ProcessTerminated(signal=24)))
+        [failure] = self.results
+        self.assertTrue(failure.check(CalculatorTooExpensive))
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
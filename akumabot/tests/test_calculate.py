@@ -3,7 +3,8 @@ import unittest
 from ometa.runtime import ParseError
 
 from akumabot.calculate import (
-    grammar, calculate_expression, CalculatorParseError
+    grammar, calculate_expression, compile_expression, cache_stats,
+    clear_caches, CalculatorParseError
 )
 
 
@@ -83,13 +84,15 @@ class GrammarTestCase(unittest.TestCase):
 
 
 class CalculateExpressionTestCase(unittest.TestCase):
+    engine = 'parsley'
+
     def assertExpressionEquals(self, expression, expected):
-        result = calculate_expression(expression)
+        result = calculate_expression(expression, self.engine)
         self.assertEqual(result, expected)
 
     def test_failure_raises_correct_exception(self):
         with self.assertRaises(CalculatorParseError):
-            calculate_expression('bogus crap')
+            calculate_expression('bogus crap', self.engine)
 
     def test_basic_addition(self):
         self.assertExpressionEquals('1 + 2', 3)
@@ -108,3 +111,35 @@ class CalculateExpressionTestCase(unittest.TestCase):
     def test_mul_before_add(self):
         self.assertExpressionEquals('5 * 2 + 1', 11)
         self.assertExpressionEquals('1 + 5 * 2', 11)
+
+
+class ExpressionCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def tearDown(self):
+        clear_caches()
+
+    def test_compiled_expression_evaluates(self):
+        compiled = compile_expression('(1 + 2) * 3')
+        self.assertEqual(compiled(), 9)
+        self.assertEqual(compiled(), 9)
+
+    def test_compile_failure_raises_correct_exception(self):
+        with self.assertRaises(CalculatorParseError):
+            compile_expression('bogus crap')
+
+    def test_repeated_expression_hits_result_cache(self):
+        calculate_expression('1 + 2')
+        calculate_expression('1 + 2')
+        calculate_expression('2 + 2')
+        stats = cache_stats()
+        self.assertEqual(stats['result']['hits'], 1)
+        self.assertEqual(stats['result']['misses'], 2)
+        self.assertEqual(stats['compiled']['misses'], 2)
+
+    def test_failures_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(CalculatorParseError):
+                calculate_expression('1 +')
+        self.assertEqual(cache_stats()['result']['size'], 0)
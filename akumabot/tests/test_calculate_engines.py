@@ -0,0 +1,108 @@
+import math
+import random
+import unittest
+
+from akumabot.calculate import compile_expression, CalculatorParseError
+from akumabot.tests import test_calculate
+
+
+class PrattCalculateExpressionTestCase(
+        test_calculate.CalculateExpressionTestCase):
+    engine = 'pratt'
+
+
+def _random_number(rand):
+    number = str(rand.randint(0, 10 ** rand.randint(1, 6)))
+    if rand.random() < 0.3:
+        number = '-' + number
+    if rand.random() < 0.4:
+        number += '.' + str(rand.randint(0, 999))
+    if rand.random() < 0.2:
+        number += rand.choice('eE') + rand.choice(['', '+', '-'])
+        number += str(rand.randint(0, 20))
+    return number
+
+
+def _random_expression(rand, depth=0):
+    if depth > 3 or rand.random() < 0.3:
+        return _random_number(rand)
+    left = _random_expression(rand, depth + 1)
+    right = _random_expression(rand, depth + 1)
+    spaces = ' ' * rand.randint(0, 2), ' ' * rand.randint(0, 2)
+    expression = '{0}{1}{2}{3}{4}'.format(
+        left, spaces[0], rand.choice('+-*/'), spaces[1], right)
+    if rand.random() < 0.3:
+        inner = ' ' * rand.randint(0, 1)
+        expression = '({0}{1}{0})'.format(inner, expression)
+    return expression
+
+
+def _mangle(rand, expression):
+    chars = list(expression)
+    position = rand.randint(0, len(chars))
+    action = rand.choice(['insert', 'delete', 'replace'])
+    if action == 'insert' or not chars:
+        chars.insert(position, rand.choice('0123456789+-*/(). eE'))
+    elif action == 'delete':
+        del chars[min(position, len(chars) - 1)]
+    else:
+        chars[min(position, len(chars) - 1)] = rand.choice('(). xe+')
+    return ''.join(chars)
+
+
+def _outcome(expression, engine):
+    try:
+        compiled = compile_expression(expression, engine)
+    except CalculatorParseError:
+        return 'parse error'
+    try:
+        result = compiled()
+    except ZeroDivisionError:
+        return 'division by zero'
+    if math.isnan(result):
+        return 'nan'
+    return result
+
+
+class EngineDifferentialTestCase(unittest.TestCase):
+    """
+    Run the same input through every engine and require identical
+    results, including which inputs are rejected.
+    """
+    def assertEnginesAgree(self, expression):
+        parsley = _outcome(expression, 'parsley')
+        pratt = _outcome(expression, 'pratt')
+        if parsley != pratt:
+            raise AssertionError(
+                'Engines disagree on {0!r}: parsley gave {1!r}, '
+                'pratt gave {2!r}'.format(expression, parsley, pratt))
+
+    def test_grammar_test_case_numbers(self):
+        grammar_cases = test_calculate.GrammarTestCase
+        numbers = (
+            grammar_cases._integers +
+            grammar_cases._floats +
+            grammar_cases._scinotes
+        )
+        for number in numbers:
+            self.assertEnginesAgree(number)
+        for bogus in ('abcdef', '.2', '.', '1.', 'bogus crap'):
+            self.assertEnginesAgree(bogus)
+
+    def test_handwritten_cases(self):
+        expressions = (
+            '1 + 2', '3 - 2', '1 - 2', '2 * 3', '2 / 1', '5 / 2',
+            '5 * 2 + 1', '1 + 5 * 2', '(23)', '(1 + 2)', '( 1 )',
+            '8 / 4 / 2', '2 - 3 - 4', '1--2', '1 - -2', '1 - - 2',
+            '-(1)', ' 1', '1 ', '()', '(1', '1)', '1e', '1e+', '1.e3',
+            '1e3.5', '2(3)', '1/0', '1e400 * 0', '', '1 +', '+1',
+        )
+        for expression in expressions:
+            self.assertEnginesAgree(expression)
+
+    def test_random_expressions(self):
+        rand = random.Random(2015)
+        for _ in range(500):
+            expression = _random_expression(rand)
+            self.assertEnginesAgree(expression)
+            self.assertEnginesAgree(_mangle(rand, expression))
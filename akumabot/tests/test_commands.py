@@ -1,6 +1,10 @@
 import unittest
 
-from akumabot.commands import CommandProcessor
+from akumabot.arguments import Arguments, Int, Rest
+from akumabot.commands import (
+    CachePolicy, CommandProcessor, CommandRegistry, LazyCommand,
+    TransientReply, registry
+)
 
 
 class FakeBot(object):
@@ -54,3 +58,329 @@ class DetectCommandTestCase(unittest.TestCase):
         command_string = 'commandname'
         self.assertMessageContainsCommand(
             nickname, trigger, message, command_string)
+
+
+class FakeNetwork(object):
+    name = 'testnet'
+
+    def __init__(self, nickname):
+        self.nickname = nickname
+
+
+class RecordingCommandProcessor(CommandProcessor):
+    def __init__(self, bot):
+        CommandProcessor.__init__(self, bot)
+        self.commands_run = []
+
+    def run_command(self, network, command_name, channel, nickname,
+                    argstring):
+        self.commands_run.append((network.name, command_name, argstring))
+
+
+class ProcessMessageTestCase(unittest.TestCase):
+    def setUp(self):
+        conf = {
+            'akumabot.admins': set(),
+            'akumabot.nickname': 'testybot',
+            'commands.trigger': '!',
+        }
+        self.cmdproc = RecordingCommandProcessor(FakeBot(conf))
+        self.network = FakeNetwork('testybot')
+
+    def process(self, message):
+        self.cmdproc.process_message(self.network, 'nick', '#chan', message)
+
+    def test_chatter_is_ignored(self):
+        for message in ('hello there', 'testybot: ping', '', 'x!ping'):
+            self.process(message)
+        self.assertEqual(self.cmdproc.commands_run, [])
+
+    def test_commands_are_run(self):
+        self.process('!calc 1 + 2')
+        self.process('!ping')
+        self.assertEqual(self.cmdproc.commands_run, [
+            ('testnet', 'calc', '1 + 2'),
+            ('testnet', 'ping', ''),
+        ])
+
+    def test_nick_trigger_follows_network_nickname(self):
+        self.cmdproc.bot.config['commands.trigger'] = '<nick>'
+        self.cmdproc._triggers.clear()
+        self.process('testybot: ping')
+        self.network.nickname = 'otherbot'
+        self.process('testybot: help')
+        self.process('otherbot: help')
+        self.assertEqual(self.cmdproc.commands_run, [
+            ('testnet', 'ping', ''),
+            ('testnet', 'help', ''),
+        ])
+
+
+class CountingCommand(object):
+    name = 'count'
+    admin_only = False
+    pm_only = False
+    channel_only = False
+    usage = '{0}'
+    cache = CachePolicy(ttl=60, maxsize=10)
+
+    def __init__(self):
+        self.runs = 0
+        self.reply = 'reply'
+
+    def run(self, bot, channel, nickname, command_args):
+        self.runs += 1
+        return self.reply
+
+
+class RepliesNetwork(FakeNetwork):
+    admins = set(['admin'])
+
+    def __init__(self, nickname):
+        FakeNetwork.__init__(self, nickname)
+        self.replies = []
+
+    def send_private_message(self, message, nickname, on_sent=None):
+        self.replies.append(message)
+
+    def message_budget(self, target):
+        return 400
+
+    def is_admin(self, nickname):
+        return nickname in self.admins
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        conf = {
+            'akumabot.admins': set(),
+            'akumabot.nickname': 'testybot',
+            'commands.trigger': '!',
+        }
+        self.cmdproc = CommandProcessor(FakeBot(conf))
+        self.cmdproc.commands = CommandRegistry()
+        self.cmdproc.commands.register_class(CountingCommand)
+        self.command = self.cmdproc.commands.get('count')
+        self.network = RepliesNetwork('testybot')
+
+    def run_command(self, argstring, nickname='nick'):
+        self.cmdproc.run_command(
+            self.network, 'count', None, nickname, argstring)
+
+    def test_repeated_command_is_cached(self):
+        self.run_command('a b')
+        self.run_command('a  b')
+        self.run_command('a c')
+        self.assertEqual(self.command.runs, 2)
+        self.assertEqual(self.network.replies, ['reply'] * 3)
+        stats = self.cmdproc.cache_stats()['count']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_admins_cached_separately(self):
+        self.run_command('a')
+        self.run_command('a', 'admin')
+        self.assertEqual(self.command.runs, 2)
+
+    def test_transient_replies_not_cached(self):
+        self.command.reply = TransientReply('busy')
+        self.run_command('a')
+        self.run_command('a')
+        self.assertEqual(self.command.runs, 2)
+
+    def test_key_can_refuse_caching(self):
+        self.command.cache = CachePolicy(60, key=lambda args: None)
+        self.run_command('a')
+        self.run_command('a')
+        self.assertEqual(self.command.runs, 2)
+
+    def test_lazy_replies_not_cached(self):
+        self.command.reply = iter(['one', 'two'])
+        self.run_command('a')
+        self.run_command('a')
+        self.assertEqual(self.command.runs, 2)
+        self.assertEqual(self.network.replies, ['one\ntwo'])
+
+    def test_failing_lazy_reply(self):
+        def lines():
+            yield 'one'
+            raise ValueError('oops')
+        self.command.reply = lines()
+        self.run_command('a')
+        self.assertEqual(
+            self.network.replies, ['Something terrible has happened!'])
+
+    def test_calc_key_keeps_whitespace(self):
+        self.network.config = {
+            'commands.calculator_engine': 'parsley',
+            'calculator.workers': 0,
+        }
+        self.cmdproc.commands = registry
+        for argstring in ('1 2', '12', '1  2', '1 + 2', '1\t+ 2'):
+            self.cmdproc.run_command(
+                self.network, 'calc', None, 'nick', argstring)
+        self.assertEqual(self.network.replies, [
+            "I didn't understand 1 2", 'Result: 12',
+            "I didn't understand 1  2", 'Result: 3',
+            "I didn't understand 1\t+ 2",
+        ])
+
+    def test_side_effect_commands_not_cached(self):
+        for name in ('join', 'kick', 'quit', 'leave', 'pmme'):
+            self.assertIsNone(registry.get(name).cache)
+
+
+class RepeatCommand(CountingCommand):
+    name = 'repeat'
+    arguments = Arguments(Int('times', 1, 3), Rest('text', optional=True))
+    description = 'Say {text} again'
+    cache = None
+
+    def run(self, bot, channel, nickname, command_args):
+        times, text = command_args
+        return ' '.join([text or 'nothing'] * times)
+
+
+class ArgumentSchemaTestCase(unittest.TestCase):
+    def setUp(self):
+        conf = {
+            'akumabot.admins': set(),
+            'akumabot.nickname': 'testybot',
+            'commands.trigger': '!',
+        }
+        self.cmdproc = CommandProcessor(FakeBot(conf))
+        self.cmdproc.commands = CommandRegistry()
+        self.cmdproc.commands.register_class(CountingCommand)
+        self.cmdproc.commands.register_class(RepeatCommand)
+        self.network = RepliesNetwork('testybot')
+
+    def run_command(self, command, argstring):
+        self.cmdproc.run_command(
+            self.network, command, None, 'nick', argstring)
+
+    def test_usage_generated(self):
+        self.assertEqual(
+            self.cmdproc.commands.get('repeat').usage.format('repeat'),
+            'repeat <times> [<text>]   Say {text} again')
+        self.assertEqual(
+            registry.get('kick').usage.format('kick'),
+            'kick <user> <channel> [<reason>]   '
+            'Kick a user from this channel')
+        self.assertEqual(
+            registry.get('ping').usage.format('ping'),
+            "ping   Verify I'm still attentive")
+
+    def test_arguments_parsed(self):
+        self.run_command('repeat', '2 "hi there" you')
+        self.run_command('repeat', '1')
+        self.assertEqual(
+            self.network.replies,
+            ['"hi there" you "hi there" you', 'nothing'])
+
+    def test_invalid_arguments_rejected(self):
+        command = self.cmdproc.commands.get('repeat')
+        command.run = None
+        self.run_command('repeat', '')
+        self.run_command('repeat', 'lots')
+        self.run_command('repeat', '4 times')
+        self.assertEqual(self.network.replies, [
+            'repeat <times> [<text>]   Say {text} again',
+            "'lots' isn't a whole number, for <times>",
+            '<times> must be a whole number from 1 to 3',
+        ])
+
+    def test_unbalanced_quote_without_schema(self):
+        self.run_command('count', "it's")
+        self.assertEqual(self.network.replies, ['count'])
+        self.assertEqual(self.cmdproc.commands.get('count').runs, 0)
+
+
+class LazyRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = CommandRegistry()
+        self.registry.register_lazy(
+            'count', 'akumabot.tests.test_commands:CountingCommand', False)
+        self.registry.register_lazy(
+            'other', 'akumabot.tests.test_commands:CountingCommand')
+
+    def test_metadata_does_not_load(self):
+        command = self.registry.get('count')
+        self.assertEqual(command.name, 'count')
+        self.assertFalse(command.admin_only)
+        self.assertIsNone(command._command)
+        self.assertEqual(command.usage, '{0}')
+        self.assertIsInstance(command._command, CountingCommand)
+
+    def test_name_must_match(self):
+        with self.assertRaises(ValueError):
+            self.registry.get('other').run
+
+    def test_select(self):
+        self.assertEqual(
+            [c.name for c in self.registry.select(
+                enabled=set(['count'])).get_all_commands()],
+            ['count'])
+        selected = self.registry.select(disabled=set(['count']))
+        self.assertIsNone(selected.get('count'))
+        self.assertIsNotNone(selected.get('other'))
+
+    def test_builtin_commands_are_lazy(self):
+        for name in ('quit', 'join', 'kick', 'ping', 'help', 'calc', 'time'):
+            self.assertIsInstance(registry.get(name), LazyCommand)
+
+
+class ResolutionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = CommandRegistry()
+        for name, aliases in (('help', ('commands',)), ('hello', ()),
+                              ('calc', ('math',)), ('kick', ()),
+                              ('ma', ())):
+            self.registry.register_lazy(
+                name, 'akumabot.commands.basic:HelpCommand', name == 'kick',
+                aliases=aliases)
+
+    def resolved(self, name):
+        command = self.registry.resolve(name)
+        return command and command.name
+
+    def test_names_aliases_and_prefixes(self):
+        self.assertEqual(self.resolved('calc'), 'calc')
+        self.assertEqual(self.resolved('MATH'), 'calc')
+        self.assertEqual(self.resolved('ca'), 'calc')
+        self.assertEqual(self.resolved('mat'), 'calc')
+        self.assertEqual(self.resolved('comm'), 'help')
+        self.assertEqual(self.resolved('hell'), 'hello')
+        # A name beats an abbreviation of an alias.
+        self.assertEqual(self.resolved('ma'), 'ma')
+        for name in ('he', 'hel', 'k', 'nothing', 'calcs'):
+            self.assertIsNone(self.resolved(name), name)
+
+    def test_index_rebuilt_on_register(self):
+        self.assertEqual(self.resolved('ki'), 'kick')
+        self.registry.register_lazy('kill', 'x:Y')
+        self.assertIsNone(self.resolved('ki'))
+        self.assertEqual(self.resolved('kil'), 'kill')
+
+    def test_suggest(self):
+        self.assertEqual(self.registry.suggest('hel'), ['hello', 'help'])
+        self.assertEqual(self.registry.suggest('hepl'), ['help'])
+        self.assertEqual(self.registry.suggest('maht'), ['calc'])
+        self.assertEqual(self.registry.suggest('xyzzy'), [])
+
+    def test_select_keeps_aliases(self):
+        selected = self.registry.select(enabled=set(['calc']))
+        self.assertEqual(selected.resolve('math').name, 'calc')
+        self.assertEqual(selected.resolve('ma').name, 'calc')
+
+    def test_typo_gets_suggestion(self):
+        conf = {
+            'akumabot.admins': set(),
+            'akumabot.nickname': 'testybot',
+            'commands.trigger': '!',
+        }
+        cmdproc = CommandProcessor(FakeBot(conf))
+        cmdproc.commands = self.registry
+        network = RepliesNetwork('testybot')
+        for name in ('hepl', 'kikc', 'xyzzy'):
+            cmdproc.run_command(network, name, None, 'nick', '')
+        self.assertEqual(
+            network.replies, ["Unknown command 'hepl', did you mean help?"])
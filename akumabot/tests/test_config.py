@@ -0,0 +1,71 @@
+import unittest
+from StringIO import StringIO
+
+from akumabot.config import process_config_file
+
+
+_base_config = """
+[akumabot]
+nickname = mybot
+password = secret
+channels = #one #two
+admins = me
+"""
+
+
+class NetworkConfigTestCase(unittest.TestCase):
+    def test_default_network(self):
+        config = process_config_file(StringIO(_base_config))
+        [network] = config['networks']
+        self.assertEqual(network['network.name'], 'default')
+        self.assertEqual(network['akumabot.nickname'], 'mybot')
+        self.assertEqual(
+            network['akumabot.endpoint'],
+            'ssl:host=irc.freenode.net:port=6697')
+
+    def test_network_sections_override_defaults(self):
+        config = process_config_file(StringIO(_base_config + """
+networks = first second
+
+[network second]
+endpoint = tcp:host=localhost:port=6667
+channels = #three
+admins = you
+"""))
+        first, second = config['networks']
+        self.assertEqual(first['network.name'], 'first')
+        self.assertEqual(first['akumabot.channels'], ['#one', '#two'])
+        self.assertEqual(second['network.name'], 'second')
+        self.assertEqual(second['akumabot.channels'], ['#three'])
+        self.assertEqual(second['akumabot.admins'], set(['you']))
+        self.assertEqual(second['akumabot.nickname'], 'mybot')
+        self.assertEqual(
+            second['akumabot.endpoint'], 'tcp:host=localhost:port=6667')
+
+
+class FloatMapTestCase(unittest.TestCase):
+    def test_logging_rates(self):
+        config = process_config_file(StringIO(_base_config + """
+[logging]
+sample = privmsg:0.01 user_joined:0.5
+"""))
+        self.assertEqual(
+            config['logging.sample'], {'privmsg': 0.01, 'user_joined': 0.5})
+        self.assertEqual(config['logging.rate_limit'], {})
+
+    def test_missing_key(self):
+        self.assertRaises(ValueError, process_config_file, StringIO(
+            _base_config + "[logging]\nsample = 0.5\n"))
+
+
+class CalculatorEngineTestCase(unittest.TestCase):
+    def test_known_engine(self):
+        config = process_config_file(StringIO(
+            _base_config + "[commands]\ncalculator_engine = pratt\n"))
+        self.assertEqual(config['commands.calculator_engine'], 'pratt')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError) as caught:
+            process_config_file(StringIO(
+                _base_config + "[commands]\ncalculator_engine = prat\n"))
+        self.assertIn("'prat'", str(caught.exception))
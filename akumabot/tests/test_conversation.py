@@ -0,0 +1,63 @@
+import unittest
+
+from twisted.internet import task
+
+from akumabot.conversation import ConversationMap
+
+
+class ConversationMapTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.conversations = ConversationMap(
+            None, max_age=60, max_conversations=3, max_messages=2,
+            clock=self.clock)
+
+    def tearDown(self):
+        self.conversations.stop()
+
+    def test_keys_are_created_with_lowercase_nicks(self):
+        conversation = self.conversations['#chan', 'SomeNick']
+        self.assertIs(self.conversations['#chan', 'somenick'], conversation)
+        self.assertEqual(list(self.conversations), [('#chan', 'somenick')])
+
+    def test_contains_does_not_create(self):
+        self.assertNotIn(('#chan', 'nick'), self.conversations)
+        self.assertEqual(len(self.conversations), 0)
+
+    def test_messages_are_capped(self):
+        conversation = self.conversations['#chan', 'nick']
+        for message in ('one', 'two', 'three'):
+            conversation.received(message)
+        self.assertEqual(conversation.pop_received(), 'two')
+        self.assertEqual(conversation.pop_received(), 'three')
+        self.assertIsNone(conversation.pop_received())
+
+    def test_least_recently_used_is_dropped(self):
+        for nick in ('a', 'b', 'c'):
+            self.conversations['#chan', nick]
+        self.conversations['#chan', 'a']
+        self.conversations['#chan', 'd']
+        self.assertEqual(
+            sorted(nick for _, nick in self.conversations),
+            ['a', 'c', 'd'])
+
+    def test_inactive_conversations_expire_on_timer(self):
+        self.conversations['#chan', 'idle']
+        self.clock.advance(30)
+        active = self.conversations['#chan', 'active']
+        self.clock.advance(20)
+        active.received('still here')
+        self.clock.advance(10)
+        self.assertEqual(list(self.conversations), [('#chan', 'active')])
+        self.clock.advance(49)
+        self.assertEqual(len(self.conversations), 1)
+        self.clock.advance(1)
+        self.assertEqual(len(self.conversations), 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_expire_keeps_recent_conversations(self):
+        self.conversations['#chan', 'old']
+        self.clock.advance(30)
+        self.conversations['#chan', 'new']
+        self.conversations.expire(20)
+        self.assertEqual(list(self.conversations), [('#chan', 'new')])
@@ -0,0 +1,67 @@
+import unittest
+
+from twisted.internet import defer, task
+from twisted.logger import Logger
+
+from akumabot.events import EventBus
+
+
+class EventBusTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.bus = EventBus(self.clock)
+        self.received = []
+        self.errors = []
+        self.bus.log = Logger(observer=self.errors.append)
+
+    def test_listeners_get_event_arguments(self):
+        self.bus.subscribe('joined', lambda *args: self.received.append(args))
+        self.assertIsNone(self.bus.publish('joined', 'nick', '#chan'))
+        self.assertEqual(self.received, [('nick', '#chan')])
+
+    def test_raising_listener_does_not_stop_others(self):
+        def broken(*args):
+            raise ValueError('oops')
+        self.bus.subscribe('joined', broken)
+        self.bus.subscribe('joined', self.received.append)
+        self.bus.publish('joined', 'nick')
+        self.assertEqual(self.received, ['nick'])
+        [error] = self.errors
+        self.assertEqual(error['event_type'], 'listener_failed')
+        self.assertTrue(error['log_failure'].check(ValueError))
+        self.assertEqual(self.bus.failures('joined')[0], (broken, 1))
+
+    def test_failing_deferred_is_isolated(self):
+        self.bus.subscribe('joined', lambda nick: defer.fail(ValueError()))
+        self.bus.subscribe('joined', self.received.append)
+        d = self.bus.publish('joined', 'nick')
+        self.assertEqual(self.received, ['nick'])
+        self.assertTrue(d.called)
+        self.assertEqual(len(self.errors), 1)
+
+    def test_in_flight_events_are_bounded(self):
+        waiting = []
+
+        def slow(nick):
+            d = defer.Deferred()
+            waiting.append((nick, d))
+            return d
+        self.bus.subscribe('joined', slow, max_in_flight=1)
+        self.bus.publish('joined', 'first')
+        self.bus.publish('joined', 'second')
+        self.assertEqual([nick for nick, _ in waiting], ['first'])
+        waiting[0][1].callback(None)
+        self.assertEqual([nick for nick, _ in waiting], ['first', 'second'])
+
+    def test_latency_is_recorded_per_event(self):
+        d = defer.Deferred()
+        self.bus.subscribe('slow', lambda: d)
+        self.bus.subscribe('fast', lambda: None)
+        self.bus.publish('slow')
+        self.bus.publish('fast')
+        self.clock.advance(2.5)
+        d.callback(None)
+        self.assertEqual(self.bus.latency['slow'].as_dict(), {
+            'count': 1, 'mean': 2.5, 'max': 2.5})
+        self.assertEqual(self.bus.latency['fast'].count, 1)
+        self.assertEqual(self.bus.latency['fast'].max, 0)
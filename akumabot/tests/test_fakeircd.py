@@ -0,0 +1,86 @@
+import unittest
+
+from twisted.internet.testing import StringTransport
+from twisted.words.protocols.irc import parsemsg
+
+from akumabot.fakeircd import FakeIRCServer
+
+
+class FakeIRCServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeIRCServer()
+
+    def connect(self, nickname):
+        connection = self.server.buildProtocol(None)
+        connection.makeConnection(StringTransport())
+        connection.dataReceived(
+            'NICK {0}\r\nUSER {0} 0 * :Real name\r\n'.format(nickname))
+        return connection
+
+    def received(self, connection):
+        lines = connection.transport.value().splitlines()
+        connection.transport.clear()
+        return [parsemsg(line) for line in lines]
+
+    def test_sign_on(self):
+        connection = self.connect('bot')
+        commands = [command for _, command, _ in self.received(connection)]
+        self.assertEqual(commands, ['001', '375', '372', '376'])
+
+    def test_unregistered(self):
+        connection = self.server.buildProtocol(None)
+        connection.makeConnection(StringTransport())
+        connection.dataReceived('JOIN #chan\r\n')
+        [(_, command, _)] = self.received(connection)
+        self.assertEqual(command, '451')
+
+    def test_join_lists_virtual_users(self):
+        self.server.add_virtual_user('alice', ['#chan'])
+        connection = self.connect('bot')
+        self.received(connection)
+        connection.dataReceived('JOIN #chan,#other\r\n')
+        replies = self.received(connection)
+        self.assertEqual(
+            [command for _, command, _ in replies],
+            ['JOIN', '353', '366', 'JOIN', '353', '366'])
+        self.assertEqual(
+            sorted(replies[1][2][-1].split()), ['alice', 'bot'])
+
+    def test_messages_routed_between_connections(self):
+        bot = self.connect('bot')
+        other = self.connect('other')
+        bot.dataReceived('JOIN #chan\r\n')
+        other.dataReceived('JOIN #chan\r\n')
+        self.received(bot)
+        self.received(other)
+        bot.dataReceived('PRIVMSG #chan :hello there\r\n')
+        self.assertEqual(self.received(bot), [])
+        [(prefix, command, params)] = self.received(other)
+        self.assertEqual(prefix, 'bot!bot@localhost')
+        self.assertEqual(params, ['#chan', 'hello there'])
+
+    def test_inject_and_observe(self):
+        seen = []
+        self.server.observers.append(
+            lambda connection, command, params: seen.append(params))
+        self.server.add_virtual_user('alice', ['#chan'])
+        bot = self.connect('bot')
+        bot.dataReceived('JOIN #chan\r\n')
+        self.received(bot)
+        self.server.inject('alice', '#chan', 'bot: ping')
+        [(prefix, _, params)] = self.received(bot)
+        self.assertEqual(prefix, 'alice!alice@virtual')
+        self.assertEqual(params, ['#chan', 'bot: ping'])
+        bot.dataReceived('PRIVMSG #chan :alice, Pong!\r\n')
+        self.assertEqual(seen[-1], ['#chan', 'alice, Pong!'])
+
+    def test_quit_tells_channel_members(self):
+        bot = self.connect('bot')
+        other = self.connect('other')
+        bot.dataReceived('JOIN #chan\r\n')
+        other.dataReceived('JOIN #chan\r\n')
+        self.received(bot)
+        other.dataReceived('QUIT :bye\r\n')
+        [(prefix, command, params)] = self.received(bot)
+        self.assertEqual((command, params), ('QUIT', ['bye']))
+        self.assertEqual(list(self.server.members('#chan')), ['bot'])
@@ -0,0 +1,11 @@
+import unittest
+
+from benchmarks.loadtest import make_config
+
+
+class MakeConfigTestCase(unittest.TestCase):
+    def test_config_loads(self):
+        config = make_config('akumabot', ['#a', '#b'], 6667, 50.5, 50)
+        self.assertEqual(config['outbound.rate'], 50.5)
+        self.assertEqual(config['outbound.burst'], 50)
+        self.assertEqual(config['akumabot.channels'], ['#a', '#b'])
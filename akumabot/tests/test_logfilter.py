@@ -0,0 +1,110 @@
+import unittest
+from StringIO import StringIO
+
+from twisted.internet.task import Clock
+from twisted.logger import LogLevel, Logger, PredicateResult, formatEvent
+
+from akumabot.config import process_config_file
+from akumabot.logfilter import EventTypeFilter, make_observer
+from akumabot.proto import AkumaBotProtocol
+
+
+class EventTypeFilterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.rolls = []
+
+    def make_filter(self, sample_rates=None, rate_limits=None):
+        return EventTypeFilter(
+            sample_rates, rate_limits, self.clock, self.rolls.pop)
+
+    def test_untyped_events_pass(self):
+        predicate = self.make_filter({'privmsg': 0.0})
+        self.assertEqual(predicate({}), PredicateResult.maybe)
+        self.assertEqual(
+            predicate({'event_type': 'other'}), PredicateResult.maybe)
+
+    def test_sampling(self):
+        predicate = self.make_filter({'privmsg': 0.25})
+        self.rolls.extend([0.9, 0.1])
+        event = {'event_type': 'privmsg'}
+        self.assertEqual(predicate(event), PredicateResult.maybe)
+        self.assertEqual(predicate(event), PredicateResult.no)
+        self.assertEqual(predicate.dropped['privmsg'], 1)
+
+    def test_rate_limit_refills(self):
+        predicate = self.make_filter(rate_limits={'user_joined': 2})
+        event = {'event_type': 'user_joined'}
+        results = [predicate(event) for _ in range(3)]
+        self.assertEqual(results, [
+            PredicateResult.maybe, PredicateResult.maybe, PredicateResult.no])
+        self.clock.advance(0.5)
+        self.assertEqual(predicate(event), PredicateResult.maybe)
+        self.assertEqual(predicate(event), PredicateResult.no)
+
+
+    def test_fractional_rate_limit(self):
+        predicate = self.make_filter(rate_limits={'user_joined': 0.5})
+        event = {'event_type': 'user_joined'}
+        self.assertEqual(predicate(event), PredicateResult.maybe)
+        self.assertEqual(predicate(event), PredicateResult.no)
+        self.clock.advance(1)
+        self.assertEqual(predicate(event), PredicateResult.no)
+        self.clock.advance(1)
+        self.assertEqual(predicate(event), PredicateResult.maybe)
+
+
+_config = """
+[akumabot]
+nickname = mybot
+password = secret
+channels = #chan
+admins = me
+
+[logging]
+sample = privmsg:0
+"""
+
+
+class MakeObserverTestCase(unittest.TestCase):
+    def test_filters_by_level_and_event_type(self):
+        output = StringIO()
+        observer = make_observer(
+            process_config_file(StringIO(_config)), output)
+        def event(level, text, **fields):
+            fields.update(
+                log_level=level, log_format=text, log_namespace='test',
+                log_time=0)
+            return fields
+        observer(event(LogLevel.debug, 'debug'))
+        observer(event(LogLevel.info, 'chat', event_type='privmsg'))
+        observer(event(LogLevel.info, 'kept'))
+        self.assertNotIn('debug', output.getvalue())
+        self.assertNotIn('chat', output.getvalue())
+        self.assertIn('kept', output.getvalue())
+
+
+class ProtocolLoggingTestCase(unittest.TestCase):
+    def test_debug_events_are_structured(self):
+        events = []
+        protocol = AkumaBotProtocol('mybot', None, True)
+        protocol.log = Logger(observer=events.append)
+        protocol.bot = type('FakeNetwork', (), {
+            'received_message': lambda *args: None})()
+        protocol.privmsg('me!me@host', '#chan', 'hello')
+        [event] = events
+        self.assertEqual(event['event_type'], 'privmsg')
+        self.assertEqual(event['channel'], '#chan')
+        self.assertEqual(
+            formatEvent(event),
+            "Received message from user 'me!me@host', channel '#chan': "
+            "'hello'")
+
+    def test_no_debug_events_unless_enabled(self):
+        events = []
+        protocol = AkumaBotProtocol('mybot', None, False)
+        protocol.log = Logger(observer=events.append)
+        protocol.bot = type('FakeNetwork', (), {
+            'received_message': lambda *args: None})()
+        protocol.privmsg('me!me@host', '#chan', 'hello')
+        self.assertEqual(events, [])
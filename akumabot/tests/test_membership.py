@@ -0,0 +1,87 @@
+import unittest
+
+from akumabot.membership import MembershipIndex, irc_lower
+
+
+class IRCLowerTestCase(unittest.TestCase):
+    def test_rfc1459(self):
+        self.assertEqual(irc_lower('Nick[Away]\\~'), 'nick{away}|^')
+
+
+class MembershipIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = MembershipIndex()
+        self.index.names_reply('#Chan', ['@Bot', '+Alice', 'bob', '@+carol'])
+        self.index.end_of_names('#chan')
+
+    def test_names_reply(self):
+        self.assertTrue(self.index.is_member('alice', '#CHAN'))
+        self.assertEqual(
+            sorted(self.index.members('#chan')),
+            ['Alice', 'Bot', 'bob', 'carol'])
+        self.assertEqual(self.index.prefixes('carol', '#chan'), '@+')
+        self.assertEqual(self.index.prefixes('bob', '#chan'), '')
+        self.assertIsNone(self.index.prefixes('dave', '#chan'))
+
+    def test_names_reply_replaces_members(self):
+        self.index.add('alice', '#other')
+        self.index.names_reply('#chan', ['@bot', 'dave'])
+        self.assertTrue(self.index.is_member('bob', '#chan'))
+        self.index.end_of_names('#chan')
+        self.assertEqual(
+            sorted(self.index.members('#chan')), ['Bot', 'dave'])
+        self.assertEqual(self.index.channels('bob'), [])
+        self.assertEqual(self.index.channels('alice'), ['#other'])
+
+    def test_join_part_and_channels_of_nick(self):
+        self.index.add('Alice', '#other')
+        self.assertEqual(
+            sorted(self.index.channels('ALICE')), ['#Chan', '#other'])
+        self.index.remove('alice', '#chan')
+        self.assertEqual(self.index.channels('alice'), ['#other'])
+        self.assertFalse(self.index.is_member('alice', '#chan'))
+        self.index.remove('alice', '#other')
+        self.assertEqual(self.index.channels('alice'), [])
+        self.assertEqual(self.index.stats()['nicks'], 3)
+
+    def test_quit(self):
+        self.index.add('bob', '#other')
+        self.assertEqual(sorted(self.index.quit('Bob')), ['#Chan', '#other'])
+        self.assertFalse(self.index.is_member('bob', '#chan'))
+        self.assertEqual(self.index.members('#other'), [])
+        self.assertEqual(self.index.quit('nobody'), [])
+
+    def test_rename_keeps_status(self):
+        self.index.rename('carol', 'Caroline')
+        self.assertFalse(self.index.is_member('carol', '#chan'))
+        self.assertEqual(self.index.prefixes('caroline', '#chan'), '@+')
+        self.assertIn('Caroline', self.index.members('#chan'))
+        self.assertEqual(self.index.channels('caroline'), ['#Chan'])
+
+    def test_modes_changed(self):
+        self.index.modes_changed('#chan', True, 'vo', ('bob', 'alice'))
+        self.assertEqual(self.index.prefixes('bob', '#chan'), '+')
+        self.assertEqual(self.index.prefixes('alice', '#chan'), '@+')
+        self.index.modes_changed('#chan', False, 'ok', ('alice', None))
+        self.assertEqual(self.index.prefixes('alice', '#chan'), '+')
+
+    def test_server_prefixes(self):
+        self.index.set_prefixes({'q': ('~', 0), 'o': ('@', 1)})
+        self.index.names_reply('#new', ['~owner', '+voiced'])
+        self.index.end_of_names('#new')
+        self.assertEqual(self.index.prefixes('owner', '#new'), '~')
+        self.assertTrue(self.index.is_member('+voiced', '#new'))
+
+    def test_who_reply(self):
+        self.index.who_reply('#chan', 'bob', 'H*@')
+        self.index.who_reply('#elsewhere', 'bob', 'H')
+        self.assertEqual(self.index.prefixes('bob', '#chan'), '@')
+        self.assertEqual(self.index.channels('bob'), ['#Chan'])
+
+    def test_remove_channel(self):
+        self.index.add('alice', '#other')
+        self.index.remove_channel('#chan')
+        self.assertEqual(self.index.members('#chan'), [])
+        self.assertEqual(self.index.channels('alice'), ['#other'])
+        self.assertEqual(self.index.stats(), {
+            'channels': 1, 'nicks': 1, 'memberships': 1})
@@ -0,0 +1,106 @@
+import unittest
+from StringIO import StringIO
+
+from akumabot import metrics
+from akumabot.bot import AkumaBot
+from akumabot.config import process_config_file
+from akumabot.tests.test_bot import FakeProtocol
+
+
+class RegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('lines_total', 'Lines.', ('type',))
+        counter.inc('PRIVMSG')
+        counter.inc('PRIVMSG')
+        counter.add(3, 'JOIN')
+        self.assertEqual(self.registry.render(), '\n'.join([
+            '# HELP lines_total Lines.',
+            '# TYPE lines_total counter',
+            'lines_total{type="JOIN"} 3.0',
+            'lines_total{type="PRIVMSG"} 2.0',
+        ]) + '\n')
+
+    def test_label_values_are_escaped(self):
+        counter = self.registry.counter('c', 'C.', ('nick',))
+        counter.inc('a"b\\c\n')
+        self.assertIn('c{nick="a\\"b\\\\c\\n"} 1.0', self.registry.render())
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram(
+            'latency', 'Latency.', buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        lines = self.registry.render().splitlines()[2:]
+        self.assertEqual(lines, [
+            'latency_bucket{le="0.1"} 1.0',
+            'latency_bucket{le="1.0"} 2.0',
+            'latency_bucket{le="+Inf"} 3.0',
+            'latency_sum 5.55',
+            'latency_count 3.0',
+        ])
+
+    def test_gauge_callback(self):
+        self.registry.gauge(
+            'depth', 'Depth.', ('network',),
+            lambda: [(('b',), 2), (('a',), 1)])
+        lines = self.registry.render().splitlines()[2:]
+        self.assertEqual(lines, ['depth{network="a"} 1.0',
+                                 'depth{network="b"} 2.0'])
+
+
+_config = """
+[akumabot]
+nickname = mybot
+password = secret
+channels = #chan
+admins = me
+"""
+
+
+class CommandMetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bot = AkumaBot(process_config_file(StringIO(_config)))
+        self.network = self.bot.networks['default']
+        self.protocol = FakeProtocol()
+
+    def count(self, metric, *label_values):
+        return metric.values.get(label_values, 0)
+
+    def observations(self, histogram, *label_values):
+        # Every bucket count, without the trailing sum.
+        return sum(histogram.values.get(label_values, [0])[:-1])
+
+    def test_reply_latency_recorded_when_sent(self):
+        latency = metrics.command_latency
+        before = self.observations(latency, 'ping')
+        self.network.received_private_message('me', 'ping')
+        # Not connected yet, so the reply is still queued.
+        self.assertEqual(self.observations(latency, 'ping'), before)
+        self.network.got_protocol(self.protocol)
+        self.network.received_private_message('me', 'ping')
+        self.assertEqual(len(self.protocol.messaged), 1)
+        self.assertEqual(self.observations(latency, 'ping'), before + 1)
+
+    def test_rejections_counted(self):
+        rejected = metrics.commands_rejected
+        unknown = self.count(rejected, '<unknown>', 'unknown')
+        not_admin = self.count(rejected, 'quit', 'not_admin')
+        self.network.received_private_message('someone', 'nosuchcommand')
+        self.network.received_private_message('someone', 'quit 10')
+        self.assertEqual(
+            self.count(rejected, '<unknown>', 'unknown'), unknown + 1)
+        self.assertEqual(
+            self.count(rejected, 'quit', 'not_admin'), not_admin + 1)
+
+    def test_outbound_depth_gauge(self):
+        self.network.outbound.tokens = 0
+        self.network.send_channel_message('hello', '#chan')
+        rendered = metrics.registry.render()
+        self.assertIn(
+            'akumabot_outbound_queue_depth'
+            '{network="default",priority="normal"} 1.0', rendered)
+        self.network.outbound.clear()
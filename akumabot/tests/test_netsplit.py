@@ -0,0 +1,85 @@
+import unittest
+
+from twisted.internet.task import Clock
+
+from akumabot.netsplit import NetsplitTracker, split_servers
+
+
+class SplitServersTestCase(unittest.TestCase):
+    def test_split_messages(self):
+        self.assertEqual(
+            split_servers('hub.example.net leaf.example.net'),
+            ('hub.example.net', 'leaf.example.net'))
+        self.assertEqual(split_servers('*.net *.split'), ('*.net', '*.split'))
+
+    def test_user_messages(self):
+        for message in ('Quit: a.b c.d', 'a.b c.d e.f', 'Ping timeout', '',
+                        'hub.example.net', 'a.b  c.d'):
+            self.assertIsNone(split_servers(message), message)
+
+
+class NetsplitTrackerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.batches = []
+        self.tracker = NetsplitTracker(
+            lambda *batch: self.batches.append(batch), quiet=1.0,
+            rejoin_window=600, clock=self.clock)
+
+    def test_quits_batched_until_quiet(self):
+        for n in range(3):
+            self.assertTrue(self.tracker.quit('user{0}'.format(n), 'a.b c.d'))
+            self.clock.advance(0.5)
+        self.assertFalse(self.tracker.quit('other', 'Quit: bye'))
+        self.assertEqual(self.batches, [])
+        self.clock.advance(1)
+        self.assertEqual(self.batches, [])
+        self.clock.advance(1)
+        self.assertEqual(self.batches, [
+            ('netsplit', ('a.b', 'c.d'),
+             [('user0', 'a.b c.d'), ('user1', 'a.b c.d'),
+              ('user2', 'a.b c.d')]),
+        ])
+
+    def test_netjoin_follows_netsplit(self):
+        self.tracker.quit('alice', 'a.b c.d')
+        self.clock.advance(5)
+        self.assertTrue(self.tracker.join('alice', '#one'))
+        self.assertTrue(self.tracker.join('alice', '#two'))
+        self.assertFalse(self.tracker.join('bob', '#one'))
+        self.clock.pump([1, 1])
+        self.assertEqual(self.batches[1], (
+            'netjoin', ('a.b', 'c.d'), [('alice', '#one'), ('alice', '#two')]))
+        # Once back, the user's joins are ordinary again.
+        self.assertFalse(self.tracker.join('alice', '#three'))
+
+    def test_join_before_quiet_finishes_netsplit_first(self):
+        self.tracker.quit('alice', 'a.b c.d')
+        self.tracker.join('alice', '#one')
+        self.assertEqual(self.batches[0][0], 'netsplit')
+        self.clock.pump([1, 1])
+        self.assertEqual(self.batches[1][0], 'netjoin')
+
+    def test_rejoin_window(self):
+        self.tracker.quit('alice', 'a.b c.d')
+        self.clock.pump([1, 1])
+        self.clock.advance(601)
+        self.assertFalse(self.tracker.join('alice', '#one'))
+
+    def test_ircv3_batches(self):
+        self.assertTrue(self.tracker.start_batch('x1', 'netsplit', ['a', 'b']))
+        self.assertFalse(self.tracker.start_batch('x2', 'chathistory', []))
+        # Inside a batch the QUIT message doesn't matter.
+        self.assertTrue(self.tracker.quit('alice', 'whatever', 'x1'))
+        self.clock.advance(10)
+        self.assertEqual(self.batches, [])
+        self.tracker.end_batch('x1')
+        self.assertEqual(
+            self.batches, [('netsplit', ('a', 'b'), [('alice', 'whatever')])])
+
+    def test_stop_drops_batches(self):
+        self.tracker.quit('alice', 'a.b c.d')
+        self.tracker.stop()
+        self.clock.pump([1, 1])
+        self.assertEqual(self.batches, [])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
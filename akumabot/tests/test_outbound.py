@@ -0,0 +1,83 @@
+import unittest
+
+from twisted.internet import task
+
+from akumabot.outbound import (
+    OutboundScheduler, PRIORITY_HIGH, PRIORITY_NORMAL
+)
+
+
+class OutboundSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.scheduler = OutboundScheduler(rate=1.0, burst=2, clock=self.clock)
+        self.sent = []
+
+    def enqueue(self, target, line, priority=PRIORITY_NORMAL, cost=1):
+        self.scheduler.enqueue(
+            target, priority, self.sent.append, (line,), cost)
+
+    def test_burst_then_rate_limited(self):
+        for n in range(4):
+            self.enqueue('#chan', n)
+        self.assertEqual(self.sent, [0, 1])
+        self.assertEqual(self.scheduler.depth(), 2)
+        self.clock.advance(1.0)
+        self.assertEqual(self.sent, [0, 1, 2])
+        self.clock.advance(1.0)
+        self.assertEqual(self.sent, [0, 1, 2, 3])
+        self.assertEqual(self.scheduler.depth(), 0)
+
+    def test_high_priority_goes_first(self):
+        for n in range(4):
+            self.enqueue('#spam', 'spam{0}'.format(n))
+        self.enqueue('chanserv', 'op', PRIORITY_HIGH)
+        self.clock.advance(1.0)
+        self.assertEqual(self.sent[2], 'op')
+
+    def test_targets_take_turns(self):
+        self.scheduler.tokens = 0
+        for n in range(3):
+            self.enqueue('#busy', 'busy{0}'.format(n))
+        self.enqueue('#quiet', 'quiet')
+        self.clock.pump([1.0] * 4)
+        self.assertEqual(self.sent, ['busy0', 'quiet', 'busy1', 'busy2'])
+
+    def test_costly_lines_wait_longer(self):
+        self.enqueue('#chan', 'long', cost=2)
+        self.enqueue('#chan', 'longer', cost=2)
+        self.assertEqual(self.sent, ['long'])
+        self.clock.advance(1.0)
+        self.assertEqual(self.sent, ['long'])
+        self.clock.advance(1.0)
+        self.assertEqual(self.sent, ['long', 'longer'])
+
+    def test_wait_statistics(self):
+        self.scheduler.tokens = 0
+        self.enqueue('#chan', 'a')
+        self.clock.advance(1.0)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['sent'], 1)
+        self.assertEqual(stats['max_wait'], 1.0)
+        self.assertEqual(stats['depth'], 0)
+
+    def test_clear_drops_queue(self):
+        self.scheduler.tokens = 0
+        self.enqueue('#chan', 'a')
+        self.scheduler.clear()
+        self.clock.advance(5.0)
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_lines_queued_while_sending(self):
+        def send(line):
+            self.sent.append(line)
+            if line == 'a':
+                self.enqueue('#chan', 'b')
+                self.enqueue('#chan', 'c')
+        self.scheduler.enqueue('#chan', PRIORITY_NORMAL, send, ('a',))
+        self.enqueue('#chan', 'd')
+        self.assertEqual(self.sent, ['a', 'b'])
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.scheduler.clear()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from twisted.internet.task import Clock
+
+from akumabot.paging import Pager, join_chunks, split_lines
+
+
+class SplitLinesTestCase(unittest.TestCase):
+    def test_short_lines_kept(self):
+        self.assertEqual(
+            split_lines('one\ntwo\r\n\n  \nthree', 10),
+            ['one', 'two', 'three'])
+
+    def test_broken_at_spaces(self):
+        self.assertEqual(
+            split_lines('the quick brown fox jumps', 10),
+            ['the quick', 'brown fox', 'jumps'])
+        self.assertEqual(split_lines('aaaa bbbbb', 5), ['aaaa', 'bbbbb'])
+
+    def test_long_word_broken(self):
+        self.assertEqual(
+            split_lines('x abcdefghijkl', 5), ['x', 'abcde', 'fghij', 'kl'])
+
+    def test_characters_not_broken(self):
+        # Each of these takes two bytes.
+        message = 'ä' * 10
+        lines = split_lines(message, 5)
+        self.assertEqual(lines, ['ää', 'ää', 'ää', 'ää', 'ää'])
+        for line in split_lines('x' + message, 7):
+            self.assertLessEqual(len(line), 7)
+            line.decode('utf-8')
+
+    def test_unicode_encoded(self):
+        self.assertEqual(split_lines(u'größe ok', 7), ['größe', 'ok'])
+
+    def test_no_room(self):
+        self.assertRaises(ValueError, split_lines, 'x', 0)
+
+    def test_join_chunks(self):
+        self.assertEqual(
+            join_chunks(iter(['a', u'ä', 'c']), 2), 'a\nä')
+
+
+class PagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.pager = Pager(
+            max_lines=2, max_pages=3, ttl=60, max_cursors=2,
+            clock=self.clock)
+
+    def test_short_reply_kept_whole(self):
+        self.assertEqual(
+            self.pager.first_page('k', 'one\ntwo', 100), ['one', 'two'])
+        self.assertIsNone(self.pager.next_page('k'))
+        self.assertEqual(len(self.pager), 0)
+
+    def test_pages(self):
+        reply = '\n'.join(str(n) for n in range(5))
+        self.assertEqual(
+            self.pager.first_page('k', reply, 100), ['0', '1 (more)'])
+        self.assertEqual(self.pager.next_page('k'), ['2', '3 (more)'])
+        self.assertEqual(self.pager.next_page('k'), ['4'])
+        self.assertIsNone(self.pager.next_page('k'))
+
+    def test_budget_leaves_room_for_hint(self):
+        lines = self.pager.first_page('k', 'word ' * 20, 20)
+        self.assertTrue(lines[-1].endswith(' (more)'))
+        for line in lines:
+            self.assertLessEqual(len(line), 20)
+
+    def test_pages_limited(self):
+        reply = '\n'.join(str(n) for n in range(100))
+        self.pager.first_page('k', reply, 100)
+        self.assertEqual(self.pager.next_page('k'), ['2', '3 (more)'])
+        self.assertEqual(self.pager.next_page('k'), ['4', '5'])
+        self.assertIsNone(self.pager.next_page('k'))
+
+    def test_generator_read_lazily(self):
+        produced = []
+
+        def lines():
+            for n in range(100):
+                produced.append(n)
+                yield 'line {0}'.format(n)
+        self.assertEqual(
+            self.pager.first_page('k', lines(), 100),
+            ['line 0', 'line 1 (more)'])
+        self.assertEqual(produced, [0, 1, 2])
+        self.pager.next_page('k')
+        self.assertEqual(produced, [0, 1, 2, 3, 4])
+
+    def test_cursors_expire(self):
+        self.pager.first_page('k', 'a\nb\nc', 100)
+        self.clock.advance(59)
+        self.assertEqual(self.pager.next_page('k'), ['c'])
+        self.pager.first_page('k', 'a\nb\nc', 100)
+        self.clock.advance(61)
+        self.assertIsNone(self.pager.next_page('k'))
+
+    def test_cursors_bounded(self):
+        for key in ('a', 'b', 'c'):
+            self.pager.first_page(key, 'a\nb\nc', 100)
+        self.assertEqual(len(self.pager), 2)
+        self.assertIsNone(self.pager.next_page('a'))
+        self.assertEqual(self.pager.next_page('c'), ['c'])
+
+    def test_new_long_reply_replaces_old(self):
+        self.pager.first_page('k', 'a\nb\nc', 100)
+        self.pager.first_page('k', 'x\ny\nz', 100)
+        self.assertEqual(self.pager.next_page('k'), ['z'])
+
+    def test_new_short_reply_drops_old(self):
+        self.pager.first_page('k', 'a\nb\nc', 100)
+        self.assertEqual(self.pager.first_page('k', 'short', 100), ['short'])
+        self.assertIsNone(self.pager.next_page('k'))
+        self.assertEqual(len(self.pager), 0)
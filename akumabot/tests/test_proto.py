@@ -0,0 +1,197 @@
+import unittest
+
+from twisted.internet.task import Clock
+from twisted.internet.testing import StringTransport
+
+from akumabot.netsplit import NetsplitTracker
+from akumabot.proto import AkumaBotProtocol, pack_joins
+
+
+class PackJoinsTestCase(unittest.TestCase):
+    def test_one_line(self):
+        self.assertEqual(
+            pack_joins([('#a', None), ('#b', None)]), ['JOIN #a,#b'])
+
+    def test_keyed_channels_first(self):
+        self.assertEqual(
+            pack_joins([('#a', None), ('#b', 'secret'), ('#c', 'xyz')]),
+            ['JOIN #b,#c,#a secret,xyz'])
+
+    def test_lines_fit_limit(self):
+        channels = [('#channel{0:04d}'.format(n), None) for n in range(500)]
+        lines = pack_joins(channels)
+        self.assertEqual(len(lines), 14)
+        self.assertTrue(all(len(line) <= 510 for line in lines))
+        joined = [name for line in lines for name in line[5:].split(',')]
+        self.assertEqual(joined, [name for name, _ in channels])
+
+    def test_exact_fit(self):
+        # 'JOIN ' plus two 3-byte names and a comma is 12 bytes.
+        channels = [('#aa', None), ('#bb', None), ('#cc', None)]
+        self.assertEqual(
+            pack_joins(channels, max_length=12),
+            ['JOIN #aa,#bb', 'JOIN #cc'])
+
+    def test_keys_count_towards_limit(self):
+        channels = [('#aa', 'key1'), ('#bb', 'key2')]
+        self.assertEqual(
+            pack_joins(channels, max_length=20),
+            ['JOIN #aa key1', 'JOIN #bb key2'])
+
+    def test_max_targets(self):
+        channels = [('#{0}'.format(n), None) for n in range(5)]
+        self.assertEqual(
+            pack_joins(channels, max_targets=2),
+            ['JOIN #0,#1', 'JOIN #2,#3', 'JOIN #4'])
+
+    def test_no_channels(self):
+        self.assertEqual(pack_joins([]), [])
+
+
+class SignOnTestCase(unittest.TestCase):
+    def test_joins_wait_for_server_limits(self):
+        protocol = AkumaBotProtocol('mybot', None, False)
+        targmax = []
+
+        class Network(object):
+            def signed_on(self):
+                targmax.append(protocol.supported.getFeature('TARGMAX'))
+        protocol.bot = Network()
+        protocol.makeConnection(StringTransport())
+        protocol.dataReceived(
+            ':server 001 mybot :Welcome\r\n'
+            ':server 005 mybot TARGMAX=JOIN:4 :are supported\r\n')
+        self.assertEqual(targmax, [])
+        protocol.dataReceived(
+            ':server 375 mybot :- MOTD -\r\n'
+            ':server 376 mybot :End of /MOTD command.\r\n'
+            ':server 422 mybot :MOTD File is missing\r\n')
+        self.assertEqual(targmax, [{'JOIN': 4}])
+
+
+class RecordingNetwork(object):
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name,) + args)
+
+
+class CapabilityTestCase(unittest.TestCase):
+    def setUp(self):
+        self.protocol = AkumaBotProtocol('mybot', None, False)
+        self.protocol.bot = self.network = RecordingNetwork()
+        self.protocol.makeConnection(StringTransport())
+
+    def sent(self):
+        lines = self.protocol.transport.value().splitlines()
+        self.protocol.transport.clear()
+        return lines
+
+    def receive(self, line):
+        self.protocol.dataReceived(line + '\r\n')
+
+    def test_capabilities_requested_before_registering(self):
+        self.assertEqual(self.sent()[0], 'CAP LS 302')
+        self.receive(':server CAP * LS * :multi-prefix sasl=PLAIN')
+        self.assertEqual(self.sent(), [])
+        self.receive(':server CAP * LS :extended-join account-notify')
+        self.assertEqual(
+            self.sent(), ['CAP REQ :account-notify extended-join'])
+        self.receive(':server CAP * ACK :account-notify extended-join')
+        self.assertEqual(self.sent(), ['CAP END'])
+        self.assertEqual(
+            self.protocol.capabilities,
+            set(['account-notify', 'extended-join']))
+
+    def test_nothing_wanted(self):
+        self.sent()
+        self.receive(':server CAP * LS :multi-prefix')
+        self.assertEqual(self.sent(), ['CAP END'])
+
+    def test_extended_join_and_account_notify(self):
+        self.protocol.capabilities.add('extended-join')
+        self.receive(':alice!a@host JOIN #chan alice_acct :Alice Smith')
+        self.receive(':bob!b@host JOIN #chan * :Bob')
+        self.receive(':alice!a@host ACCOUNT *')
+        self.assertEqual(self.network.calls, [
+            ('account_changed', 'alice', 'alice_acct'),
+            ('user_joined', 'alice', '#chan'),
+            ('account_changed', 'bob', '*'),
+            ('user_joined', 'bob', '#chan'),
+            ('account_changed', 'alice', '*'),
+        ])
+
+    def test_own_hostmask(self):
+        self.receive(':alice!a@host JOIN #chan')
+        self.assertIsNone(self.protocol.hostmask)
+        self.receive(':mybot!~bot@1.2.3.4 JOIN #chan')
+        self.assertEqual(self.protocol.hostmask, 'mybot!~bot@1.2.3.4')
+        self.receive(':server 396 mybot bot/cloak :is now your hidden host')
+        self.assertEqual(self.protocol.hostmask, 'mybot!~bot@bot/cloak')
+        self.protocol.nickChanged('mybot_')
+        self.assertEqual(self.protocol.hostmask, 'mybot_!~bot@bot/cloak')
+
+    def test_messages_stripped(self):
+        # Command detection counts on lines arriving stripped.
+        self.receive(':alice!a@host PRIVMSG #chan :  !ping ')
+        self.receive(':alice!a@host PRIVMSG mybot : help')
+        self.assertEqual(self.network.calls, [
+            ('received_message', 'alice', '#chan', '!ping'),
+            ('received_private_message', 'alice', 'help'),
+        ])
+
+    def test_whois_replies(self):
+        self.receive(':server 330 mybot alice alice_acct :is logged in as')
+        self.receive(':server 318 mybot alice :End of /WHOIS list.')
+        self.assertEqual(self.network.calls, [
+            ('whois_account', 'alice', 'alice_acct'),
+            ('end_of_whois', 'alice'),
+        ])
+
+
+class NetsplitReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.protocol = AkumaBotProtocol('mybot', None, True)
+        self.protocol.bot = self.network = RecordingNetwork()
+        self.clock = Clock()
+        self.protocol.splits = NetsplitTracker(
+            self.protocol._netsplit_batch, clock=self.clock)
+        self.protocol.makeConnection(StringTransport())
+
+    def replay(self, lines):
+        self.protocol.dataReceived(''.join(line + '\r\n' for line in lines))
+
+    def test_split_and_rejoin_batched(self):
+        self.replay(
+            [':user{0}!u@h QUIT :hub.net leaf.net'.format(n)
+             for n in range(100)] +
+            [':other!u@h QUIT :Quit: bye'])
+        self.assertEqual(
+            self.network.calls, [('user_quit', 'other', 'Quit: bye')])
+        self.clock.pump([1, 1])
+        [(name, servers, nicknames)] = self.network.calls[1:]
+        self.assertEqual(name, 'netsplit')
+        self.assertEqual(servers, ('hub.net', 'leaf.net'))
+        self.assertEqual(len(nicknames), 100)
+
+        del self.network.calls[:]
+        self.replay(
+            [':user{0}!u@h JOIN #chan'.format(n) for n in range(100)])
+        self.assertEqual(self.network.calls, [])
+        self.clock.pump([1, 1])
+        [(name, servers, joins)] = self.network.calls
+        self.assertEqual(name, 'netjoin')
+        self.assertEqual(joins[0], ('user0', '#chan'))
+
+    def test_tagged_batch(self):
+        self.replay([
+            ':server BATCH +abc netsplit hub.net leaf.net',
+            '@batch=abc :alice!u@h QUIT :hub.net leaf.net',
+            '@time=2020-01-01T00:00:00Z;batch=abc :bob!u@h QUIT :*.net',
+        ])
+        self.assertEqual(self.network.calls, [])
+        self.replay([':server BATCH -abc'])
+        self.assertEqual(self.network.calls, [
+            ('netsplit', ('hub.net', 'leaf.net'), ['alice', 'bob']),
+        ])
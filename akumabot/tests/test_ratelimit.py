@@ -0,0 +1,114 @@
+import unittest
+from StringIO import StringIO
+
+from twisted.internet.task import Clock
+
+from akumabot import metrics
+from akumabot.bot import AkumaBot
+from akumabot.config import process_config_file
+from akumabot.ratelimit import RateLimiter
+from akumabot.tests.test_bot import FakeProtocol
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+
+    def make_limiter(self, **limits):
+        return RateLimiter(
+            limits, {'calc': 2}, max_tracked=2, clock=self.clock)
+
+    def allow(self, limiter, nickname='nick', channel='#chan',
+              command='ping'):
+        return limiter.allow('net', nickname, channel, command)
+
+    def test_nick_limit(self):
+        limiter = self.make_limiter(nick=(1, 2))
+        self.assertIsNone(self.allow(limiter))
+        self.assertIsNone(self.allow(limiter, 'NICK'))
+        self.assertEqual(self.allow(limiter), 'nick')
+        self.assertIsNone(self.allow(limiter, 'other'))
+        self.clock.advance(1)
+        self.assertIsNone(self.allow(limiter))
+        self.assertEqual(limiter.stats()['rejected'], {'nick': 1})
+
+    def test_command_costs(self):
+        limiter = self.make_limiter(nick=(1, 3))
+        self.assertIsNone(self.allow(limiter, command='calc'))
+        self.assertEqual(self.allow(limiter, command='calc'), 'nick')
+        self.assertIsNone(self.allow(limiter, command='ping'))
+
+    def test_rejection_takes_no_tokens(self):
+        limiter = self.make_limiter(nick=(1, 1), channel=(1, 1))
+        self.assertIsNone(self.allow(limiter, 'a'))
+        # The channel is empty, so b's own bucket is left alone.
+        self.assertEqual(self.allow(limiter, 'b'), 'channel')
+        self.assertIsNone(self.allow(limiter, 'b', '#other'))
+
+    def test_private_messages_skip_channel_bucket(self):
+        limiter = self.make_limiter(channel=(1, 1))
+        self.assertIsNone(self.allow(limiter, channel=None))
+        self.assertIsNone(self.allow(limiter, channel=None))
+
+    def test_network_limit(self):
+        limiter = self.make_limiter(network=(1, 2))
+        self.assertIsNone(self.allow(limiter, 'a'))
+        self.assertIsNone(self.allow(limiter, 'b'))
+        self.assertEqual(self.allow(limiter, 'c'), 'network')
+
+    def test_warned_once_until_allowed(self):
+        limiter = self.make_limiter(nick=(1, 1))
+        self.assertTrue(limiter.should_warn('net', 'nick'))
+        self.assertFalse(limiter.should_warn('net', 'NICK'))
+        self.assertTrue(limiter.should_warn('net', 'other'))
+        self.assertIsNone(self.allow(limiter))
+        self.assertTrue(limiter.should_warn('net', 'nick'))
+
+    def test_bucket_count_is_bounded(self):
+        limiter = self.make_limiter(nick=(1, 1))
+        for n in range(5):
+            self.allow(limiter, 'nick{0}'.format(n))
+        self.assertEqual(limiter.stats()['tracked'], {'nick': 2})
+
+
+_config = """
+[akumabot]
+nickname = mybot
+password = secret
+channels = #chan
+admins = me
+
+[ratelimit]
+enabled = true
+nick_burst = 1
+"""
+
+
+class CommandRateLimitTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bot = AkumaBot(process_config_file(StringIO(_config)))
+        self.network = self.bot.networks['default']
+        self.protocol = FakeProtocol()
+        self.network.got_protocol(self.protocol)
+
+    def test_limited_commands_dropped(self):
+        rejected = metrics.commands_rejected.values
+        before = rejected.get(('ping', 'rate_limited_nick'), 0)
+        for _ in range(3):
+            self.network.received_private_message('someone', 'ping')
+        # Only the first command over the limit gets a reply.
+        self.assertEqual(len(self.protocol.messaged), 2)
+        self.assertIn('too fast', self.protocol.messaged[1][1])
+        self.assertEqual(
+            rejected[('ping', 'rate_limited_nick')], before + 2)
+
+    def test_off_by_default(self):
+        config = process_config_file(StringIO(_config.replace(
+            'enabled = true\n', '')))
+        self.assertIsNone(
+            AkumaBot(config).command_processor.rate_limiter)
+
+    def test_admins_are_exempt(self):
+        for _ in range(3):
+            self.network.received_private_message('me', 'ping')
+        self.assertEqual(len(self.protocol.messaged), 3)
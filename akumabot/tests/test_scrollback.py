@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from twisted.internet import defer
+
+from akumabot.arguments import ArgumentError
+from akumabot.commands import parse_arguments, registry
+from akumabot.scrollback import ChannelScrollback, Scrollback, words
+
+
+class WordsTestCase(unittest.TestCase):
+    def test_words(self):
+        self.assertEqual(
+            words('The cat, the HAT and the_cat!'),
+            ['the', 'cat', 'hat', 'and', 'the_cat'])
+        self.assertEqual(words('Größe grösse'), ['größe', 'grösse'])
+        self.assertEqual(words('... !!'), [])
+
+
+class ChannelScrollbackTestCase(unittest.TestCase):
+    def test_search_newest_first(self):
+        scrollback = ChannelScrollback(1024)
+        scrollback.add(100, 'alice', 'I like cats')
+        scrollback.add(200, 'bob', 'dogs are better')
+        scrollback.add(300, 'carol', 'Cats and dogs')
+        self.assertEqual(scrollback.search('cats'), [
+            (300, 'carol', 'Cats and dogs'),
+            (100, 'alice', 'I like cats'),
+        ])
+        self.assertEqual(
+            scrollback.search('dogs CATS'), [(300, 'carol', 'Cats and dogs')])
+        self.assertEqual(scrollback.search('cats', limit=1), [
+            (300, 'carol', 'Cats and dogs')])
+        self.assertEqual(
+            scrollback.search('dogs', since=250),
+            [(300, 'carol', 'Cats and dogs')])
+        self.assertEqual(scrollback.search('birds'), [])
+        self.assertEqual(scrollback.search('!'), [])
+
+    def test_oldest_lines_overwritten(self):
+        # Each line takes 6 header bytes, 5 of nick and separator and
+        # 10 of message.
+        scrollback = ChannelScrollback(21 * 10 + 5)
+        for n in range(25):
+            scrollback.add(n, 'user', 'word{0:06d}'.format(n))
+        self.assertEqual(scrollback.lines, 10)
+        self.assertEqual(scrollback.search('word000014'), [])
+        self.assertEqual(
+            scrollback.search('word000015'), [(15, 'user', 'word000015')])
+        memory = scrollback.memory()
+        self.assertEqual(memory['used'], 210)
+        self.assertEqual((memory['words'], memory['postings']), (10, 10))
+
+    def test_index_follows_buffer(self):
+        scrollback = ChannelScrollback(200)
+        for n in range(1000):
+            scrollback.add(n, 'nick{0}'.format(n % 7), 'common {0} {1}'.format(
+                n % 13, 'x' * (n % 30)))
+            self.assertEqual(
+                len(scrollback.search('common', limit=None)),
+                scrollback.lines)
+        # Every word indexed is in a line still held.
+        self.assertEqual(
+            scrollback.memory()['postings'],
+            sum(len(words(message)) for _, _, message
+                in scrollback.search('common', limit=None)))
+
+    def test_long_line_truncated(self):
+        scrollback = ChannelScrollback(64)
+        scrollback.add(1, 'alice', 'start ' + 'y' * 100 + ' end')
+        [(_, nickname, message)] = scrollback.search('start')
+        self.assertEqual(nickname, 'alice')
+        self.assertEqual(len(message), 64 - 6 - 6)
+        self.assertEqual(scrollback.search('end'), [])
+
+
+class ScrollbackTestCase(unittest.TestCase):
+    def test_channels(self):
+        scrollback = Scrollback(1024)
+        scrollback.add('#One', 1, 'alice', 'hello')
+        scrollback.add('#two', 2, 'bob', 'hello')
+        self.assertEqual(
+            scrollback.search('#one', 'hello'), [(1, 'alice', 'hello')])
+        self.assertEqual(sorted(scrollback.memory()), ['#one', '#two'])
+        scrollback.remove('#ONE')
+        self.assertEqual(scrollback.search('#one', 'hello'), [])
+
+
+class GrepCommandTestCase(unittest.TestCase):
+    def run_grep(self, argstring):
+        command = registry.get('grep').command
+        try:
+            args = parse_arguments(command, argstring)
+        except ArgumentError as e:
+            return str(e), []
+        searches = []
+
+        class Network(object):
+            def search_scrollback(self, channel, query, since, limit):
+                searches.append((channel, query, since is not None, limit))
+                if query == 'nothing':
+                    return []
+                return [(0, 'alice', 'hello there'), (60, 'bob', 'hello')]
+        results = []
+        d = defer.maybeDeferred(
+            command.run, Network(), '#chan', 'carol', args)
+        d.addCallback(results.append)
+        return results[0], searches
+
+    def test_grep(self):
+        self.assertEqual(self.run_grep('hello  there'), (
+            '[00:00] <alice> hello there | [00:01] <bob> hello',
+            [('#chan', 'hello  there', False, 3)]))
+        self.assertEqual(self.run_grep('2h nothing'), (
+            "Nothing matching 'nothing'", [('#chan', 'nothing', True, 3)]))
+        self.assertEqual(self.run_grep(''), (
+            'grep [<within>] <words>   Find recent lines in this channel '
+            'containing every word, optionally only those within e.g. 30m '
+            'or 2h', []))
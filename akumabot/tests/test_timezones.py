@@ -0,0 +1,63 @@
+import unittest
+
+from akumabot.fuzzy import edit_distance, SuggestionIndex
+from akumabot.timezones import TimezoneIndex
+
+
+class EditDistanceTestCase(unittest.TestCase):
+    def test_distances(self):
+        self.assertEqual(edit_distance('berlin', 'berlin'), 0)
+        self.assertEqual(edit_distance('berlin', 'berln'), 1)
+        self.assertEqual(edit_distance('berlin', 'berlint'), 1)
+        self.assertEqual(edit_distance('berlin', 'barlin'), 1)
+        self.assertEqual(edit_distance('', 'abc'), 3)
+
+
+class SuggestionIndexTestCase(unittest.TestCase):
+    def test_suggests_closest_first(self):
+        index = SuggestionIndex()
+        index.add('help', 'help')
+        index.add('hello', 'hello')
+        index.add('kick', 'kick')
+        self.assertEqual(index.suggest('helo'), ['hello', 'help'])
+        self.assertEqual(index.suggest('xyzzy'), [])
+
+    def test_limit(self):
+        index = SuggestionIndex()
+        for word in ('cat', 'bat', 'hat'):
+            index.add(word, word)
+        self.assertEqual(len(index.suggest('at', limit=2)), 2)
+
+
+class TimezoneIndexTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = TimezoneIndex()
+
+    def assertLookup(self, name, zone_name):
+        zone = self.index.lookup(name)
+        self.assertIsNotNone(zone, 'No zone found for {0!r}'.format(name))
+        self.assertEqual(zone.zone, zone_name)
+
+    def test_exact_and_case_insensitive_names(self):
+        self.assertLookup('Europe/Berlin', 'Europe/Berlin')
+        self.assertLookup('europe/BERLIN', 'Europe/Berlin')
+        self.assertLookup('CET', 'CET')
+        self.assertLookup('cet', 'CET')
+
+    def test_cities(self):
+        self.assertLookup('berlin', 'Europe/Berlin')
+        self.assertLookup('new york', 'America/New_York')
+
+    def test_abbreviations(self):
+        self.assertLookup('pst', 'America/Los_Angeles')
+        self.assertLookup('JST', 'Asia/Tokyo')
+
+    def test_unknown(self):
+        self.assertIsNone(self.index.lookup('Nowhere/Special'))
+
+    def test_suggestions(self):
+        self.assertEqual(
+            self.index.suggest('Europe/Berln')[0], 'Europe/Berlin')
+        self.assertEqual(self.index.suggest('toky')[0], 'Asia/Tokyo')
+        self.assertEqual(self.index.suggest('xyzzy'), [])
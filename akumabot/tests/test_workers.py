@@ -0,0 +1,221 @@
+import unittest
+from StringIO import StringIO
+
+from twisted.internet import defer, task
+
+from akumabot import metrics
+from akumabot.activity import Sighting
+from akumabot.commands import TransientReply, registry
+from akumabot.config import process_config_file
+from akumabot.workers import (
+    IsMember, WorkerPool, RemoteNetwork, RunCommand, SendNextPage,
+    SendPrivateMessage, _WorkerAMP
+)
+
+
+_config = """
+[akumabot]
+nickname = mybot
+password = secret
+channels = #chan
+admins = me
+"""
+
+
+class FakeConnection(object):
+    def __init__(self, response=None):
+        self.calls = []
+        self.response = response
+
+    def callRemote(self, command_type, **kwargs):
+        self.calls.append((command_type, kwargs))
+        return defer.succeed(self.response)
+
+
+class FakeNetwork(object):
+    name = 'default'
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.pool = WorkerPool(
+            None, self.clock, 2, '/dev/null', '/tmp/unused', max_waiting=2,
+            wait_timeout=5)
+
+    def test_commands_wait_for_a_worker(self):
+        results = []
+        d = self.pool.run_command(FakeNetwork(), 'ping', '#chan', 'me', '')
+        d.addCallback(results.append)
+        self.assertEqual(results, [])
+
+        connection = FakeConnection({'result': 'Pong!'})
+        self.pool._worker_connected(1, connection)
+        self.assertEqual(results, ['Pong!'])
+        [(command, kwargs)] = connection.calls
+        self.assertIs(command, RunCommand)
+        self.assertEqual(kwargs['command'], 'ping')
+        self.assertEqual(kwargs['network'], 'default')
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_waiting_for_a_worker_is_bounded(self):
+        results = []
+        for _ in range(3):
+            d = self.pool.run_command(FakeNetwork(), 'ping', None, 'me', '')
+            d.addCallback(results.append)
+        self.assertEqual(len(results), 1)
+        self.clock.advance(5)
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertIsInstance(result, TransientReply)
+        self.assertEqual(self.pool._waiting, [])
+
+    def test_stats_count_completed_commands(self):
+        self.pool._worker_connected(0, FakeConnection({'result': None}))
+        self.pool.run_command(FakeNetwork(), 'ping', None, 'me', '')
+        stats = self.pool.stats()[0]
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_stats_exported_as_metrics(self):
+        completed = metrics.worker_commands.values.get(('0', 'completed'), 0)
+        self.pool._worker_connected(0, FakeConnection({'result': None}))
+        self.pool.run_command(FakeNetwork(), 'ping', None, 'me', '')
+        self.assertEqual(
+            metrics.worker_commands.values[('0', 'completed')],
+            completed + 1)
+        rendered = metrics.registry.render()
+        self.assertIn('akumabot_worker_in_flight{worker="1"} 0.0', rendered)
+        self.assertIn('akumabot_worker_waiting 0.0', rendered)
+
+    def test_least_busy_worker_is_used(self):
+        busy = FakeConnection()
+        busy.callRemote = lambda command_type, **kwargs: defer.Deferred()
+        idle = FakeConnection({'result': None})
+        self.pool._worker_connected(0, busy)
+        self.pool._worker_connected(1, idle)
+        self.pool.run_command(FakeNetwork(), 'ping', None, 'me', '')
+        self.pool.run_command(FakeNetwork(), 'ping', None, 'me', '')
+        self.assertEqual(len(idle.calls), 1)
+
+    def test_transient_replies_survive_the_trip(self):
+        self.pool._worker_connected(0, FakeConnection(
+            {'result': 'busy', 'transient': True}))
+        results = []
+        d = self.pool.run_command(FakeNetwork(), 'calc', None, 'me', '1')
+        d.addCallback(results.append)
+        [result] = results
+        self.assertIsInstance(result, TransientReply)
+
+
+class WorkerSideTestCase(unittest.TestCase):
+    def setUp(self):
+        self.config = process_config_file(StringIO(_config))
+
+    def test_run_command_uses_registry(self):
+        worker = _WorkerAMP(self.config)
+        worker.networks['default'] = RemoteNetwork(
+            FakeConnection(), self.config['networks'][0], worker.commands)
+        results = []
+        d = worker.run_command('default', 'help', None, 'me', 'help')
+        d.addCallback(results.append)
+        self.assertEqual(results, [
+            {'result': 'help [<command>]   '
+                       'Show available, or more info about a specific one '
+                       '(also: commands)',
+             'transient': False}])
+
+    def test_admin_status_comes_from_connection_process(self):
+        worker = _WorkerAMP(self.config)
+        worker.networks['default'] = RemoteNetwork(
+            FakeConnection(), self.config['networks'][0], worker.commands)
+        results = []
+        for admin in (True, False):
+            d = worker.run_command('default', 'help', None, 'me', '', admin)
+            d.addCallback(results.append)
+        self.assertIn('kick', results[0]['result'])
+        self.assertNotIn('kick', results[1]['result'])
+
+    def test_lazy_replies_read_as_far_as_pages_go(self):
+        class ManyLinesCommand(object):
+            name = 'lines'
+            admin_only = False
+            pm_only = False
+            channel_only = False
+            usage = '{0}'
+            cache = None
+
+            def run(self, bot, channel, nickname, command_args):
+                return (str(n) for n in range(1000))
+        worker = _WorkerAMP(self.config)
+        worker.commands.register_class(ManyLinesCommand)
+        worker.networks['default'] = RemoteNetwork(
+            FakeConnection(), self.config['networks'][0], worker.commands)
+        results = []
+        d = worker.run_command('default', 'lines', None, 'me', '')
+        d.addCallback(results.append)
+        self.assertEqual(
+            results[0]['result'].split('\n'), [str(n) for n in range(30)])
+
+    def test_disabled_commands_are_not_available(self):
+        self.config['commands.disabled'] = set(['calc'])
+        worker = _WorkerAMP(self.config)
+        self.assertIsNone(worker.commands.get('calc'))
+        self.assertIsNotNone(worker.commands.get('help'))
+
+    def test_remote_network_forwards_actions(self):
+        connection = FakeConnection({})
+        network = RemoteNetwork(
+            connection, self.config['networks'][0], registry)
+        network.send_private_message('hi', 'me')
+        network.send_private_message('', 'me')
+        self.assertEqual(connection.calls, [
+            (SendPrivateMessage,
+             {'network': 'default', 'message': 'hi', 'nickname': 'me'}),
+        ])
+
+    def test_remote_network_asks_for_next_page(self):
+        connection = FakeConnection({'sent': True})
+        network = RemoteNetwork(
+            connection, self.config['networks'][0], registry)
+        results = []
+        network.send_next_page(None, 'me').addCallback(results.append)
+        self.assertEqual(results, [True])
+        self.assertEqual(connection.calls, [
+            (SendNextPage,
+             {'network': 'default', 'channel': None, 'nickname': 'me'}),
+        ])
+
+    def test_remote_network_asks_about_members(self):
+        connection = FakeConnection({'is_member': True})
+        network = RemoteNetwork(
+            connection, self.config['networks'][0], registry)
+        results = []
+        network.is_member('alice', '#chan').addCallback(results.append)
+        self.assertEqual(results, [True])
+        self.assertEqual(connection.calls, [
+            (IsMember,
+             {'network': 'default', 'nickname': 'alice', 'channel': '#chan'}),
+        ])
+
+    def test_remote_network_asks_when_last_seen(self):
+        results = []
+        for response in ({'nickname': 'alice', 'event': 'quit', 'at': 5.0},
+                         {}):
+            network = RemoteNetwork(
+                FakeConnection(response), self.config['networks'][0],
+                registry)
+            network.last_seen('alice').addCallback(results.append)
+        self.assertEqual(
+            results, [Sighting('alice', None, 'quit', None, 5.0), None])
+
+    def test_remote_network_searches_scrollback(self):
+        connection = FakeConnection({'found': [
+            {'at': 5.0, 'nickname': 'alice', 'message': 'hello'}]})
+        network = RemoteNetwork(
+            connection, self.config['networks'][0], registry)
+        results = []
+        network.search_scrollback('#chan', 'hello', limit=3).addCallback(
+            results.append)
+        self.assertEqual(results, [[(5.0, 'alice', 'hello')]])
@@ -0,0 +1,156 @@
+"""
+Case-insensitive time zone lookup by name, city or abbreviation, with
+suggestions for names that don't match anything.
+"""
+import threading
+from collections import defaultdict
+
+import pytz
+from twisted.internet import threads
+
+from akumabot.fuzzy import SuggestionIndex
+
+
+# Common abbreviations that aren't pytz zone names, or that several
+# zones share, mapped to the zone people usually mean by them.
+_abbreviations = {
+    'edt': 'America/New_York',
+    'cdt': 'America/Chicago',
+    'cst': 'America/Chicago',
+    'mdt': 'America/Denver',
+    'pst': 'America/Los_Angeles',
+    'pdt': 'America/Los_Angeles',
+    'akst': 'America/Anchorage',
+    'akdt': 'America/Anchorage',
+    'ast': 'America/Halifax',
+    'adt': 'America/Halifax',
+    'nst': 'America/St_Johns',
+    'ndt': 'America/St_Johns',
+    'brt': 'America/Sao_Paulo',
+    'art': 'America/Argentina/Buenos_Aires',
+    'bst': 'Europe/London',
+    'ist': 'Asia/Kolkata',
+    'cest': 'Europe/Paris',
+    'eest': 'Europe/Helsinki',
+    'west': 'Europe/Lisbon',
+    'msk': 'Europe/Moscow',
+    'sast': 'Africa/Johannesburg',
+    'cat': 'Africa/Maputo',
+    'eat': 'Africa/Nairobi',
+    'wat': 'Africa/Lagos',
+    'pkt': 'Asia/Karachi',
+    'wib': 'Asia/Jakarta',
+    'hkt': 'Asia/Hong_Kong',
+    'sgt': 'Asia/Singapore',
+    'jst': 'Asia/Tokyo',
+    'kst': 'Asia/Seoul',
+    'awst': 'Australia/Perth',
+    'acst': 'Australia/Adelaide',
+    'acdt': 'Australia/Adelaide',
+    'aest': 'Australia/Sydney',
+    'aedt': 'Australia/Sydney',
+    'nzst': 'Pacific/Auckland',
+    'nzdt': 'Pacific/Auckland',
+}
+
+
+def _zone_abbreviations(zone):
+    """
+    Return the alphabetic abbreviations (like 'CET') a pytz zone uses.
+    """
+    tzinfos = getattr(zone, '_tzinfos', None)
+    if tzinfos is None:
+        names = [zone.tzname(None)]
+    else:
+        names = [tzname for _, _, tzname in tzinfos]
+    return set(name for name in names if name and name.isalpha())
+
+
+class TimezoneIndex(object):
+    """
+    Maps lowercased zone names, cities (the last part of a zone name)
+    and abbreviations to pytz zone names.
+
+    Building the index loads every zone, so it takes a while; see
+    `preload`.
+    """
+    def __init__(self, zone_names=pytz.all_timezones,
+                 preferred_zone_names=pytz.common_timezones):
+        zone_names = set(zone_names)
+        preferred = set(preferred_zone_names)
+        self._names = {}
+        self._zones = {}
+        self.suggestions = SuggestionIndex()
+
+        cities = defaultdict(set)
+        abbreviations = defaultdict(set)
+        for name in zone_names:
+            self.suggestions.add(name.lower(), name)
+            city = name.rpartition('/')[2].lower()
+            if city != name.lower():
+                cities[city].add(name)
+            if name in preferred:
+                for abbreviation in _zone_abbreviations(pytz.timezone(name)):
+                    abbreviations[abbreviation.lower()].add(name)
+
+        # Later sources override earlier ones: abbreviations found in the
+        # zone data, then cities, then curated abbreviations, then names.
+        for key, names in abbreviations.items():
+            self._add_unambiguous(key, names, preferred)
+        for key, names in cities.items():
+            if self._add_unambiguous(key, names, preferred):
+                self.suggestions.add(key, self._names[key])
+        for key, name in _abbreviations.items():
+            if name in zone_names:
+                self._names[key] = name
+        for name in zone_names:
+            self._names[name.lower()] = name
+
+    def _add_unambiguous(self, key, names, preferred):
+        if len(names) > 1:
+            names = names & preferred
+        if len(names) != 1:
+            return False
+        [self._names[key]] = names
+        return True
+
+    def lookup(self, name):
+        """
+        Return the pytz zone for ``name``, or None if it is unknown.
+        """
+        zone_name = self._names.get(name.lower().replace(' ', '_'))
+        if zone_name is None:
+            return None
+        zone = self._zones.get(zone_name)
+        if zone is None:
+            zone = self._zones[zone_name] = pytz.timezone(zone_name)
+        return zone
+
+    def suggest(self, name, limit=3):
+        """
+        Return up to ``limit`` zone names close to ``name``.
+        """
+        return self.suggestions.suggest(
+            name.lower().replace(' ', '_'), limit)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = TimezoneIndex()
+    return _index
+
+
+def preload():
+    """
+    Build the shared index in a thread, so the first ``time`` command
+    doesn't have to wait for it.
+
+    :returns: A Deferred that fires with the index.
+    """
+    return threads.deferToThread(get_index)
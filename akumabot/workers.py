@@ -0,0 +1,624 @@
+"""
+Run commands in a pool of worker processes instead of the process that
+holds the IRC connections.
+
+The connection process listens on a UNIX socket and spawns workers
+(``python -m akumabot.workers``), which connect back and speak AMP. The
+connection process sends `RunCommand`; workers call back with the other
+commands here to act on the network a command came from.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from twisted.internet import defer, endpoints, protocol, task
+from twisted.protocols import amp
+from twisted.python import log
+
+from akumabot import metrics
+from akumabot.activity import Sighting
+from akumabot.arguments import ArgumentError
+from akumabot.commands import (
+    TransientReply, configured_commands, parse_arguments
+)
+from akumabot.config import process_config_file
+from akumabot.membership import irc_lower
+from akumabot.paging import join_chunks
+
+
+class Hello(amp.Command):
+    arguments = [('worker_id', amp.Integer())]
+    response = []
+
+
+class RunCommand(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('command', amp.String()),
+        ('channel', amp.String(optional=True)),
+        ('nickname', amp.String()),
+        ('argstring', amp.String()),
+        ('admin', amp.Boolean(optional=True)),
+    ]
+    response = [
+        ('result', amp.String(optional=True)),
+        ('transient', amp.Boolean(optional=True)),
+    ]
+
+
+class SendPrivateMessage(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('message', amp.String(optional=True)),
+        ('nickname', amp.String()),
+    ]
+    response = []
+
+
+class SendChannelMessage(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('message', amp.String(optional=True)),
+        ('channel', amp.String()),
+        ('nick', amp.String(optional=True)),
+    ]
+    response = []
+
+
+class JoinChannel(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('channel', amp.String()),
+        ('key', amp.String(optional=True)),
+    ]
+    response = []
+
+
+class LeaveChannel(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('channel', amp.String()),
+        ('message', amp.String(optional=True)),
+    ]
+    response = []
+
+
+class KickUser(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('channel', amp.String()),
+        ('user', amp.String()),
+        ('reason', amp.String(optional=True)),
+    ]
+    response = []
+
+
+class IsMember(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('nickname', amp.String()),
+        ('channel', amp.String()),
+    ]
+    response = [('is_member', amp.Boolean())]
+
+
+class LastSeen(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('nickname', amp.String()),
+    ]
+    # All missing if the nick hasn't been seen.
+    response = [
+        ('nickname', amp.String(optional=True)),
+        ('channel', amp.String(optional=True)),
+        ('event', amp.String(optional=True)),
+        ('message', amp.String(optional=True)),
+        ('at', amp.Float(optional=True)),
+    ]
+
+
+class SearchScrollback(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('channel', amp.String()),
+        ('query', amp.String()),
+        ('since', amp.Float(optional=True)),
+        ('limit', amp.Integer()),
+    ]
+    response = [
+        ('found', amp.AmpList([
+            ('at', amp.Float()),
+            ('nickname', amp.String()),
+            ('message', amp.String()),
+        ])),
+    ]
+
+
+class SendNextPage(amp.Command):
+    arguments = [
+        ('network', amp.String()),
+        ('channel', amp.String(optional=True)),
+        ('nickname', amp.String()),
+    ]
+    response = [('sent', amp.Boolean())]
+
+
+class Disconnect(amp.Command):
+    arguments = [('network', amp.String())]
+    response = []
+
+
+class _PoolAMP(amp.AMP):
+    """
+    The connection process's end of the connection to one worker.
+    """
+    def __init__(self, pool):
+        amp.AMP.__init__(self)
+        self.pool = pool
+        self.worker = None
+
+    @Hello.responder
+    def hello(self, worker_id):
+        self.worker = self.pool._worker_connected(worker_id, self)
+        return {}
+
+    def connectionLost(self, reason):
+        amp.AMP.connectionLost(self, reason)
+        if self.worker is not None:
+            self.pool._worker_disconnected(self.worker)
+
+    def _network(self, name):
+        return self.pool.bot.networks[name]
+
+    @SendPrivateMessage.responder
+    def send_private_message(self, network, message, nickname):
+        self._network(network).send_private_message(message, nickname)
+        return {}
+
+    @SendChannelMessage.responder
+    def send_channel_message(self, network, message, channel, nick):
+        self._network(network).send_channel_message(message, channel, nick)
+        return {}
+
+    @JoinChannel.responder
+    def join_channel(self, network, channel, key):
+        self._network(network).join_channel(channel, key)
+        return {}
+
+    @LeaveChannel.responder
+    def leave_channel(self, network, channel, message):
+        self._network(network).leave_channel(channel, message)
+        return {}
+
+    @KickUser.responder
+    def kick_user(self, network, channel, user, reason):
+        self._network(network).kick_user(channel, user, reason)
+        return {}
+
+    @IsMember.responder
+    def is_member(self, network, nickname, channel):
+        return {
+            'is_member': self._network(network).is_member(nickname, channel),
+        }
+
+    @LastSeen.responder
+    def last_seen(self, network, nickname):
+        d = self._network(network).last_seen(nickname)
+        d.addCallback(
+            lambda sighting: {} if sighting is None else dict(
+                (name, getattr(sighting, name))
+                for name in Sighting.__slots__))
+        return d
+
+    @SearchScrollback.responder
+    def search_scrollback(self, network, channel, query, since, limit):
+        found = self._network(network).search_scrollback(
+            channel, query, since, limit)
+        return {'found': [
+            {'at': at, 'nickname': nickname, 'message': message}
+            for at, nickname, message in found]}
+
+    @SendNextPage.responder
+    def send_next_page(self, network, channel, nickname):
+        return {
+            'sent': self._network(network).send_next_page(channel, nickname),
+        }
+
+    @Disconnect.responder
+    def disconnect(self, network):
+        self._network(network).disconnect()
+        return {}
+
+
+class _WorkerProcess(protocol.ProcessProtocol):
+    def __init__(self, pool, worker):
+        self.pool = pool
+        self.worker = worker
+
+    def outReceived(self, data):
+        self.errReceived(data)
+
+    def errReceived(self, data):
+        for line in data.splitlines():
+            log.msg('[worker {0}] {1}'.format(self.worker.worker_id, line))
+
+    def processEnded(self, reason):
+        self.pool._worker_ended(self.worker, reason)
+
+
+class Worker(object):
+    """
+    Book-keeping for one worker process, which survives respawns.
+    """
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.connection = None
+        self.started = None
+        self.restarts = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+
+    def stats(self):
+        return {
+            'worker_id': self.worker_id,
+            'pid': self.process.pid if self.process else None,
+            'connected': self.connection is not None,
+            'uptime': time.time() - self.started if self.started else 0.0,
+            'restarts': self.restarts,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'busy_time': self.busy_time,
+        }
+
+
+class WorkersUnavailable(Exception):
+    """
+    No worker was connected to run a command in time, or too many
+    commands were already waiting for one.
+    """
+
+
+class WorkerPool(object):
+    """
+    Runs commands for ``bot`` in ``size`` worker processes, respawning
+    any that exit.
+
+    While no worker is connected, e.g. while they keep crashing, up to
+    ``max_waiting`` commands wait up to ``wait_timeout`` seconds for
+    one; others are answered that the bot is busy.
+
+    :param config_path:
+        The config file the workers should read.
+    :param socket_path:
+        Where to listen for workers, or None for a temporary path.
+    """
+    respawn_delay = 1.0
+
+    def __init__(self, bot, reactor, size, config_path, socket_path=None,
+                 max_waiting=100, wait_timeout=10.0):
+        self.bot = bot
+        self.reactor = reactor
+        self.config_path = config_path
+        if not socket_path:
+            socket_path = os.path.join(
+                tempfile.gettempdir(),
+                'akumabot-workers-{0}.sock'.format(os.getpid()))
+        self.socket_path = socket_path
+        self.workers = [Worker(worker_id) for worker_id in range(size)]
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        # (Deferred, timeout call) for each command waiting for a worker
+        self._waiting = []
+        self._stopping = False
+        self._port = None
+        metrics.registry.gauge(
+            'akumabot_worker_in_flight',
+            'Commands being run by each worker.', ('worker',),
+            lambda: [
+                ((str(worker.worker_id),), worker.in_flight)
+                for worker in self.workers])
+        metrics.registry.gauge(
+            'akumabot_worker_waiting',
+            'Commands waiting for a worker to connect.', (),
+            lambda: [((), len(self._waiting))])
+
+    @classmethod
+    def from_config(cls, bot, reactor, config):
+        return cls(
+            bot, reactor, config['workers.count'], config['config.path'],
+            config['workers.socket'], config['workers.max_waiting'],
+            config['workers.wait_timeout'])
+
+    @defer.inlineCallbacks
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        endpoint = endpoints.UNIXServerEndpoint(
+            self.reactor, self.socket_path, mode=0o600)
+        factory = protocol.Factory.forProtocol(lambda: _PoolAMP(self))
+        self._port = yield endpoint.listen(factory)
+        self.reactor.addSystemEventTrigger('before', 'shutdown', self.stop)
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def stop(self):
+        self._stopping = True
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.signalProcess('TERM')
+        if self._port is not None:
+            return self._port.stopListening()
+
+    def stats(self):
+        return [worker.stats() for worker in self.workers]
+
+    def run_command(self, network, command_name, channel, nickname,
+                    argstring, admin=False):
+        """
+        Run a command in the least busy worker, which parses
+        ``argstring`` again itself.
+
+        :param admin: Whether ``nickname`` has been found to be an admin.
+        :returns: A Deferred that fires with the command's response.
+        """
+        d = self._get_worker()
+        d.addCallback(
+            self._call, network, command_name, channel, nickname,
+            argstring, admin)
+        d.addErrback(self._unavailable)
+        return d
+
+    def _get_worker(self):
+        connected = [w for w in self.workers if w.connection is not None]
+        if connected:
+            return defer.succeed(min(connected, key=lambda w: w.in_flight))
+        if len(self._waiting) >= self.max_waiting:
+            return defer.fail(WorkersUnavailable())
+        d = defer.Deferred()
+        entry = (d, self.reactor.callLater(
+            self.wait_timeout, self._wait_timed_out, d))
+        self._waiting.append(entry)
+        return d
+
+    def _wait_timed_out(self, d):
+        self._waiting = [
+            entry for entry in self._waiting if entry[0] is not d]
+        d.errback(WorkersUnavailable())
+
+    def _unavailable(self, failure):
+        failure.trap(WorkersUnavailable)
+        return TransientReply(
+            "I'm too busy to run that right now, try again later")
+
+    def _call(self, worker, network, command_name, channel, nickname,
+              argstring, admin):
+        worker.in_flight += 1
+        worker_label = str(worker.worker_id)
+        started = time.time()
+        d = worker.connection.callRemote(
+            RunCommand, network=network.name, command=command_name,
+            channel=channel, nickname=nickname, argstring=argstring,
+            admin=admin)
+
+        def succeeded(response):
+            worker.completed += 1
+            metrics.worker_commands.inc(worker_label, 'completed')
+            if response.get('transient'):
+                return TransientReply(response['result'])
+            return response['result']
+
+        def failed(failure):
+            worker.failed += 1
+            metrics.worker_commands.inc(worker_label, 'failed')
+            return failure
+
+        def finished(result):
+            worker.in_flight -= 1
+            busy_time = time.time() - started
+            worker.busy_time += busy_time
+            metrics.worker_busy_time.add(busy_time, worker_label)
+            return result
+        d.addCallbacks(succeeded, failed)
+        d.addBoth(finished)
+        return d
+
+    def _spawn(self, worker):
+        if self._stopping:
+            return
+        args = [
+            sys.executable, '-m', 'akumabot.workers',
+            self.socket_path, self.config_path, str(worker.worker_id),
+        ]
+        worker.process = self.reactor.spawnProcess(
+            _WorkerProcess(self, worker), sys.executable, args,
+            env=os.environ)
+        worker.started = time.time()
+
+    def _worker_connected(self, worker_id, connection):
+        worker = self.workers[worker_id]
+        worker.connection = connection
+        log.msg('Worker {0} connected'.format(worker_id))
+        waiting, self._waiting = self._waiting, []
+        for d, timeout in waiting:
+            timeout.cancel()
+            d.callback(worker)
+        return worker
+
+    def _worker_disconnected(self, worker):
+        worker.connection = None
+
+    def _worker_ended(self, worker, reason):
+        log.msg('Worker {0} ended: {1}'.format(
+            worker.worker_id, reason.getErrorMessage()))
+        worker.process = None
+        worker.started = None
+        if not self._stopping:
+            worker.restarts += 1
+            metrics.worker_restarts.inc(str(worker.worker_id))
+            self.reactor.callLater(self.respawn_delay, self._spawn, worker)
+
+
+class RemoteNetwork(object):
+    """
+    Stands in for a `akumabot.bot.Network` inside a worker, forwarding
+    actions to the connection process.
+    """
+    def __init__(self, connection, config, commands):
+        self.connection = connection
+        self.config = config
+        self.commands = commands
+        self.name = config['network.name']
+        self.nickname = config['akumabot.nickname']
+        self.admins = config['akumabot.admins']
+        # Nicks the connection process last said were admins.
+        self._admins_seen = set()
+
+    def is_admin(self, nickname):
+        return irc_lower(nickname) in self._admins_seen
+
+    def admin_checked(self, nickname, admin):
+        if admin:
+            self._admins_seen.add(irc_lower(nickname))
+        else:
+            self._admins_seen.discard(irc_lower(nickname))
+
+    def _call(self, command, **kwargs):
+        d = self.connection.callRemote(command, network=self.name, **kwargs)
+        d.addErrback(log.err)
+        return d
+
+    def disconnect(self):
+        return self._call(Disconnect)
+
+    def leave_channel(self, channel, message=None):
+        return self._call(LeaveChannel, channel=channel, message=message)
+
+    def join_channel(self, channel, key=None):
+        return self._call(JoinChannel, channel=channel, key=key)
+
+    def send_private_message(self, message, nickname):
+        if not message:
+            return
+        return self._call(
+            SendPrivateMessage, message=message, nickname=nickname)
+
+    def send_channel_message(self, message, channel, nick=None):
+        if not message:
+            return
+        return self._call(
+            SendChannelMessage, message=message, channel=channel, nick=nick)
+
+    def kick_user(self, channel, user, reason=None):
+        return self._call(KickUser, channel=channel, user=user, reason=reason)
+
+    def send_next_page(self, channel, nickname):
+        d = self.connection.callRemote(
+            SendNextPage, network=self.name, channel=channel,
+            nickname=nickname)
+        d.addCallback(lambda response: response['sent'])
+        return d
+
+    def is_member(self, nickname, channel):
+        d = self.connection.callRemote(
+            IsMember, network=self.name, nickname=nickname, channel=channel)
+        d.addCallback(lambda response: response['is_member'])
+        return d
+
+    def last_seen(self, nickname):
+        d = self.connection.callRemote(
+            LastSeen, network=self.name, nickname=nickname)
+        d.addCallback(
+            lambda response: Sighting(*[
+                response.get(name) for name in Sighting.__slots__])
+            if response.get('nickname') else None)
+        return d
+
+    def search_scrollback(self, channel, query, since=None, limit=10):
+        d = self.connection.callRemote(
+            SearchScrollback, network=self.name, channel=channel,
+            query=query, since=since, limit=limit)
+        d.addCallback(lambda response: [
+            (line['at'], line['nickname'], line['message'])
+            for line in response['found']])
+        return d
+
+
+class _WorkerAMP(amp.AMP):
+    """
+    A worker's end of its connection to the connection process.
+    """
+    def __init__(self, config):
+        amp.AMP.__init__(self)
+        self.config = config
+        self.commands = configured_commands(config)
+        self.networks = {}
+        self.disconnected = defer.Deferred()
+
+    def connectionMade(self):
+        amp.AMP.connectionMade(self)
+        for netconfig in self.config['networks']:
+            network = RemoteNetwork(self, netconfig, self.commands)
+            self.networks[network.name] = network
+
+    def connectionLost(self, reason):
+        amp.AMP.connectionLost(self, reason)
+        self.disconnected.callback(None)
+
+    @RunCommand.responder
+    def run_command(self, network, command, channel, nickname, argstring,
+                    admin=False):
+        network = self.networks[network]
+        network.admin_checked(nickname, admin)
+        command = self.commands.get(command)
+        try:
+            args = parse_arguments(command, argstring)
+        except ArgumentError as e:
+            return {'result': str(e), 'transient': False}
+        d = defer.maybeDeferred(
+            command.run, network, channel, nickname, args)
+        d.addCallback(lambda result: {
+            'result': self._materialize(result),
+            'transient': isinstance(result, TransientReply),
+        })
+        return d
+
+    def _materialize(self, result):
+        """
+        Read a reply given as an iterable of strings, which can't be
+        sent back as it is, as far as its pages could go.
+        """
+        if result is None or isinstance(result, basestring):
+            return result
+        max_lines = (self.config['replies.max_lines'] *
+                     self.config['replies.max_pages'])
+        # No more than that many lines of a server's 512 bytes each
+        # could be sent, which also keeps it within what AMP can carry.
+        return join_chunks(result, max_lines)[:max_lines * 512]
+
+
+def _run_worker(reactor, config, socket_path, worker_id):
+    endpoint = endpoints.UNIXClientEndpoint(reactor, socket_path)
+    d = endpoints.connectProtocol(endpoint, _WorkerAMP(config))
+
+    def connected(connection):
+        hello = connection.callRemote(Hello, worker_id=worker_id)
+        hello.addCallback(lambda _: connection.disconnected)
+        return hello
+    d.addCallback(connected)
+    return d
+
+
+def _worker_main(socket_path, config_path, worker_id):
+    log.startLogging(sys.stderr)
+    with open(config_path, 'rb') as f:
+        config = process_config_file(f)
+    task.react(_run_worker, [config, socket_path, worker_id])
+
+
+if __name__ == '__main__':
+    _worker_main(sys.argv[1], sys.argv[2], int(sys.argv[3]))
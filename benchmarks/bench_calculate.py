@@ -0,0 +1,67 @@
+"""
+Replay a channel-like mix of ``calc`` expressions through the plain
+parsley grammar and through the cached `calculate_expression`.
+
+Run with ``python -m benchmarks.bench_calculate``.
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+from akumabot import calculate
+
+
+_popular = [
+    '1 + 1',
+    '2 * 3',
+    '(1 + 2) * 3',
+    '5 / 2',
+    '1e3 * 1.5',
+    '365 * 24',
+    '60 * 60 * 24',
+    '(100 - 32) * 5 / 9',
+    '3.14159 * 2',
+    '1024 * 1024',
+]
+
+
+def make_replay(count, unique_ratio, seed=1):
+    rand = random.Random(seed)
+    replay = []
+    for i in range(count):
+        if rand.random() < unique_ratio:
+            replay.append('{0} * ({1} + {2})'.format(
+                i, rand.randint(1, 1000), rand.random()))
+        else:
+            replay.append(rand.choice(_popular))
+    return replay
+
+
+def run_uncached(replay):
+    for expression in replay:
+        calculate.grammar(expression).expr()
+
+
+def run_cached(replay):
+    calculate.clear_caches()
+    for expression in replay:
+        calculate.calculate_expression(expression)
+
+
+def main(count=5000, unique_ratio=0.2, repeat=3):
+    replay = make_replay(count, unique_ratio)
+    print('{0} expressions, {1:.0%} unique'.format(count, unique_ratio))
+    for label, func in [('uncached', run_uncached), ('cached', run_cached)]:
+        best = min(timeit.repeat(
+            lambda: func(replay), number=1, repeat=repeat))
+        print('{0:>10}: {1:8.4f}s  {2:10.0f} expr/s'.format(
+            label, best, count / best))
+    stats = calculate.cache_stats()
+    for level in ('result', 'compiled'):
+        print('{0:>10} cache: {1[hits]} hits, {1[misses]} misses'.format(
+            level, stats[level]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Compare how fast each calculator engine parses expressions, bypassing
+the expression caches.
+
+Run with ``python -m benchmarks.bench_calculate_engines``.
+"""
+from __future__ import print_function
+
+import timeit
+
+from akumabot import calculate
+
+
+_expressions = [
+    '1 + 1',
+    '(100 - 32) * 5 / 9',
+    '1.5e3 * (2 - 0.25) / 7 + 3 * (4 - (5 + 6 * (7 - 8)))',
+    ' + '.join(str(n) for n in range(50)),
+]
+
+
+def main(number=500, repeat=3):
+    for expression in _expressions:
+        print(expression if len(expression) < 50 else expression[:47] + '...')
+        timings = {}
+        for engine, parse in sorted(calculate.engines.items()):
+            best = min(timeit.repeat(
+                lambda: parse(expression), number=number, repeat=repeat))
+            timings[engine] = best
+            print('    {0:>8}: {1:8.1f} us/parse'.format(
+                engine, best / number * 1e6))
+        print('    speedup: {0:.1f}x'.format(
+            timings['parsley'] / timings['pratt']))
+
+
+if __name__ == '__main__':
+    main()
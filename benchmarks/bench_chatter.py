@@ -0,0 +1,116 @@
+"""
+Replay a synthetic channel log through `AkumaBotProtocol.privmsg` and
+report how many lines per second reach the end of command processing,
+with and without the non-command fast path.
+
+Run with ``python -m benchmarks.bench_chatter``.
+"""
+from __future__ import print_function
+
+import random
+import timeit
+from StringIO import StringIO
+
+from twisted.python import log
+
+from akumabot.bot import AkumaBot
+from akumabot.commands import CommandProcessor
+from akumabot.config import process_config_file
+from akumabot.events import EventBus
+from akumabot.proto import AkumaBotProtocol
+
+
+_words = (
+    'the a to is it that you and of in i for this on lol what have with '
+    'just not but be so can do are was if no yes ok like think know get '
+    'python twisted irc bot server channel code bug fix test http://x.org'
+).split()
+
+_commands = ['ping', 'help', 'calc 1 + 2', 'time now UTC', 'help calc']
+
+
+def make_log(count, nickname, command_ratio=0.01, seed=1):
+    rand = random.Random(seed)
+    nicks = ['user{0}'.format(n) for n in range(200)]
+    lines = []
+    for _ in range(count):
+        hostmask = '{0}!~{0}@host-{1}.example.com'.format(
+            rand.choice(nicks), rand.randint(0, 999))
+        if rand.random() < command_ratio:
+            message = '{0}: {1}'.format(nickname, rand.choice(_commands))
+        else:
+            message = ' '.join(
+                rand.choice(_words) for _ in range(rand.randint(1, 15)))
+            if rand.random() < 0.05:
+                message = rand.choice(nicks) + ': ' + message
+        lines.append((hostmask, '#channel{0}'.format(rand.randint(0, 9)),
+                      message))
+    return lines
+
+
+class _LegacyProtocol(AkumaBotProtocol):
+    def _debug(self, message):
+        if self.debug:
+            log.msg('DEBUG ' + message)
+
+    def privmsg(self, user, channel, message):
+        self._debug(
+            'Received message from user {0!r}, channel {1!r}: {2!r}'.format(
+                user, channel, message))
+        nickname, _, host = user.partition('!')
+        message = message.strip()
+        if channel == self.nickname:
+            self.bot.received_private_message(nickname, message)
+        else:
+            self.bot.received_message(nickname, channel, message)
+
+
+class _LegacyCommandProcessor(CommandProcessor):
+    def process_message(self, network, nickname, channel, message):
+        command_string = self._detect_command(message)
+        if not command_string:
+            return
+        command, argstring = self._split_command(command_string)
+        self.run_command(network, command, channel, nickname, argstring)
+
+
+_config = """
+[akumabot]
+nickname = akumabot
+password = secret
+channels = #channel0
+admins = admin
+"""
+
+
+def _make_protocol(protocol_class, processor_class):
+    bot = AkumaBot(process_config_file(StringIO(_config)))
+    processor = processor_class(bot)
+    processor.run_command = lambda *args: None
+    bot.events = EventBus()
+    processor.add_listeners()
+    protocol = protocol_class('akumabot', None, False)
+    bot.networks['default'].got_protocol(protocol)
+    return protocol
+
+
+def main(count=200000, repeat=3):
+    lines = make_log(count, 'akumabot')
+    print('{0} lines, {1} commands'.format(
+        count, sum(1 for line in lines if line[2].startswith('akumabot'))))
+    setups = [
+        ('before', _LegacyProtocol, _LegacyCommandProcessor),
+        ('after', AkumaBotProtocol, CommandProcessor),
+    ]
+    for label, protocol_class, processor_class in setups:
+        privmsg = _make_protocol(protocol_class, processor_class).privmsg
+
+        def replay():
+            for user, channel, message in lines:
+                privmsg(user, channel, message)
+        best = min(timeit.repeat(replay, number=1, repeat=repeat))
+        print('{0:>7}: {1:10.0f} lines/s'.format(label, count / best))
+
+
+if __name__ == '__main__':
+    main()
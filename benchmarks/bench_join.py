@@ -0,0 +1,78 @@
+"""
+Time from connecting to a local fake IRC server to being in every
+channel, and to being back in them after the connection drops.
+
+The bot's outbound pacing is left at its defaults, so this shows how
+long a large channel list takes under the flood limits it would use on
+a real network. Before JOINs were packed, each channel took a line of
+its own.
+
+Run with ``python -m benchmarks.bench_join [channels]``.
+"""
+from __future__ import print_function
+
+import sys
+from StringIO import StringIO
+
+from twisted.internet import defer, task
+
+from akumabot import fakeircd
+from akumabot.bot import AkumaBot
+from akumabot.config import process_config_file
+from benchmarks.loadtest import _wait_until
+
+
+_config = """
+[akumabot]
+nickname = akumabot
+password =
+channels = {channels}
+admins = admin
+endpoint = tcp:host=127.0.0.1:port={port}
+"""
+
+
+@defer.inlineCallbacks
+def main(reactor, channels='500'):
+    channels = ['#channel{0:04d}'.format(n) for n in range(int(channels))]
+    server, port = yield fakeircd.listen(reactor)
+    config = process_config_file(StringIO(_config.format(
+        channels=' '.join(channels), port=port.getHost().port)))
+    bot = AkumaBot(config)
+    network = bot.networks['default']
+    joins = []
+
+    def count_joins(connection, command, params):
+        if command == 'JOIN':
+            joins.append(params[0])
+    server.observers.append(count_joins)
+
+    def in_channels(count):
+        connection = server.users.get('akumabot')
+        return connection is not None and len(connection.joined) == count
+
+    started = reactor.seconds()
+    bot.main(reactor)
+    yield _wait_until(reactor, lambda: in_channels(len(channels)), 600)
+    print('{0} channels joined in {1:.2f}s with {2} JOIN lines'.format(
+        len(channels), reactor.seconds() - started, len(joins)))
+
+    network.join_channel('#runtime')
+    yield _wait_until(reactor, lambda: in_channels(len(channels) + 1), 60)
+    del joins[:]
+    dropped = reactor.seconds()
+    server.users['akumabot'].transport.loseConnection()
+    yield _wait_until(reactor, lambda: 'akumabot' not in server.users, 60)
+    yield _wait_until(reactor, lambda: 'akumabot' in server.users, 600)
+    reconnected = reactor.seconds()
+    yield _wait_until(reactor, lambda: in_channels(len(channels) + 1), 600)
+    print('{0} channels rejoined in {1:.2f}s with {2} JOIN lines, after '
+          'reconnecting in {3:.2f}s'.format(
+              len(channels) + 1, reactor.seconds() - reconnected, len(joins),
+              reconnected - dropped))
+    network.disconnect()
+    yield port.stopListening()
+
+
+if __name__ == '__main__':
+    task.react(main, sys.argv[1:])
@@ -0,0 +1,68 @@
+"""
+Replay a synthetic channel log through `AkumaBotProtocol.privmsg` with
+debug logging off, on, and on with sampling, to see what the protocol's
+debug logging costs.
+
+The "eager" case formats every debug line before checking the flag, as
+the protocol used to.
+
+Run with ``python -m benchmarks.bench_logging``.
+"""
+from __future__ import print_function
+
+import os
+import timeit
+
+from twisted.logger import (
+    FilteringLogObserver, Logger, textFileLogObserver
+)
+
+from akumabot.commands import CommandProcessor
+from akumabot.logfilter import EventTypeFilter
+from akumabot.proto import AkumaBotProtocol
+from benchmarks.bench_chatter import _make_protocol, make_log
+
+
+class _EagerProtocol(AkumaBotProtocol):
+    def privmsg(self, user, channel, message):
+        debug = 'Received message from user {0!r}, channel {1!r}: {2!r}'
+        debug = debug.format(user, channel, message)
+        if self.debug:
+            self.log.debug(debug)
+        nickname, _, host = user.partition('!')
+        message = message.strip()
+        if channel == self.nickname:
+            self.bot.received_private_message(nickname, message)
+        else:
+            self.bot.received_message(nickname, channel, message)
+
+
+def main(count=100000, repeat=3):
+    lines = make_log(count, 'akumabot')
+    devnull = open(os.devnull, 'w')
+    output = textFileLogObserver(devnull)
+    sampled = FilteringLogObserver(
+        output, [EventTypeFilter({'privmsg': 0.01})])
+    setups = [
+        ('eager, debug off', _EagerProtocol, False, output),
+        ('debug off', AkumaBotProtocol, False, output),
+        ('debug on', AkumaBotProtocol, True, output),
+        ('debug on, 1% sampled', AkumaBotProtocol, True, sampled),
+    ]
+    print('{0} lines'.format(count))
+    for label, protocol_class, debug, observer in setups:
+        protocol = _make_protocol(protocol_class, CommandProcessor)
+        protocol.debug = debug
+        protocol.log = Logger(observer=observer)
+        privmsg = protocol.privmsg
+
+        def replay():
+            for user, channel, message in lines:
+                privmsg(user, channel, message)
+        best = min(timeit.repeat(replay, number=1, repeat=repeat))
+        print('{0:>22}: {1:10.0f} lines/s'.format(label, count / best))
+    devnull.close()
+
+
+if __name__ == '__main__':
+    main()
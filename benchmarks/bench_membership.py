@@ -0,0 +1,104 @@
+"""
+Time filling `akumabot.membership.MembershipIndex` from NAMES replies,
+a netsplit taking half the users out and the same users rejoining, and
+lookups; and estimate the index's memory use.
+
+The network has one huge channel that every user is in and a number of
+smaller ones that some of them are also in, like a large project
+channel and its topic channels.
+
+Run with ``python -m benchmarks.bench_membership [users]``.
+"""
+from __future__ import print_function
+
+import random
+import sys
+import time
+
+from akumabot.membership import MembershipIndex
+
+
+def _size(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _size(key, seen) + _size(value, seen)
+    elif isinstance(obj, (set, list, tuple)):
+        for item in obj:
+            size += _size(item, seen)
+    return size
+
+
+def index_size(index):
+    seen = set()
+    return sum(
+        _size(container, seen) for container in (
+            index._channels, index._nick_channels, index._names))
+
+
+def _timed(label, func, operations):
+    started = time.time()
+    func()
+    elapsed = time.time() - started
+    print('{0:>22}: {1:7.3f}s  {2:8.0f} ns/op'.format(
+        label, elapsed, elapsed / operations * 1e9))
+
+
+def main(users='50000', small_channels=50, seed=1):
+    users = int(users)
+    rand = random.Random(seed)
+    nicks = ['User{0}'.format(n) for n in range(users)]
+    channels = {'#project': nicks}
+    for n in range(small_channels):
+        channels['#topic{0}'.format(n)] = rand.sample(nicks, users // 100)
+    memberships = sum(len(members) for members in channels.values())
+    index = MembershipIndex()
+
+    def fill():
+        for channel, members in channels.items():
+            # 40 names to a 353 line, some of them with a status prefix.
+            for start in range(0, len(members), 40):
+                index.names_reply(channel, [
+                    ('@' if n % 97 == 0 else '') + nick
+                    for n, nick in enumerate(members[start:start + 40])])
+            index.end_of_names(channel)
+    _timed('fill from NAMES', fill, memberships)
+    size = index_size(index)
+    print('{0:>22}: {1:7.1f} MiB  {2:8.1f} bytes/membership'.format(
+        'memory', size / 1048576.0, float(size) / memberships))
+
+    split = rand.sample(nicks, users // 2)
+    where = {}
+
+    def netsplit():
+        for nick in split:
+            where[nick] = index.quit(nick)
+    _timed('netsplit quits', netsplit, len(split))
+
+    def rejoin():
+        for nick in split:
+            for channel in where[nick]:
+                index.add(nick, channel)
+    _timed('rejoins', rejoin, sum(len(c) for c in where.values()))
+
+    lookups = [(rand.choice(nicks), rand.choice(list(channels)))
+               for _ in range(200000)]
+
+    def is_member():
+        for nick, channel in lookups:
+            index.is_member(nick, channel)
+    _timed('is_member', is_member, len(lookups))
+
+    def channels_of():
+        for nick, _ in lookups:
+            index.channels(nick)
+    _timed('channels', channels_of, len(lookups))
+    print('{0} users, {1} channels, {2} memberships'.format(
+        users, len(channels), memberships))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,33 @@
+"""
+Measure what instrumentation costs on the hot paths: counting an inbound
+line and recording a command's latency.
+
+Run with ``python -m benchmarks.bench_metrics``.
+"""
+from __future__ import print_function
+
+import timeit
+
+from akumabot import metrics
+
+
+def main(count=1000000, repeat=3):
+    registry = metrics.Registry()
+    counter = registry.counter('lines_total', 'Lines.', ('network', 'type'))
+    histogram = registry.histogram('latency', 'Latency.', ('command',))
+    cases = [
+        ('noop', lambda: None),
+        ('counter', lambda: counter.inc('default', 'PRIVMSG')),
+        ('histogram', lambda: histogram.observe(0.003, 'calc')),
+    ]
+    for label, func in cases:
+        best = min(timeit.repeat(func, number=count, repeat=repeat))
+        print('{0:>10}: {1:8.4f}s  {2:8.1f} ns/op'.format(
+            label, best, best / count * 1e9))
+    best = min(timeit.repeat(registry.render, number=100, repeat=repeat))
+    print('{0:>10}: {1:8.4f}s  {2:8.1f} us/scrape'.format(
+        'render', best, best / 100 * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+CPU time to handle a 10k-user netsplit and the netjoin after it, with
+and without gathering them into batches.
+
+The lines are replayed through `AkumaBotProtocol.dataReceived` into a
+`Network` whose membership index holds every user, with a listener on
+the per-user events, as a logging or seen-tracking plugin would have.
+
+Run with ``python -m benchmarks.bench_netsplit [users]``.
+"""
+from __future__ import print_function
+
+import sys
+import time
+from StringIO import StringIO
+
+from twisted.internet.task import Clock
+from twisted.internet.testing import StringTransport
+from twisted.logger import Logger
+
+from akumabot.bot import AkumaBot
+from akumabot.config import process_config_file
+from akumabot.netsplit import NetsplitTracker
+from akumabot.proto import AkumaBotProtocol
+
+
+_config = """
+[akumabot]
+nickname = akumabot
+password =
+channels = {channels}
+admins = admin
+"""
+
+
+class _NoBatches(object):
+    """
+    Stands in for `NetsplitTracker`, as if there were no batching.
+    """
+    def quit(self, nickname, message, reference=None):
+        return False
+
+    def join(self, nickname, channel, reference=None):
+        return False
+
+    def stop(self):
+        pass
+
+
+def replay(users, channels, debug, batched):
+    config = process_config_file(StringIO(_config.format(
+        channels=' '.join(channels))))
+    bot = AkumaBot(config)
+    network = bot.networks['default']
+    events = []
+    for event in ('user_quit', 'user_joined', 'netsplit', 'netjoin'):
+        bot.add_listener(event, lambda *args: events.append(args))
+    protocol = AkumaBotProtocol('akumabot', None, debug)
+    # Keep debug lines from reaching any output; they're still built.
+    protocol.log = Logger(observer=lambda event: None)
+    clock = Clock()
+    if batched:
+        protocol.splits = NetsplitTracker(
+            protocol._netsplit_batch, clock=clock)
+    else:
+        protocol.splits = _NoBatches()
+    network.got_protocol(protocol)
+    protocol.makeConnection(StringTransport())
+    for index, channel in enumerate(channels):
+        network.joined_channel(channel)
+        network.names_reply(channel, users[index::len(channels)])
+        network.end_of_names(channel)
+
+    quits = ''.join(
+        ':{0}!~u@host QUIT :hub.example.net leaf.example.net\r\n'.format(nick)
+        for nick in users)
+    joins = ''.join(
+        ':{0}!~u@host JOIN {1}\r\n'.format(nick, channels[n % len(channels)])
+        for n, nick in enumerate(users))
+    results = []
+    for lines in (quits, joins):
+        started = time.clock()
+        protocol.dataReceived(lines)
+        clock.pump([1, 1])
+        results.append(time.clock() - started)
+    assert not network.members.stats()['memberships'] - len(users), \
+        'Membership index out of step'
+    return results
+
+
+def main(users='10000', channel_count=20):
+    users = ['user{0}'.format(n) for n in range(int(users))]
+    channels = ['#chan{0}'.format(n) for n in range(channel_count)]
+    print('{0} users in {1} channels'.format(len(users), len(channels)))
+    for debug in (False, True):
+        for batched in (False, True):
+            split, join = min(
+                (replay(users, channels, debug, batched) for _ in range(3)),
+                key=sum)
+            print('  debug {0:<5}  {1:<9}: netsplit {2:.3f}s  '
+                  'netjoin {3:.3f}s CPU'.format(
+                      str(debug).lower(),
+                      'batched' if batched else 'per-user', split, join))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,62 @@
+"""
+Time splitting long replies into lines with `akumabot.paging.split_lines`
+against Twisted's `irc.split`, which `IRCClient.msg` otherwise uses, and
+sending the first page of a large reply given as a string against one
+given as a generator.
+
+Run with ``python -m benchmarks.bench_replies``.
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+from twisted.words.protocols import irc
+
+from akumabot.paging import Pager, split_lines
+
+
+_words = [
+    'the', 'reactor', 'deferred', 'callback', 'errback', 'protocol',
+    'factory', 'transport', 'endpoint', u'caf\xe9'.encode('utf-8'),
+    u'\u65e5\u672c\u8a9e'.encode('utf-8'), 'twisted', 'python',
+]
+
+
+def make_reply(rand, lines, words_per_line):
+    return '\n'.join(
+        ' '.join(rand.choice(_words) for _ in range(words_per_line))
+        for _ in range(lines))
+
+
+def _report(label, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=3))
+    print('  {0:<36} {1:10.1f}us'.format(label, best / number * 1e6))
+
+
+def main(budget=430, number=200):
+    rand = random.Random(1)
+    for lines, words_per_line in ((1, 20), (1, 400), (50, 120)):
+        reply = make_reply(rand, lines, words_per_line)
+        print('{0} bytes in {1} line(s):'.format(len(reply), lines))
+        split = split_lines(reply, budget)
+        assert all(len(line) <= budget for line in split)
+        for line in split:
+            line.decode('utf-8')
+        _report('split_lines', lambda: split_lines(reply, budget), number)
+        _report('irc.split', lambda: irc.split(reply, budget), number)
+
+    print('first page of 5000 lines:')
+    reply = make_reply(rand, 5000, 12)
+    lines = reply.split('\n')
+    _report(
+        'from a string',
+        lambda: Pager(max_pages=2000).first_page('k', reply, budget), 20)
+    _report(
+        'from a generator',
+        lambda: Pager(max_pages=2000).first_page(
+            'k', (line for line in lines), budget), 20)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Time adding lines to `akumabot.scrollback.ChannelScrollback` and
+searching it, against scanning every line held, and report its memory.
+
+Searches are for a word in a handful of lines, a word in about one line
+in a hundred and a word in nearly every line, so that the cost of an
+indexed search can be seen to follow the number of lines it looks at
+rather than the number held.
+
+Run with ``python -m benchmarks.bench_scrollback [max_bytes]``.
+"""
+from __future__ import print_function
+
+import random
+import sys
+import time
+
+from akumabot.scrollback import ChannelScrollback, words
+
+
+_vocabulary = [
+    'the', 'a', 'is', 'it', 'to', 'and', 'bot', 'twisted', 'reactor',
+    'deferred', 'python', 'error', 'works', 'why', 'does', 'my', 'help',
+    'thanks', 'install', 'version', 'socket', 'thread', 'test', 'fails',
+]
+
+
+def make_lines(count, rand):
+    lines = []
+    for n in range(count):
+        chosen = [rand.choice(_vocabulary) for _ in range(rand.randint(3, 12))]
+        if n % 100 == 0:
+            chosen.append('segfault')
+        if n % 500 == 0:
+            chosen.append('heisenbug')
+        lines.append((n, 'user{0}'.format(rand.randrange(300)),
+                      ' '.join(chosen)))
+    return lines
+
+
+def scan(held, query, limit):
+    """
+    Search without an index, as the lines would otherwise have to be.
+    """
+    wanted = set(words(query))
+    found = []
+    for at, nickname, message in reversed(held):
+        if wanted.issubset(words(message)):
+            found.append((at, nickname, message))
+            if len(found) == limit:
+                break
+    return found
+
+
+def main(max_bytes='65536', count=200000, searches=200):
+    rand = random.Random(1)
+    lines = make_lines(count, rand)
+    scrollback = ChannelScrollback(int(max_bytes))
+    started = time.clock()
+    for line in lines:
+        scrollback.add(*line)
+    elapsed = time.clock() - started
+    print('{0} lines into {1} bytes: {2:.2f}us per line'.format(
+        count, max_bytes, elapsed / count * 1e6))
+    memory = scrollback.memory()
+    print('  {lines} lines held, {used} of {buffer} buffer bytes used, '
+          'index ~{index} bytes ({words} words, {postings} postings)'
+          .format(**memory))
+
+    held = lines[-memory['lines']:]
+    for query in ('heisenbug', 'segfault', 'thread', 'segfault thread'):
+        for limit in (3, None):
+            found = scrollback.search(query, limit=limit)
+            assert found == scan(held, query, limit), query
+            started = time.clock()
+            for _ in range(searches):
+                scrollback.search(query, limit=limit)
+            indexed = (time.clock() - started) / searches
+            started = time.clock()
+            for _ in range(searches):
+                scan(held, query, limit)
+            scanned = (time.clock() - started) / searches
+            print('  {0!r:<18} limit {1!s:<4} {2:>5} found: indexed '
+                  '{3:8.1f}us  scan {4:8.1f}us'.format(
+                      query, limit, len(found), indexed * 1e6,
+                      scanned * 1e6))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,88 @@
+"""
+Time from starting ``python -m akumabot.main`` to the bot signing on to
+a local fake IRC server, and to it sending its first JOIN.
+
+Each run starts a fresh interpreter, so this includes import time. Runs
+are made with every command enabled and with only ``ping``.
+
+Run with ``python -m benchmarks.bench_startup``.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+
+from twisted.internet import defer, protocol, task
+
+from akumabot import fakeircd
+
+
+_config = """
+[akumabot]
+nickname = akumabot
+password =
+channels = #chan
+admins = admin
+endpoint = tcp:host=127.0.0.1:port={port}
+
+[commands]
+enabled = {enabled}
+"""
+
+
+class _Ignore(protocol.ProcessProtocol):
+    def __init__(self):
+        self.ended = defer.Deferred()
+
+    def processEnded(self, reason):
+        self.ended.callback(None)
+
+
+@defer.inlineCallbacks
+def time_startup(reactor, server, port, enabled):
+    handle, config_path = tempfile.mkstemp(suffix='.conf')
+    with os.fdopen(handle, 'w') as f:
+        f.write(_config.format(port=port, enabled=enabled))
+    times = {}
+    done = defer.Deferred()
+
+    def observe(connection, command, params):
+        if command == 'USER' and 'sign-on' not in times:
+            times['sign-on'] = reactor.seconds() - started
+        elif command == 'JOIN' and 'join' not in times:
+            times['join'] = reactor.seconds() - started
+            connection.transport.loseConnection()
+            done.callback(None)
+    server.observers.append(observe)
+    process = _Ignore()
+    started = reactor.seconds()
+    transport = reactor.spawnProcess(
+        process, sys.executable,
+        [sys.executable, '-m', 'akumabot.main', config_path],
+        env=os.environ)
+    yield done
+    server.observers.remove(observe)
+    transport.signalProcess('KILL')
+    yield process.ended
+    os.unlink(config_path)
+    defer.returnValue(times)
+
+
+@defer.inlineCallbacks
+def main(reactor, repeat=5):
+    server, port = yield fakeircd.listen(reactor)
+    port_number = port.getHost().port
+    for label, enabled in [('all commands', ''), ('ping only', 'ping')]:
+        runs = []
+        for _ in range(repeat):
+            times = yield time_startup(reactor, server, port_number, enabled)
+            runs.append(times)
+        print('{0:>13}: sign-on {1:.3f}s  first JOIN {2:.3f}s (best of {3})'
+              .format(label, min(run['sign-on'] for run in runs),
+                      min(run['join'] for run in runs), repeat))
+    yield port.stopListening()
+
+
+if __name__ == '__main__':
+    task.react(main)
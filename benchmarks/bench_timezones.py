@@ -0,0 +1,50 @@
+"""
+Measure time zone lookup latency with the preloaded index against
+calling ``pytz.timezone`` directly.
+
+Run with ``python -m benchmarks.bench_timezones``.
+"""
+from __future__ import print_function
+
+import time
+import timeit
+
+import pytz
+
+from akumabot.timezones import TimezoneIndex
+
+
+_hits = ['Europe/Berlin', 'America/New_York', 'Asia/Tokyo', 'UTC']
+_fuzzy_hits = ['europe/berlin', 'berlin', 'pst', 'cet']
+_misses = ['Europe/Berln', 'amerca/new_york', 'toky', 'xyzzy']
+
+
+def _pytz_lookup(name):
+    try:
+        return pytz.timezone(name)
+    except pytz.exceptions.UnknownTimeZoneError:
+        return None
+
+
+def _report(label, func, names, number):
+    best = min(timeit.repeat(
+        lambda: [func(name) for name in names], number=number, repeat=3))
+    print('{0:>28}: {1:8.2f} us/lookup'.format(
+        label, best / (number * len(names)) * 1e6))
+
+
+def main(number=2000):
+    start = time.time()
+    index = TimezoneIndex()
+    print('index built in {0:.3f}s ({1} suggestion keys)'.format(
+        time.time() - start, len(index.suggestions)))
+    _report('pytz.timezone hits', _pytz_lookup, _hits, number)
+    _report('index hits', index.lookup, _hits, number)
+    _report('index case/city/abbr hits', index.lookup, _fuzzy_hits, number)
+    _report('pytz.timezone misses', _pytz_lookup, _misses, number)
+    _report('index misses', index.lookup, _misses, number)
+    _report('index suggestions', index.suggest, _misses, number // 10)
+
+
+if __name__ == '__main__':
+    main()
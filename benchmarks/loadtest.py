@@ -0,0 +1,252 @@
+"""
+End-to-end load test against the fake IRC server in `akumabot.fakeircd`.
+
+Starts a fake server on a loopback port and an `AkumaBot` connected to
+it, fills the channels with virtual users, then has random idle users
+issue commands at a fixed rate. Reports command-to-reply latency, the
+lines per second the server saw each way and the process's peak memory.
+Everything runs in one process and needs no network access.
+
+Run with ``python -m benchmarks.loadtest``; ``--help`` lists the knobs.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import resource
+import sys
+import time
+from StringIO import StringIO
+
+from twisted.internet import defer, task
+
+from akumabot import fakeircd
+from akumabot.bot import AkumaBot
+from akumabot.config import process_config_file
+
+
+_config = """
+[akumabot]
+nickname = {nickname}
+password =
+channels = {channels}
+admins = admin
+endpoint = tcp:host=127.0.0.1:port={port}
+
+[outbound]
+rate = {outbound_rate}
+burst = {outbound_burst}
+
+[ratelimit]
+enabled = false
+"""
+
+
+_command_makers = {
+    'ping': lambda rand: 'ping',
+    'help': lambda rand: 'help',
+    'calc': lambda rand: 'calc {0} * ({1} + {2})'.format(
+        rand.randint(1, 1000), rand.randint(1, 1000), rand.randint(1, 10)),
+    'time': lambda rand: 'time now {0}'.format(
+        rand.choice(['UTC', 'Europe/London', 'Asia/Tokyo', 'EST'])),
+}
+
+
+def make_config(nickname, channels, port, outbound_rate, outbound_burst):
+    """
+    :returns: The bot's config, for the fake server listening on ``port``.
+    """
+    return process_config_file(StringIO(_config.format(
+        nickname=nickname, channels=' '.join(channels), port=port,
+        outbound_rate=outbound_rate, outbound_burst=outbound_burst)))
+
+
+def parse_mix(mix):
+    """
+    Parse ``ping:5,calc:3`` into a list of (command, weight) pairs.
+    """
+    pairs = []
+    for chunk in mix.split(','):
+        command, _, weight = chunk.partition(':')
+        if command not in _command_makers:
+            raise ValueError('Unknown command {0!r} in mix'.format(command))
+        pairs.append((command, float(weight or 1)))
+    return pairs
+
+
+def percentile(ordered, fraction):
+    """
+    Nearest-rank percentile of the already sorted list ``ordered``.
+    """
+    if not ordered:
+        return float('nan')
+    index = max(0, int(round(fraction * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class LoadGenerator(object):
+    """
+    Issues commands from idle virtual users and times the bot's replies.
+
+    A user waits for the reply to its command before sending another,
+    which is how replies ("nick, ...") are matched to commands.
+    """
+    def __init__(self, server, clock, nickname, users, channels, mix, rate,
+                 seed=1):
+        self.server = server
+        self.clock = clock
+        self.nickname = nickname
+        self.rate = rate
+        self.rand = random.Random(seed)
+        self.commands = [command for command, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.channels = {}
+        for n in range(users):
+            user = 'user{0}'.format(n)
+            self.channels[user] = channels[n % len(channels)]
+            server.add_virtual_user(user, [self.channels[user]])
+        self.idle = list(self.channels)
+        self.pending = {}
+        self.latencies = []
+        self.sent = 0
+        self.skipped = 0
+        self._owed = 0.0
+        server.observers.append(self._observe)
+
+    def _observe(self, connection, command, params):
+        if command != 'PRIVMSG' or connection.nickname != self.nickname:
+            return
+        user, _, _ = params[-1].partition(', ')
+        sent_at = self.pending.pop(user, None)
+        if sent_at is not None:
+            self.latencies.append(self.clock.seconds() - sent_at)
+            self.idle.append(user)
+
+    def _choose_command(self):
+        point = self.rand.random() * sum(self.weights)
+        for command, weight in zip(self.commands, self.weights):
+            point -= weight
+            if point < 0:
+                break
+        return _command_makers[command](self.rand)
+
+    def tick(self, interval):
+        self._owed += self.rate * interval
+        while self._owed >= 1:
+            self._owed -= 1
+            if not self.idle:
+                self.skipped += 1
+                continue
+            index = self.rand.randrange(len(self.idle))
+            self.idle[index], self.idle[-1] = self.idle[-1], self.idle[index]
+            user = self.idle.pop()
+            self.pending[user] = self.clock.seconds()
+            self.sent += 1
+            self.server.inject(user, self.channels[user], '{0}: {1}'.format(
+                self.nickname, self._choose_command()))
+
+
+@defer.inlineCallbacks
+def _wait_until(reactor, predicate, timeout, interval=0.05):
+    """
+    :returns:
+        A Deferred that fires with True once ``predicate()`` is true, or
+        with False after ``timeout`` seconds.
+    """
+    deadline = reactor.seconds() + timeout
+    while not predicate():
+        if reactor.seconds() > deadline:
+            defer.returnValue(False)
+        yield task.deferLater(reactor, interval, lambda: None)
+    defer.returnValue(True)
+
+
+@defer.inlineCallbacks
+def run(reactor, options):
+    server, port = yield fakeircd.listen(reactor)
+    channels = ['#load{0}'.format(n) for n in range(options.channels)]
+    nickname = 'akumabot'
+    config = make_config(
+        nickname, channels, port.getHost().port, options.outbound_rate,
+        options.outbound_burst)
+    generator = LoadGenerator(
+        server, reactor, nickname, options.users, channels,
+        parse_mix(options.mix), options.rate, options.seed)
+    bot = AkumaBot(config)
+    started = reactor.seconds()
+    bot.main(reactor).addErrback(lambda failure: None)
+
+    def all_joined():
+        connection = server.users.get(nickname)
+        return connection is not None and len(connection.joined) == len(
+            channels)
+    joined = yield _wait_until(reactor, all_joined, options.join_timeout)
+    if not joined:
+        raise RuntimeError('The bot did not join every channel')
+    print('Joined {0} channels in {1:.2f}s'.format(
+        len(channels), reactor.seconds() - started))
+
+    lines_in, lines_out = server.lines_in, server.lines_out
+    cpu_started = time.clock()
+    load_started = reactor.seconds()
+    interval = 0.01
+    ticker = task.LoopingCall(generator.tick, interval)
+    ticker.clock = reactor
+    ticker.start(interval, now=False)
+    yield task.deferLater(reactor, options.duration, lambda: None)
+    ticker.stop()
+    yield _wait_until(
+        reactor, lambda: not generator.pending, options.drain, 0.01)
+    elapsed = reactor.seconds() - load_started
+    cpu = time.clock() - cpu_started
+
+    latencies = sorted(generator.latencies)
+    print('{0} users in {1} channels, {2} commands/s for {3}s'.format(
+        options.users, options.channels, options.rate, options.duration))
+    print('  commands sent: {0} (skipped {1}, no idle user)'.format(
+        generator.sent, generator.skipped))
+    print('  replies:       {0} (unanswered {1})'.format(
+        len(latencies), len(generator.pending)))
+    print('  latency:       p50 {0:.2f}ms  p99 {1:.2f}ms  max {2:.2f}ms'
+          .format(percentile(latencies, 0.5) * 1000,
+                  percentile(latencies, 0.99) * 1000,
+                  (latencies[-1] if latencies else float('nan')) * 1000))
+    print('  lines/s:       {0:.0f} to bot, {1:.0f} from bot'.format(
+        (server.lines_out - lines_out) / elapsed,
+        (server.lines_in - lines_in) / elapsed))
+    print('  cpu:           {0:.2f}s over {1:.2f}s'.format(cpu, elapsed))
+    print('  peak rss:      {0:.1f} MiB'.format(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+    for network in bot.networks.values():
+        network.disconnect()
+    yield port.stopListening()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--channels', type=int, default=200)
+    parser.add_argument(
+        '--rate', type=float, default=200, help='Commands per second')
+    parser.add_argument(
+        '--duration', type=float, default=10, help='Seconds of load')
+    parser.add_argument(
+        '--mix', default='ping:5,calc:3,time:1,help:1',
+        help='Comma-separated command:weight pairs')
+    parser.add_argument(
+        '--outbound-rate', type=float, default=10000,
+        help="The bot's [outbound] rate, in lines per second")
+    parser.add_argument(
+        '--outbound-burst', type=int, default=10000,
+        help="The bot's [outbound] burst, in lines")
+    parser.add_argument('--join-timeout', type=float, default=60)
+    parser.add_argument(
+        '--drain', type=float, default=5,
+        help='Seconds to wait for outstanding replies')
+    parser.add_argument('--seed', type=int, default=1)
+    options = parser.parse_args(argv)
+    task.react(run, [options])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])